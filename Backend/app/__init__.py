@@ -6,6 +6,11 @@ from .db import db
 from .routes import api_bp
 from config import Config
 from .jwt_blocklist import jwt_blocklist
+from .services.serializers import compile_serializers
+from .services.etag import install_write_tracking
+from .services.refcache import install_reference_cache
+from .services.printing import install_print_cache
+from .services.rollup import install_rollup_tracking, rollup_cli
 
 def create_app():
     app = Flask(__name__)
@@ -22,5 +27,18 @@ def create_app():
         return jwt_payload["jti"] in jwt_blocklist
 
     app.register_blueprint(api_bp, url_prefix="/api")
+    # flask --app run.py reportes rebuild
+    app.cli.add_command(rollup_cli)
+
+    # Serializadores por modelo construidos una sola vez al arrancar
+    compile_serializers(mapper.class_ for mapper in db.Model.registry.mappers)
+    # Contadores de escritura por tabla para los ETag de los GET genéricos
+    install_write_tracking(app.config["ETAG_FALLBACK_TTL"])
+    # Caché de datos de referencia, invalidada por esos mismos commits
+    install_reference_cache(app.config["REFERENCE_CACHE_SIZE"], app.config["REFERENCE_CACHE_TTL"])
+    # Caché de los payloads de impresión de tickets Finalizados
+    install_print_cache(app.config["PRINT_CACHE_SIZE"], app.config["PRINT_CACHE_TTL"])
+    # Reportes_diarios recalculado en el commit de cada escritura de tickets
+    install_rollup_tracking()
 
     return app
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Computed, CheckConstraint
+from sqlalchemy import Computed, CheckConstraint, event, inspect
 from sqlalchemy.dialects import mssql
 from .db import db
 
@@ -11,6 +11,9 @@ TIPOS_TICKET = ('Entrada', 'Salida')
 ESTADOS_TICKET = ('En proceso', 'Finalizado', 'Anulado')
 
 # --- Modelos ---
+# Las relaciones (db.relationship) son solo de navegación: no cambian el esquema,
+# pero permiten que services/prefetch.py cargue las FKs de una página completa
+# con un solo SELECT ... IN (...) por tabla.
 
 class RIF(db.Model):
     __tablename__ = "RIF"
@@ -56,6 +59,9 @@ class Personas(db.Model):
     cedula = db.Column(db.String(20), nullable=False)
     is_deleted = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.getdate(), nullable=False)
+
+    direccion = db.relationship("Direcciones")
+    telefonos = db.relationship("Telefonos", secondary="Personas_telefonos", order_by="Telefonos.id", viewonly=True)
     __table_args__ = (
         CheckConstraint(tipo_cedula.in_(TIPOS_CEDULA), name="ck_personas_tipo_cedula"),
         # Index único filtrado por is_deleted = 0
@@ -109,6 +115,9 @@ class Usuarios(db.Model):
     contraseña = db.Column(db.String(255), nullable=False)
     is_deleted = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.getdate(), nullable=False)
+
+    persona = db.relationship("Personas")
+    rol = db.relationship("Roles")
     
     __table_args__ = (
         # Index único filtrado por is_deleted = 0
@@ -137,6 +146,10 @@ class EmpresasTransporte(db.Model):
     id_rif = db.Column(db.Integer, db.ForeignKey("RIF.id"), nullable=True)  # 1:1 relationship with RIF
     is_deleted = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.getdate(), nullable=False)
+
+    direccion = db.relationship("Direcciones")
+    rif = db.relationship("RIF")
+    telefonos = db.relationship("Telefonos", secondary="Empresas_telefonos", order_by="Telefonos.id", viewonly=True)
     
     __table_args__ = (
         # Unique constraint for active RIF (allows reuse if soft deleted)
@@ -174,6 +187,8 @@ class Vehiculos(db.Model):
     id_empresas_transportes = db.Column(db.Integer, db.ForeignKey("Empresas_transportes.id"), nullable=False)
     is_deleted = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.getdate(), nullable=False)
+
+    empresa = db.relationship("EmpresasTransporte")
     
     __table_args__ = (
         # Index único filtrado por is_deleted = 0
@@ -188,6 +203,9 @@ class Choferes(db.Model):
     is_deleted = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.getdate(), nullable=False)
 
+    persona = db.relationship("Personas")
+    empresa = db.relationship("EmpresasTransporte")
+
 class Asignaciones(db.Model):
     __tablename__ = "Asignaciones"
     id = db.Column(db.Integer, primary_key=True)
@@ -199,6 +217,9 @@ class Asignaciones(db.Model):
     is_deleted = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.getdate(), nullable=False)
 
+    vehiculo = db.relationship("Vehiculos")
+    chofer = db.relationship("Choferes")
+
 class Ubicaciones(db.Model):
     __tablename__ = "Ubicaciones"
     id = db.Column(db.Integer, primary_key=True)
@@ -207,6 +228,8 @@ class Ubicaciones(db.Model):
     tipo = db.Column(db.String(255), nullable=False)
     is_deleted = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.getdate(), nullable=False)
+
+    direccion = db.relationship("Direcciones")
     __table_args__ = (
         CheckConstraint(f"tipo IN {TIPOS_UBICACION}", name='ck_ubicaciones_tipo'),
     )
@@ -219,6 +242,11 @@ class Granjas(db.Model):
     id_rif = db.Column(db.Integer, db.ForeignKey("RIF.id"), nullable=True)  # 1:1 relationship with RIF
     is_deleted = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.getdate(), nullable=False)
+
+    ubicacion = db.relationship("Ubicaciones")
+    responsable = db.relationship("Personas")
+    rif = db.relationship("RIF")
+    telefonos = db.relationship("Telefonos", secondary="Granjas_telefonos", order_by="Telefonos.id", viewonly=True)
     
     __table_args__ = (
         # Unique constraint for active RIF (allows reuse if soft deleted)
@@ -249,6 +277,8 @@ class Galpones(db.Model):
     is_deleted = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.getdate(), nullable=False)
 
+    granja = db.relationship("Granjas")
+
 class Lotes(db.Model):
     __tablename__ = "Lotes"
     id = db.Column(db.Integer, primary_key=True)
@@ -259,6 +289,8 @@ class Lotes(db.Model):
     is_deleted = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.getdate(), nullable=False)
 
+    galpon = db.relationship("Galpones")
+
 class TicketPesaje(db.Model):
     __tablename__ = "Ticket_pesaje"
     id = db.Column(db.Integer, primary_key=True)
@@ -277,8 +309,17 @@ class TicketPesaje(db.Model):
     fecha_primer_peso = db.Column(db.DateTime, nullable=False)
     fecha_segundo_peso = db.Column(db.DateTime)
     reimpresiones = db.Column(db.Integer, default=0)
+    # Versión de la fila: sube con cada escritura (concurrencia optimista en registrar_peso)
+    row_version = db.Column(db.Integer, default=1, server_default="1", nullable=False)
     is_deleted = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.getdate(), nullable=False)
+
+    producto = db.relationship("Productos")
+    asignacion = db.relationship("Asignaciones")
+    operador_entrada = db.relationship("Usuarios", foreign_keys=[id_usuarios_primer_peso])
+    operador_salida = db.relationship("Usuarios", foreign_keys=[id_usuarios_segundo_peso])
+    origen = db.relationship("Ubicaciones", foreign_keys=[id_origen])
+    destino = db.relationship("Ubicaciones", foreign_keys=[id_destino])
     __table_args__ = (
         CheckConstraint(f"tipo IN {TIPOS_TICKET}", name='ck_ticket_pesaje_tipo'),
         CheckConstraint(f"estado IN {ESTADOS_TICKET}", name='ck_ticket_pesaje_estado'),
@@ -286,6 +327,24 @@ class TicketPesaje(db.Model):
         {'implicit_returning': False},  # <-- Aquí va la opción correcta
     )
 
+# Columnas del pesaje: solo estas cambian la versión. Reimprimir (reimpresiones)
+# u otras ediciones no deben hacer fallar un registrar_peso en curso con 409.
+TICKET_VERSIONED_COLUMNS = (
+    "peso_bruto", "peso_tara", "peso_neto", "estado",
+    "fecha_segundo_peso", "id_usuarios_segundo_peso",
+)
+
+@event.listens_for(TicketPesaje, "before_update")
+def _bump_row_version(mapper, connection, target):
+    # Las escrituras por el ORM al pesaje también cambian la versión
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in TICKET_VERSIONED_COLUMNS):
+        target.row_version = TicketPesaje.row_version + 1
+
+# Numeración de los tickets (TKT-000123): el valor se toma dentro del mismo
+# INSERT que crea el ticket (ver services/tickets.py)
+TICKET_NUMBER_SEQUENCE = db.Sequence("seq_ticket_pesaje_nro", start=1, metadata=db.metadata)
+
 class ViajesTiempos(db.Model):
     __tablename__ = "Viajes_tiempos"
     id = db.Column(db.Integer, primary_key=True)
@@ -301,6 +360,11 @@ class ViajesTiempos(db.Model):
     tiempo_operacion = db.Column(db.Integer)
     is_deleted = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.getdate(), nullable=False)
+    __table_args__ = (
+        # Filtros por fecha de los reportes (rango sobre la columna, sin CAST);
+        # id_ticket incluido para llegar al ticket sin leer la fila
+        db.Index('idx_viajes_tiempos_llegada', 'hora_llegada_romana', mssql_include=['id_ticket']),
+    )
 
 class ViajesConteos(db.Model):
     __tablename__ = "Viajes_conteos"
@@ -336,6 +400,52 @@ class Estadisticas(db.Model):
     is_deleted = db.Column(db.Boolean, default=False, server_default="0", nullable=False)
     created_at = db.Column(db.DateTime, server_default=db.func.getdate(), nullable=False)
 
+class SolicitudesIdempotentes(db.Model):
+    """Respuestas de POST con Idempotency-Key, para repetirlas si el cliente reintenta"""
+    __tablename__ = "Solicitudes_idempotentes"
+    id = db.Column(db.Integer, primary_key=True)
+    # Usuario + clave enviada en el header Idempotency-Key
+    clave = db.Column(db.String(300), nullable=False)
+    # SHA-256 de método, ruta y cuerpo: la misma clave con otro cuerpo es un error del cliente
+    huella = db.Column(db.String(64), nullable=False)
+    estado_http = db.Column(db.Integer, nullable=False)
+    respuesta = db.Column(db.UnicodeText, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (
+        db.Index('idx_solicitudes_idempotentes_clave_unique', 'clave', unique=True),
+        db.Index('idx_solicitudes_idempotentes_expires_at', 'expires_at'),
+    )
+
+class ReportesDiarios(db.Model):
+    """
+    Resumen por día (llegada a la romana), origen, granja y galpón de los
+    tickets Finalizados. Lo mantiene services/rollup.py en el commit de cada
+    escritura de tickets, conteos, tiempos, estadísticas u orígenes;
+    `flask --app run.py reportes rebuild` lo recalcula.
+    """
+    __tablename__ = "Reportes_diarios"
+    id = db.Column(db.Integer, primary_key=True)
+    fecha = db.Column(db.Date, nullable=False)
+    id_origen = db.Column(db.Integer, db.ForeignKey("Ubicaciones.id"), nullable=False)
+    # 0 si el ticket no tiene Viajes_origen (sin granja ni galpón)
+    id_granja = db.Column(db.Integer, nullable=False)
+    id_galpon = db.Column(db.Integer, nullable=False)
+    tickets = db.Column(db.Integer, nullable=False)
+    total_aves = db.Column(db.Integer, nullable=False)
+    aves_faltantes = db.Column(db.Integer, nullable=False)
+    aves_ahogadas = db.Column(db.Integer, nullable=False)
+    peso_neto = db.Column(db.Numeric(14, 2), nullable=False)
+    # Promedio de peso por ave = suma_peso_promedio / tickets_con_peso_promedio
+    # (promedio de los tickets con estadísticas, como el reporte por granja)
+    suma_peso_promedio = db.Column(db.Float, nullable=False)
+    tickets_con_peso_promedio = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+    __table_args__ = (
+        db.Index('idx_reportes_diarios_clave_unique', 'fecha', 'id_origen', 'id_granja', 'id_galpon', unique=True),
+        db.Index('idx_reportes_diarios_origen_fecha', 'id_origen', 'fecha'),
+    )
+
 # Si es la primera vez que ejecutas el proyecto, debes crear la base de datos con el nombre GestionRomanaAvicola (Copiar y pegar por seguridad)
 # Luego seguir los pasos de abajo para crear las tablas y relaciones en la base de datos. Recuerda que cada vez que realices cambios en los modelos, debes crear una nueva migración y aplicarla a la base de datos para mantenerla actualizada con el código.
 # Si realizas cambios aqui debes realizar las migraciones correspondientes para actualizar la base de datos.
@@ -1,13 +1,12 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-import serial
-import serial.tools.list_ports 
 import datetime 
+import io
 import uuid
 from decimal import Decimal
-from sqlalchemy import text
+from sqlalchemy import insert, select, text
 
 from .models import (
     Usuarios, Roles, EmpresasTransporte, Granjas, Productos, Galpones,
@@ -17,11 +16,42 @@ from .models import (
     RIF, EmpresasTelefonos, GranjasTelefonos
 )
 from .services.crud import CRUDService
+from .services.prefetch import EXPANSION_TREE, NO_EXPANSION, build_plan, plan_includes, subplan, prefetch_options
+from .services.projection import parse_projection, projection_options
+from .services.filters import apply_filters, sort_columns
+from .services.fanout import run_fanout
+from .services.etag import resource_etag, not_modified
+from .services.serializers import get_serializer
+from .services.memo import current_memo, memo_stats_header
+from .services.refcache import (
+    REFERENCE_MODELS, reference_cache, reference_key, reference_tables, reference_skip,
+)
+from .services.pagination import clamp_per_page, decode_cursor, keyset_page
+from .services.streaming import wants_stream, wants_ndjson, stream_query, sse_message, sse_response
+from .services.scale import get_scale_reader, reading_to_dict, scale_registry, port_scanner
 from .services.validation import validate_payload
+from .services.idempotency import idempotent, record_response
+from .services.csv_import import IMPORTERS as CSV_IMPORTERS, HeaderError, import_csv
+from .services.printing import print_cache, print_payloads, ticket_written
+from .services.rollup import arrival_range, rollup_days, rollup_ticket_written
+from .services.reports import (
+    FORMATO_1_COLUMNS, FORMATO_2_COLUMNS, granja_query, granja_row, stream_rows, transporte_query, transporte_row,
+)
+from .services.export import EXPORT_FORMATS, export_response
+from .services.tickets import (
+    insert_ticket, register_weight, current_row_version, SERVER_GENERATED as TICKET_SERVER_GENERATED,
+)
 from .jwt_blocklist import jwt_blocklist
 
 api_bp = Blueprint("api", __name__)
 
+@api_bp.before_request
+def before_request():
+    # Época de la caché de referencia: lo leído en este request solo se guarda
+    # si ningún commit la invalidó mientras tanto
+    reference_cache.begin()
+    print_cache.begin()
+
 @api_bp.after_request
 def after_request(response):
     origin = request.headers.get("Origin")
@@ -33,9 +63,14 @@ def after_request(response):
     }
     if origin in allowed:
         response.headers["Access-Control-Allow-Origin"] = origin
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+    response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization, If-None-Match"
+    response.headers["Access-Control-Expose-Headers"] = "ETag"
     response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
     response.headers["Vary"] = "Origin"
+    # Aciertos/fallos del memo de serialización de este request
+    memo_stats = memo_stats_header()
+    if memo_stats:
+        response.headers["X-Serialize-Memo"] = memo_stats
     return response
 
 MODEL_MAP = { 
@@ -62,223 +97,273 @@ MODEL_MAP = {
 
 # --- SERIALIZACION AVANZADA ---
 
-def get_telefonos_for_entity(entity_id, link_model, link_fk_name):
-    """Ayuda a obtener lista de teléfonos a través de tablas intermedias"""
-    from .models import Telefonos
-    links = link_model.query.filter(getattr(link_model, link_fk_name) == entity_id).all()
-    # Recolectar IDs
-    t_ids = [l.id_telefonos for l in links]
-    if not t_ids:
-        return []
-    
-    phones = Telefonos.query.filter(Telefonos.id.in_(t_ids)).all()
-    # Serializar recursivamente como objeto 'telefonos' (sin lógica extra por ahora)
-    return [clean_data({c.name: getattr(p, c.name) for c in p.__table__.columns}) for p in phones]
-
-def clean_data(data):
-    """Elimina campos de sistema y sensibles de un diccionario"""
-    keys_to_remove = [
-        "created_at", "is_deleted", "contraseña", "contrasena", 
-        "password_hash", "modified_at"
-    ]
-    for key in keys_to_remove:
-        data.pop(key, None)
-    return data
+def serialize_telefonos(phones):
+    """Serializa la lista de teléfonos de una entidad (ya cargada por la relación secondary)"""
+    # Serializar como objeto 'telefonos' limpio (sin lógica extra por ahora)
+    serializer = get_serializer(Telefonos).clean
+    return [serializer(p) for p in phones]
 
-def expand_resource(data, resource_name, obj):
+def related_model(model, rel_name):
+    return getattr(model, rel_name).property.mapper.class_
+
+def expand_related(obj, rel_name, fk_value, resource_name, plan):
+    """
+    Serializa obj.<rel_name> como resource_name con el subplan de rel_name.
+    Si es un dato de referencia y está en la caché, se devuelve sin tocar la
+    relación (no se emite ningún SELECT).
+    """
+    sub = subplan(plan, rel_name)
+    target = related_model(type(obj), rel_name)
+    if fk_value is not None and target in REFERENCE_MODELS:
+        cached = reference_cache.peek(reference_key(target, fk_value, resource_name, sub))
+        if cached is not None:
+            reference_cache.record_hit()
+            return cached
+    related = getattr(obj, rel_name)
+    return serialize(related, resource_name, sub) if related else None
+
+def get_reference(model, id_, resource_name, plan=NO_EXPANSION):
+    """Dato de referencia serializado: desde la caché o, si no está, desde la BDD (y queda cacheado)"""
+    if id_ is None:
+        return None
+    cached = reference_cache.peek(reference_key(model, id_, resource_name, plan))
+    if cached is not None:
+        reference_cache.record_hit()
+        return cached
+    obj = model.query.options(*prefetch_options(model, resource_name, plan)).get(id_)
+    return serialize(obj, resource_name, plan) if obj else None
+
+def prefetch_references(rows, model, resource_name, plan):
+    """
+    Completa la caché de referencia para las filas antes de serializarlas:
+    por cada relación a un dato de referencia se cargan solo los ids que faltan
+    en la caché, con un SELECT ... WHERE id IN (...) por tabla.
+    Las demás relaciones ya vienen del prefetch; se recorren para llegar a las
+    referencias anidadas (ticket -> asignacion -> vehiculo/chofer).
+    """
+    if not rows or not reference_cache.enabled:
+        return
+    for rel_name, child_resource in EXPANSION_TREE.get(resource_name, {}).items():
+        if not child_resource or not plan_includes(plan, rel_name):
+            continue
+        target = related_model(model, rel_name)
+        sub = subplan(plan, rel_name)
+        if target in REFERENCE_MODELS:
+            fk = next(iter(getattr(model, rel_name).property.local_columns)).key
+            missing = {
+                fk_value for fk_value in (getattr(r, fk) for r in rows)
+                if fk_value is not None
+                and reference_cache.peek(reference_key(target, fk_value, child_resource, sub)) is None
+            }
+            if missing:
+                loaded = target.query.options(*prefetch_options(target, child_resource, sub)) \
+                    .filter(target.id.in_(missing)).all()
+                for related in loaded:
+                    serialize(related, child_resource, sub)  # queda guardado en la caché
+        else:
+            children = [c for c in (getattr(r, rel_name) for r in rows) if c is not None]
+            prefetch_references(children, target, child_resource, sub)
+
+def expand_resource(data, resource_name, obj, plan=None):
     """
     Enriquece el diccionario 'data' con objetos anidados basados en las FKs.
     Reemplaza el ID de la FK por el objeto completo.
+    Los objetos se leen de las relaciones del modelo; si la consulta se hizo con
+    prefetch_options(...) ya están en memoria y no se emite ningún SELECT extra.
+    Los datos de referencia se toman de la caché (ver expand_related).
+    El árbol recorrido aquí debe coincidir con EXPANSION_TREE (services/prefetch.py).
+    Con un plan (?expand=) solo se expanden las relaciones incluidas; las demás
+    FKs se devuelven como ids.
     """
     
     # --- 1. Expansiones Genéricas (Direcciones, RIF) ---
     # Estas aplican a cualquier recurso que tenga estas columnas
     
-    if "id_direcciones" in data:
+    if "id_direcciones" in data and plan_includes(plan, "direccion"):
         if data["id_direcciones"]:
-            d = Direcciones.query.get(data["id_direcciones"])
+            d = obj.direccion
             if d:
-                # Serializamos manualmente para evitar ciclos raros, aunque serialize("direcciones") serviria
-                d_data = {c.name: getattr(d, c.name) for c in d.__table__.columns}
-                data["direccion"] = clean_data(d_data)
+                # Serialización plana (sin expandir) para evitar ciclos raros
+                data["direccion"] = get_serializer(Direcciones).clean(d)
         data.pop("id_direcciones", None) # Removemos fk
     
-    if "id_rif" in data:
+    if "id_rif" in data and plan_includes(plan, "rif"):
         if data["id_rif"]:
-            r = RIF.query.get(data["id_rif"])
+            r = obj.rif
             if r:
-                r_data = {c.name: getattr(r, c.name) for c in r.__table__.columns}
-                data["rif"] = clean_data(r_data)
+                data["rif"] = get_serializer(RIF).clean(r)
         data.pop("id_rif", None)
 
     # --- 2. Lógica Específica por Recurso ---
 
     if resource_name == "usuarios":
         # Rol (Objeto completo)
-        if "id_roles" in data:
-            r = Roles.query.get(data["id_roles"])
+        if "id_roles" in data and plan_includes(plan, "rol"):
+            r = expand_related(obj, "rol", data["id_roles"], "roles", plan)
             if r:
-               data["rol"] = serialize(r, "roles")
+               data["rol"] = r
             data.pop("id_roles", None)
         
         # Persona
-        if "id_personas" in data:
-            p = Personas.query.get(data["id_personas"])
+        if "id_personas" in data and plan_includes(plan, "persona"):
+            p = expand_related(obj, "persona", data["id_personas"], "personas", plan)
             if p:
-                data["persona"] = serialize(p, "personas")
+                data["persona"] = p
             data.pop("id_personas", None)
 
     elif resource_name == "personas":
         # Telefonos
-        data["telefonos"] = get_telefonos_for_entity(obj.id, PersonasTelefonos, "id_personas")
+        if plan_includes(plan, "telefonos"):
+            data["telefonos"] = serialize_telefonos(obj.telefonos)
 
     elif resource_name == "choferes":
         # Persona
-        if "id_personas" in data:
-            p = Personas.query.get(data["id_personas"])
+        if "id_personas" in data and plan_includes(plan, "persona"):
+            p = expand_related(obj, "persona", data["id_personas"], "personas", plan)
             if p:
-                data["persona"] = serialize(p, "personas")
+                data["persona"] = p
             data.pop("id_personas", None)
         # Empresa
-        if "id_empresas_transportes" in data:
-            e = EmpresasTransporte.query.get(data["id_empresas_transportes"])
+        if "id_empresas_transportes" in data and plan_includes(plan, "empresa"):
+            e = expand_related(obj, "empresa", data["id_empresas_transportes"], "empresas_transporte", plan)
             if e:
-                data["empresa"] = serialize(e, "empresas_transporte")
+                data["empresa"] = e
             data.pop("id_empresas_transportes", None)
 
     elif resource_name == "vehiculos":
         # Empresa
-        if "id_empresas_transportes" in data:
-            e = EmpresasTransporte.query.get(data["id_empresas_transportes"])
+        if "id_empresas_transportes" in data and plan_includes(plan, "empresa"):
+            e = expand_related(obj, "empresa", data["id_empresas_transportes"], "empresas_transporte", plan)
             if e:
-                data["empresa"] = serialize(e, "empresas_transporte")
+                data["empresa"] = e
             data.pop("id_empresas_transportes", None)
             
     elif resource_name == "empresas_transporte":
         # Telefonos
-        data["telefonos"] = get_telefonos_for_entity(obj.id, EmpresasTelefonos, "id_empresas_transportes")
+        if plan_includes(plan, "telefonos"):
+            data["telefonos"] = serialize_telefonos(obj.telefonos)
 
     elif resource_name == "granjas":
         # Telefonos
-        data["telefonos"] = get_telefonos_for_entity(obj.id, GranjasTelefonos, "id_granjas")
+        if plan_includes(plan, "telefonos"):
+            data["telefonos"] = serialize_telefonos(obj.telefonos)
         # Ubicacion (que internamente resolvera direccion)
-        if "id_ubicaciones" in data:
-            u = Ubicaciones.query.get(data["id_ubicaciones"])
+        if "id_ubicaciones" in data and plan_includes(plan, "ubicacion"):
+            u = expand_related(obj, "ubicacion", data["id_ubicaciones"], "ubicaciones", plan)
             if u:
-                data["ubicacion"] = serialize(u, "ubicaciones")
+                data["ubicacion"] = u
             data.pop("id_ubicaciones", None)
         # Responsable (Persona)
-        if "id_persona_responsable" in data:
-             p = Personas.query.get(data["id_persona_responsable"])
+        if "id_persona_responsable" in data and plan_includes(plan, "responsable"):
+             p = expand_related(obj, "responsable", data["id_persona_responsable"], "personas", plan)
              if p:
-                data["responsable"] = serialize(p, "personas")
+                data["responsable"] = p
              data.pop("id_persona_responsable", None)
 
     elif resource_name == "galpones":
         # Granja
-        if "id_granja" in data:
+        if "id_granja" in data and plan_includes(plan, "granja"):
             # Nota: para evitar bucles infinitos pesados, quiza quieras una serializacion "light" de granja
             # pero aqui usaremos la completa. Si Granja tiene muchos galpones no pasa nada por que la relacion es unidireccional aqui.
-            g = Granjas.query.get(data["id_granja"])
+            g = expand_related(obj, "granja", data["id_granja"], "granjas", plan)
             if g:
-                data["granja"] = serialize(g, "granjas")
+                data["granja"] = g
             data.pop("id_granja", None)
 
     elif resource_name == "lotes":
         # Galpon
-        if "id_galpones" in data:
-            g = Galpones.query.get(data["id_galpones"])
+        if "id_galpones" in data and plan_includes(plan, "galpon"):
+            g = expand_related(obj, "galpon", data["id_galpones"], "galpones", plan)
             if g:
-                data["galpon"] = serialize(g, "galpones")
+                data["galpon"] = g
             data.pop("id_galpones", None)
 
     elif resource_name == "asignaciones":
         # Vehiculo
-        if "id_vehiculos" in data:
-            v = Vehiculos.query.get(data["id_vehiculos"])
+        if "id_vehiculos" in data and plan_includes(plan, "vehiculo"):
+            v = expand_related(obj, "vehiculo", data["id_vehiculos"], "vehiculos", plan)
             if v:
-                data["vehiculo"] = serialize(v, "vehiculos")
+                data["vehiculo"] = v
             data.pop("id_vehiculos", None)
         # Chofer
-        if "id_chofer" in data:
-            from .models import Choferes # local import just in case
-            c = Choferes.query.get(data["id_chofer"])
+        if "id_chofer" in data and plan_includes(plan, "chofer"):
+            c = expand_related(obj, "chofer", data["id_chofer"], "choferes", plan)
             if c:
-                data["chofer"] = serialize(c, "choferes")
+                data["chofer"] = c
             data.pop("id_chofer", None)
 
     elif resource_name == "tickets_pesaje":
         # Producto
-        if "id_producto" in data:
-            prod = Productos.query.get(data["id_producto"])
-            data["producto"] = serialize(prod, "productos") if prod else None
+        if "id_producto" in data and plan_includes(plan, "producto"):
+            data["producto"] = expand_related(obj, "producto", data["id_producto"], "productos", plan)
             data.pop("id_producto", None)
 
-        # Asignaciones (con chofer y vehiculo)
-        if "id_asignaciones" in data:
-            asignacion = Asignaciones.query.get(data["id_asignaciones"])
+        # Asignaciones (la expansión de "asignaciones" ya incluye chofer -> persona y vehiculo)
+        if "id_asignaciones" in data and plan_includes(plan, "asignacion"):
+            asignacion = expand_related(obj, "asignacion", data["id_asignaciones"], "asignaciones", plan)
             if asignacion:
-                asignacion_data = serialize(asignacion, "asignaciones")
-                # Expande chofer
-                if asignacion_data.get("id_chofer"):
-                    chofer = Choferes.query.get(asignacion_data["id_chofer"])
-                    if chofer:
-                        chofer_data = serialize(chofer, "choferes")
-                        # Expande persona del chofer
-                        if chofer_data.get("id_personas"):
-                            persona = Personas.query.get(chofer_data["id_personas"])
-                            if persona:
-                                chofer_data["persona"] = serialize(persona, "personas")
-                        asignacion_data["chofer"] = chofer_data
-                # Expande vehiculo
-                if asignacion_data.get("id_vehiculos"):
-                    vehiculo = Vehiculos.query.get(asignacion_data["id_vehiculos"])
-                    if vehiculo:
-                        vehiculo_data = serialize(vehiculo, "vehiculos")
-                        asignacion_data["vehiculo"] = vehiculo_data
-                data["asignacion"] = asignacion_data
+                data["asignacion"] = asignacion
             data.pop("id_asignaciones", None)
 
         # Usuarios (Operadores)
-        if "id_usuarios_primer_peso" in data:
-            u1 = Usuarios.query.get(data["id_usuarios_primer_peso"])
+        if "id_usuarios_primer_peso" in data and plan_includes(plan, "operador_entrada"):
+            u1 = obj.operador_entrada
             if u1:
                 data["operador_entrada"] = {"id": u1.id, "usuario": u1.usuario}
             data.pop("id_usuarios_primer_peso", None)
 
-        if "id_usuarios_segundo_peso" in data and data["id_usuarios_segundo_peso"]:
-            u2 = Usuarios.query.get(data["id_usuarios_segundo_peso"])
+        if "id_usuarios_segundo_peso" in data and data["id_usuarios_segundo_peso"] and plan_includes(plan, "operador_salida"):
+            u2 = obj.operador_salida
             if u2:
                 data["operador_salida"] = {"id": u2.id, "usuario": u2.usuario}
             data.pop("id_usuarios_segundo_peso", None)
 
         # Ubicaciones (Origen/Destino)
-        if "id_origen" in data:
-            ubi_o = Ubicaciones.query.get(data["id_origen"])
-            data["origen"] = serialize(ubi_o, "ubicaciones") if ubi_o else None
+        if "id_origen" in data and plan_includes(plan, "origen"):
+            data["origen"] = expand_related(obj, "origen", data["id_origen"], "ubicaciones", plan)
             data.pop("id_origen", None)
 
-        if "id_destino" in data:
-            ubi_d = Ubicaciones.query.get(data["id_destino"])
-            data["destino"] = serialize(ubi_d, "ubicaciones") if ubi_d else None
+        if "id_destino" in data and plan_includes(plan, "destino"):
+            data["destino"] = expand_related(obj, "destino", data["id_destino"], "ubicaciones", plan)
             data.pop("id_destino", None)
 
     return data
 
-def serialize(obj, resource_name=None):
-    data = {}
-    for column in obj.__table__.columns:
-        value = getattr(obj, column.name)
-        # Convierte datetime, date y time a string ISO
-        if isinstance(value, (datetime.datetime, datetime.date)):
-            data[column.name] = value.isoformat()
-        elif isinstance(value, datetime.time):
-            data[column.name] = value.strftime("%H:%M:%S")
-        else:
-            data[column.name] = value
+def serialize(obj, resource_name=None, plan=None, fields=None):
+    """
+    plan: ExpandPlan con las relaciones a expandir (None = árbol completo).
+    fields: columnas a incluir (None = todas); deben estar cargadas en obj.
+    """
+    # Con expansión, cada (modelo, id, recurso, proyección) se serializa una sola vez por request
+    memo = current_memo() if resource_name else None
+    key = None
+    if memo is not None and obj.id is not None:
+        key = (type(obj), obj.id, resource_name, plan, fields)
+        cached = memo.get(key)
+        if cached is not None:
+            return cached
+
+    # Datos de referencia: caché compartida entre requests (services/refcache.py)
+    ref_key = None
+    if resource_name and fields is None and type(obj) in REFERENCE_MODELS and obj.id is not None:
+        ref_key = reference_key(type(obj), obj.id, resource_name, plan)
+        cached = reference_cache.get(ref_key)
+        if cached is not None:
+            if key is not None:
+                memo.put(key, cached)
+            return cached
+
+    # Serializador compilado del modelo: columnas, conversores (fechas a ISO,
+    # Numeric a string) y campos sensibles ya resueltos al arrancar la app
+    serializer = get_serializer(type(obj))
+    data = serializer(obj) if fields is None else serializer.only(fields)(obj)
     # Expande recursos si es necesario
     if resource_name:
-        data = expand_resource(data, resource_name, obj)
+        data = expand_resource(data, resource_name, obj, plan)
+    if key is not None:
+        memo.put(key, data)
+    if ref_key is not None:
+        reference_cache.put(ref_key, data, reference_tables(type(obj), resource_name, plan))
     return data
 
 # --- HELPER FUNCTIONS ---
@@ -316,22 +401,47 @@ def process_rif(db, rif_input):
 
 def process_telefonos(db, telefonos_data):
     """
-    Creates phone records. 
-    Returns a list of created Telefonos objects.
+    Resuelve los teléfonos por número: los existentes con una sola consulta
+    IN y los que faltan con un solo flush (el ORM los agrupa en un INSERT).
+    Returns a list of Telefonos objects (en el orden recibido, sin números repetidos).
     """
-    created_phones = []
-    for t_data in telefonos_data:
-        # Check basic validity
-        if t_data.get("numero") and t_data.get("operadora"):
-            existing = Telefonos.query.filter_by(numero=t_data["numero"], is_deleted=False).first()
-            if existing:
-                created_phones.append(existing)
-            else:
-                nuevo_t = Telefonos(**t_data)
-                db.session.add(nuevo_t)
-                db.session.flush()
-                created_phones.append(nuevo_t)
-    return created_phones
+    valid = [t for t in telefonos_data if t.get("numero") and t.get("operadora")]
+    if not valid:
+        return []
+    numeros = list(dict.fromkeys(t["numero"] for t in valid))
+    by_numero = {
+        t.numero: t
+        for t in Telefonos.query.filter(Telefonos.numero.in_(numeros), Telefonos.is_deleted.is_(False))
+    }
+    nuevos = []
+    for t_data in valid:
+        if t_data["numero"] not in by_numero:
+            nuevo_t = Telefonos(**t_data)
+            by_numero[nuevo_t.numero] = nuevo_t
+            nuevos.append(nuevo_t)
+    if nuevos:
+        db.session.add_all(nuevos)
+        db.session.flush()
+    return [by_numero[numero] for numero in numeros]
+
+def link_telefonos(db, link_model, owner_column, owner_id, telefonos):
+    """
+    Vincula los teléfonos a su dueño (persona, empresa o granja) en la tabla
+    intermedia link_model: consulta los vínculos que ya existen entre esos
+    teléfonos y el dueño, e inserta los que faltan en un solo statement.
+    """
+    ids = list(dict.fromkeys(ph.id for ph in telefonos))
+    if not ids:
+        return
+    owner = getattr(link_model, owner_column)
+    current = set(db.session.execute(
+        select(link_model.id_telefonos).where(owner == owner_id, link_model.id_telefonos.in_(ids))
+    ).scalars())
+    missing = [id_telefono for id_telefono in ids if id_telefono not in current]
+    if missing:
+        db.session.execute(insert(link_model), [
+            {owner_column: owner_id, "id_telefonos": id_telefono} for id_telefono in missing
+        ])
 
 def process_persona(db, persona_data):
     """
@@ -388,11 +498,7 @@ def process_persona(db, persona_data):
     created_phones = process_telefonos(db, telefonos_data)
     
     # Vincular teléfonos (evitar duplicados en la tabla intermedia)
-    current_links = [l.id_telefonos for l in PersonasTelefonos.query.filter_by(id_personas=persona.id).all()]
-    for ph in created_phones:
-        if ph.id not in current_links:
-            link = PersonasTelefonos(id_personas=persona.id, id_telefonos=ph.id)
-            db.session.add(link)
+    link_telefonos(db, PersonasTelefonos, "id_personas", persona.id, created_phones)
             
     return persona, created_phones
 
@@ -406,6 +512,13 @@ def get_enums():
         "tickets_estado": ['En proceso', 'Finalizado', 'Anulado']
     })
 
+@api_bp.route("/metadata/cache", methods=["GET"])
+@jwt_required()
+def get_cache_stats():
+    # Tamaño y tasa de aciertos de las cachés de datos de referencia y de
+    # impresión de tickets (desde el arranque del proceso)
+    return jsonify({"reference_cache": reference_cache.stats(), "print_cache": print_cache.stats()})
+
 # ---------- AUTH ----------
 @api_bp.route("/auth/login", methods=["POST"])
 def login():
@@ -457,6 +570,52 @@ def logout():
         jwt_blocklist.add(jti)
     return jsonify({"logged_out": True}), 200
 
+# ---------- CSV IMPORT ----------
+
+@api_bp.route("/import/<resource>", methods=["POST"])
+@jwt_required()
+def import_csv_resource(resource):
+    """
+    Carga masiva desde CSV: productos, vehiculos, ubicaciones o choferes.
+    El archivo va en el campo "file" (multipart) o como cuerpo text/csv.
+    Se lee fila por fila y se inserta en lotes de IMPORT_BATCH_SIZE, cada uno
+    en su propia transacción; las filas inválidas no detienen la carga y se
+    informan con su número de línea. ?encoding=latin-1 para CSV de Excel
+    guardados en ANSI (por defecto UTF-8).
+    """
+    from . import db
+    if resource not in CSV_IMPORTERS:
+        return jsonify({
+            "error": f"Importación no disponible para '{resource}'",
+            "recursos": list(CSV_IMPORTERS),
+        }), 404
+    upload = request.files.get("file")
+    raw = upload.stream if upload else request.stream
+    encoding = request.args.get("encoding", "utf-8-sig")
+    try:
+        text_stream = io.TextIOWrapper(raw, encoding=encoding, newline="")
+    except LookupError:
+        return jsonify({"error": f"Codificación desconocida: {encoding}"}), 400
+
+    try:
+        report = import_csv(
+            resource, text_stream,
+            batch_size=current_app.config["IMPORT_BATCH_SIZE"],
+            max_errors=current_app.config["IMPORT_MAX_ERRORS"],
+        )
+    except HeaderError as e:
+        return jsonify({"error": str(e), "columnas": list(CSV_IMPORTERS[resource]().columns)}), 400
+    except UnicodeDecodeError:
+        return jsonify({"error": "El archivo no está en la codificación indicada; pruebe con ?encoding=latin-1"}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Error interno: {str(e)}"}), 500
+    finally:
+        text_stream.detach()
+
+    # Si la lectura se cortó, los lotes anteriores ya quedaron guardados (el reporte lo indica)
+    return jsonify(report.to_dict()), 400 if report.aborted else 200
+
 # ---------- COMBINED ENDPOINTS ----------
 
 @api_bp.route("/combined/usuarios", methods=["POST"])
@@ -601,9 +760,7 @@ def create_empresa_transporte_combined():
         
         # 4. Handle Phones
         created_phones = process_telefonos(db, telefonos_data)
-        for ph in created_phones:
-            link = EmpresasTelefonos(id_empresas_transportes=empresa.id, id_telefonos=ph.id)
-            db.session.add(link)
+        link_telefonos(db, EmpresasTelefonos, "id_empresas_transportes", empresa.id, created_phones)
         
         db.session.commit()
         
@@ -685,9 +842,7 @@ def create_granja_combined():
 
         # 6. Handle Phones (De la Granja)
         created_phones = process_telefonos(db, telefonos_data)
-        for ph in created_phones:
-            link = GranjasTelefonos(id_granjas=granja.id, id_telefonos=ph.id)
-            db.session.add(link)
+        link_telefonos(db, GranjasTelefonos, "id_granjas", granja.id, created_phones)
         
         db.session.commit()
         
@@ -801,11 +956,7 @@ def update_usuario_combined(usuario_id):
         telefonos_data = persona_data.get("telefonos", [])
         if persona and telefonos_data:
             created_phones = process_telefonos(db, telefonos_data)
-            current_links = [l.id_telefonos for l in PersonasTelefonos.query.filter_by(id_personas=persona.id).all()]
-            for ph in created_phones:
-                if ph.id not in current_links:
-                    link = PersonasTelefonos(id_personas=persona.id, id_telefonos=ph.id)
-                    db.session.add(link)
+            link_telefonos(db, PersonasTelefonos, "id_personas", persona.id, created_phones)
 
         db.session.commit()
         return jsonify(serialize(usuario)), 200
@@ -929,18 +1080,57 @@ def list_resource(resource):
     per_page = request.args.get("per_page", 20, type=int)
     per_page = max(1, min(per_page, 100))
 
-    query = model.query.order_by(model.id)
+    # Proyección: ?fields=id,nombre (columnas del SELECT) y ?expand=rel.subrel|N (relaciones cargadas)
+    # Filtros y orden en SQL: ?estado=...&id_origen=1,2&fecha_primer_peso__gte=...&sort=-id
+    # (por defecto solo registros activos, is_deleted = 0)
+    try:
+        fields, plan = parse_projection(model, resource, request.args.get("fields"), request.args.get("expand"))
+        query = model.query.options(*projection_options(model, resource, fields, plan, reference_skip()))
+        query = apply_filters(query, model, request.args)
+        order = sort_columns(model, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    query = query.order_by(*order) if order else query.order_by(model.id)
+
+    # GET condicional: si las tablas involucradas no cambiaron, 304 sin consultar ni serializar
+    etag = resource_etag(model, resource, plan, request.full_path, request.headers.get("Accept"))
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+
+    # Modo cursor (opt-in): ?after=<cursor>&limit=  -> sin OFFSET ni COUNT(*)
+    after = request.args.get("after")
+    if after is not None:
+        if order and (request.args.get("sort") != "id" or request.args.get("order", "asc").lower() != "asc"):
+            return jsonify({"error": "El modo cursor solo admite orden ascendente por id"}), 400
+        try:
+            after_id = decode_cursor(after)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        limit = clamp_per_page(request.args.get("limit"), default=per_page)
+        rows, next_cursor = keyset_page(query, model, after_id, limit)
+        prefetch_references(rows, model, resource, plan)
+        response = jsonify({
+            "items": [serialize(x, resource, plan, fields) for x in rows],
+            "limit": limit,
+            "next_cursor": next_cursor
+        })
+        response.set_etag(etag)
+        return response
+
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    prefetch_references(pagination.items, model, resource, plan)
     # MODIFICADO: Pasamos resource a serialize
-    items = [serialize(x, resource) for x in pagination.items]
+    items = [serialize(x, resource, plan, fields) for x in pagination.items]
 
-    return jsonify({
+    response = jsonify({
         "items": items,
         "page": page,
         "per_page": per_page,
         "total": pagination.total,
         "pages": pagination.pages
     })
+    response.set_etag(etag)
+    return response
 
 @api_bp.route("/<resource>/all", methods=["GET"])
 @jwt_required()
@@ -948,9 +1138,28 @@ def list_resource_all(resource):
     model = MODEL_MAP.get(resource)
     if not model:
         return jsonify({"error": "Recurso no encontrado"}), 404
-    items = model.query.order_by(model.id).all()
-    # MODIFICADO: Pasamos resource a serialize
-    return jsonify([serialize(x, resource) for x in items])
+    try:
+        fields, plan = parse_projection(model, resource, request.args.get("fields"), request.args.get("expand"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    etag = resource_etag(model, resource, plan, request.full_path, request.headers.get("Accept"))
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+
+    # Streaming (Accept: application/x-ndjson o ?stream=1): filas por lotes, memoria constante
+    if wants_stream(request):
+        query = model.query.options(*projection_options(model, resource, fields, plan, reference_skip()))
+        response = stream_query(query, model.id, lambda x: serialize(x, resource, plan, fields),
+                                ndjson=wants_ndjson(request),
+                                prefetch=lambda batch: prefetch_references(batch, model, resource, plan))
+    else:
+        query = model.query.options(*projection_options(model, resource, fields, plan, reference_skip()))
+        items = query.order_by(model.id).all()
+        prefetch_references(items, model, resource, plan)
+        # MODIFICADO: Pasamos resource a serialize
+        response = jsonify([serialize(x, resource, plan, fields) for x in items])
+    response.set_etag(etag)
+    return response
 
 @api_bp.route("/bulk", methods=["POST"])
 @jwt_required()
@@ -960,25 +1169,69 @@ def bulk_resources():
     page = data.get("page", 1)
     per_page = data.get("per_page", 20)
     per_page = max(1, min(int(per_page), 100))
+    # Modo cursor (opt-in): "after": {"<recurso>": "<cursor>"}, "limit": N
+    # Los recursos sin cursor en "after" arrancan desde la primera página
+    cursors = data.get("after")
+    limit = clamp_per_page(data.get("limit"), default=per_page)
+    # Proyección por recurso: "fields": {"<recurso>": "id,nombre"}, "expand": {"<recurso>": "rel"}
+    fields_by_resource = data.get("fields") if isinstance(data.get("fields"), dict) else {}
+    expand_by_resource = data.get("expand") if isinstance(data.get("expand"), dict) else {}
+
+    def task(resource):
+        return lambda: _bulk_resource(
+            resource, int(page), per_page, cursors, limit,
+            fields_by_resource.get(resource), expand_by_resource.get(resource)
+        )
+
+    # Cada recurso se resuelve en paralelo (pool acotado, sesión propia por worker);
+    # el resultado se arma en el orden pedido y con el tiempo de cada rama
+    app = current_app._get_current_object()
+    outcomes = run_fanout(app, [(r, task(r)) for r in dict.fromkeys(resources)])
 
     result = {}
-    for resource in resources:
-        model = MODEL_MAP.get(resource)
-        if not model:
-            result[resource] = {"error": "Recurso no encontrado"}
-            continue
-        query = model.query.order_by(model.id)
-        pagination = query.paginate(page=int(page), per_page=per_page, error_out=False)
-        # MODIFICADO: Pasamos resource a serialize
-        items = [serialize(x, resource) for x in pagination.items]
-        result[resource] = {
-            "items": items,
-            "page": int(page),
-            "per_page": per_page,
-            "total": pagination.total,
-            "pages": pagination.pages
+    timings = []
+    for resource, resource_result, elapsed_ms in outcomes:
+        resource_result["elapsed_ms"] = round(elapsed_ms, 2)
+        result[resource] = resource_result
+        timings.append(f"{resource};dur={elapsed_ms:.2f}")
+    response = jsonify(result)
+    if timings:
+        response.headers["Server-Timing"] = ", ".join(timings)
+    return response
+
+def _bulk_resource(resource, page, per_page, cursors, limit, fields_spec, expand_spec):
+    """Página de un recurso para /bulk (se ejecuta dentro de un worker del fan-out)"""
+    model = MODEL_MAP.get(resource)
+    if not model:
+        return {"error": "Recurso no encontrado"}
+    try:
+        fields, plan = parse_projection(model, resource, fields_spec, expand_spec)
+    except ValueError as e:
+        return {"error": str(e)}
+    query = model.query.options(*projection_options(model, resource, fields, plan, reference_skip())).order_by(model.id)
+    if isinstance(cursors, dict):
+        try:
+            after_id = decode_cursor(cursors.get(resource))
+        except ValueError as e:
+            return {"error": str(e)}
+        rows, next_cursor = keyset_page(query, model, after_id, limit)
+        prefetch_references(rows, model, resource, plan)
+        return {
+            "items": [serialize(x, resource, plan, fields) for x in rows],
+            "limit": limit,
+            "next_cursor": next_cursor
         }
-    return jsonify(result)
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    prefetch_references(pagination.items, model, resource, plan)
+    # MODIFICADO: Pasamos resource a serialize
+    items = [serialize(x, resource, plan, fields) for x in pagination.items]
+    return {
+        "items": items,
+        "page": page,
+        "per_page": per_page,
+        "total": pagination.total,
+        "pages": pagination.pages
+    }
 
 @api_bp.route("/<resource>/<string:id_>", methods=["GET"])
 @jwt_required()
@@ -993,9 +1246,21 @@ def get_resource(resource, id_):
     if not str(id_).isdigit():
         return jsonify({"error": "ID inválido"}), 400
 
-    obj = model.query.get_or_404(int(id_))
+    try:
+        fields, plan = parse_projection(model, resource, request.args.get("fields"), request.args.get("expand"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # El id va en la variante: "usuarios/me" resuelve a un id distinto por usuario
+    etag = resource_etag(model, resource, plan, request.full_path, int(id_))
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+
+    obj = model.query.options(*projection_options(model, resource, fields, plan, reference_skip())).get_or_404(int(id_))
+    prefetch_references([obj], model, resource, plan)
     # MODIFICADO: Pasamos resource a serialize
-    return jsonify(serialize(obj, resource))
+    response = jsonify(serialize(obj, resource, plan, fields))
+    response.set_etag(etag)
+    return response
 
 @api_bp.route("/<resource>", methods=["POST"])
 @jwt_required()
@@ -1098,42 +1363,94 @@ def delete_resource(resource, id_):
 @api_bp.route("/serial/list", methods=["GET"])
 @jwt_required()
 def list_serial_ports():
-    ports = serial.tools.list_ports.comports()
-    result = []
-    for port in ports:
-        result.append({
-            "device": port.device,       
-            "name": port.name,
-            "description": port.description,
-            "hwid": port.hwid
-        })
-    return jsonify(result)
+    # Enumeración cacheada (services/scale.py); ?refresh=1 fuerza releer los puertos
+    refresh = request.args.get("refresh", "").lower() in ("1", "true", "yes")
+    ports = port_scanner.ports(current_app.config["SCALE_PORTS_TTL"], refresh=refresh)
+    return jsonify(ports)
 
-@api_bp.route("/serial/read", methods=["GET"])
+@api_bp.route("/serial/scales", methods=["GET"])
 @jwt_required()
-def read_serial():
-    SERIAL_PORT = 'COM2' 
-    BAUD_RATE = 9600
-    TIMEOUT = 5 
-    try:
-        with serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=TIMEOUT) as ser:
-            ser.reset_input_buffer() 
-            data_bytes = ser.readline()
-            if data_bytes:
-                data_str = data_bytes.decode('utf-8', errors='ignore').strip()
-                return jsonify({"data": data_str, "status": "success"})
-            else:
-                return jsonify({"error": "Tiempo de espera agotado, no se recibieron datos", "status": "timeout"}), 408
-    except serial.SerialException as e:
-        return jsonify({"error": f"No se pudo acceder al puerto {SERIAL_PORT}. Verifique conexión.", "details": str(e)}), 500
-    except Exception as e:
-        return jsonify({"error": "Error inesperado leyendo puerto serial", "details": str(e)}), 500
+def list_scales():
+    # Balanzas configuradas (SCALES) con el estado de su lector
+    return jsonify([reader.status() for reader in scale_registry.readers(current_app.config)])
+
+def _scale_reader(scale_id):
+    """Lector de la balanza pedida (la principal si scale_id es None) o None si no existe"""
+    return get_scale_reader(current_app.config, scale_id)
+
+SCALE_NOT_FOUND = {"error": "Balanza no encontrada"}
+
+@api_bp.route("/serial/read", methods=["GET"], defaults={"scale_id": None})
+@api_bp.route("/serial/<scale_id>/read", methods=["GET"])
+@jwt_required()
+def read_serial(scale_id):
+    # El puerto lo mantiene abierto el lector de fondo (services/scale.py):
+    # aquí solo se toma la última lectura vigente, sin abrir ni bloquear el puerto
+    config = current_app.config
+    reader = _scale_reader(scale_id)
+    if reader is None:
+        return jsonify(SCALE_NOT_FOUND), 404
+    reading = reader.wait_for_reading(config["SCALE_WAIT_TIMEOUT"], max_age=config["SCALE_STALE_AFTER"])
+    if reading is not None:
+        return jsonify({**reading_to_dict(reading), "status": "success"})
+    if reader.error:
+        return jsonify({"error": f"No se pudo acceder al puerto {reader.port}. Verifique conexión.", "details": reader.error}), 500
+    return jsonify({"error": "Tiempo de espera agotado, no se recibieron datos", "status": "timeout"}), 408
+
+@api_bp.route("/serial/stable", methods=["GET"], defaults={"scale_id": None})
+@api_bp.route("/serial/<scale_id>/stable", methods=["GET"])
+@jwt_required()
+def read_serial_stable(scale_id):
+    # Estado del detector de peso estable: peso promedio, variación, confianza y
+    # lock_id del bloqueo vigente (se envía en registrar_peso en lugar del peso)
+    reader = _scale_reader(scale_id)
+    if reader is None:
+        return jsonify(SCALE_NOT_FOUND), 404
+    return jsonify(reader.stability())
+
+@api_bp.route("/serial/stream", methods=["GET"], defaults={"scale_id": None})
+@api_bp.route("/serial/<scale_id>/stream", methods=["GET"])
+@jwt_required(locations=["headers", "query_string"])
+def stream_serial(scale_id):
+    # Server-Sent Events: cada lectura de la balanza se envía a todos los clientes
+    # conectados desde el único lector de fondo. EventSource no permite cabeceras,
+    # así que el token también se acepta como ?jwt=<token>.
+    config = current_app.config
+    reader = _scale_reader(scale_id)
+    if reader is None:
+        return jsonify(SCALE_NOT_FOUND), 404
+    heartbeat = config["SCALE_SSE_HEARTBEAT"]
+    queue_size = config["SCALE_SSE_QUEUE_SIZE"]
+
+    def events():
+        sub = reader.subscribe(queue_size)
+        try:
+            yield sse_message(event="status", data={"connected": reader.connected, "error": reader.error})
+            latest = reader.latest(config["SCALE_STALE_AFTER"])
+            if latest is not None:
+                yield sse_message(reading_to_dict(latest), event="reading")
+            connected = reader.connected
+            while True:
+                reading = sub.get(heartbeat)
+                if reader.connected != connected:
+                    connected = reader.connected
+                    yield sse_message(event="status", data={"connected": connected, "error": reader.error})
+                if reading is None:
+                    yield sse_message(comment="keep-alive")
+                    continue
+                # dropped: lecturas descartadas porque este cliente no alcanzaba a recibirlas
+                yield sse_message({**reading_to_dict(reading), "dropped": sub.dropped}, event="reading")
+        finally:
+            # El cliente se desconectó (o terminó el request): deja de recibir lecturas
+            reader.unsubscribe(sub)
+
+    return sse_response(events())
 
 @api_bp.route("/tickets_pesaje/registrar_peso", methods=["POST"])
 @jwt_required()
+@idempotent
 def registrar_peso_ticket():
     from . import db
-    from sqlalchemy import text
     import traceback
     try:
         data = request.get_json(force=True) or {}
@@ -1141,79 +1458,50 @@ def registrar_peso_ticket():
         peso = data.get("peso")
         id_usuario = get_jwt_identity()  # ID del usuario que realiza el segundo pesaje
 
-        if not id or peso is None:
-            return jsonify({"error": "Datos requeridos: id, peso"}), 400
-
-        ticket = TicketPesaje.query.filter_by(id=id, is_deleted=False).first()
-        if not ticket:
-            return jsonify({"error": "Ticket no encontrado"}), 404
-
-        # Determinar tipo de peso según el tipo de ticket
-        if ticket.tipo.lower() == "entrada":
-            tipo_peso = "tara"
-        elif ticket.tipo.lower() == "salida":
-            tipo_peso = "bruto"
-        else:
-            return jsonify({"error": "Tipo de ticket desconocido"}), 400
-
-        peso_decimal = Decimal(str(peso))
-
-        # Actualiza el campo correspondiente
-        if tipo_peso == "bruto":
-            db.session.execute(
-                text("UPDATE Ticket_pesaje SET peso_bruto = :peso WHERE id = :id AND is_deleted = 0"),
-                {"peso": peso_decimal, "id": id}
-            )
-        elif tipo_peso == "tara":
-            db.session.execute(
-                text("UPDATE Ticket_pesaje SET peso_tara = :peso WHERE id = :id AND is_deleted = 0"),
-                {"peso": peso_decimal, "id": id}
-            )
-
-        # Consulta los pesos actualizados directamente de la base de datos
-        result = db.session.execute(
-            text("SELECT peso_bruto, peso_tara FROM Ticket_pesaje WHERE id = :id AND is_deleted = 0"),
-            {"id": id}
-        ).fetchone()
-
-        peso_bruto = result.peso_bruto
-        peso_tara = result.peso_tara
-
-        if peso_bruto is not None and peso_tara is not None:
-            if ticket.tipo.lower() in ("entrada", "salida"):
-                peso_neto = abs(peso_bruto - peso_tara)
-            else:
-                peso_neto = None
-            db.session.execute(
-                text("""
-                    UPDATE Ticket_pesaje 
-                    SET peso_neto = :neto,
-                        id_usuarios_segundo_peso = :id_usuario,
-                        fecha_segundo_peso = :fecha
-                    WHERE id = :id AND is_deleted = 0
-                """),
-                {
-                    "neto": peso_neto,
-                    "id_usuario": id_usuario,
-                    "fecha": datetime.datetime.now(),
-                    "id": id
-                }
-            )
-        else:
-            db.session.execute(
-                text("UPDATE Ticket_pesaje SET estado = 'En Proceso' WHERE id = :id AND is_deleted = 0"),
-                {"id": id}
-            )
-
-        if ticket.id_producto != 1:
-            db.session.execute(
-                text("UPDATE Ticket_pesaje SET estado = 'Finalizado' WHERE id = :id AND is_deleted = 0"),
-                {"id": id}
-            )
+        # Peso bloqueado por el detector de estabilidad: el servidor toma el peso
+        # de la balanza, sin que el cliente tenga que leerlo y reenviarlo
+        lock_id = data.get("lock_id")
+        if lock_id is not None and peso is None:
+            if not str(lock_id).isdigit():
+                return jsonify({"error": "lock_id inválido"}), 400
+            config = current_app.config
+            # "balanza": id de la romana (SCALES); por defecto la principal
+            reader = get_scale_reader(config, data.get("balanza"))
+            if reader is None:
+                return jsonify(SCALE_NOT_FOUND), 404
+            lock = reader.stable_lock(int(lock_id), config["SCALE_LOCK_TTL"])
+            if lock is None:
+                return jsonify({"error": "El peso estable ya no está vigente, vuelva a leer la balanza"}), 409
+            peso = lock.weight
 
+        if not id or peso is None:
+            return jsonify({"error": "Datos requeridos: id, peso (o lock_id)"}), 400
+
+        # row_version: versión del ticket que vio el cliente (opcional).
+        # Si otro operador ya lo modificó, se responde 409 sin escribir.
+        row_version = data.get("row_version")
+        if row_version is not None and not isinstance(row_version, int):
+            return jsonify({"error": "row_version debe ser entero"}), 400
+
+        # Peso, neto, segundo operador y estado en un solo UPDATE que devuelve
+        # la fila (services/tickets.py): un solo disparo del trigger y sin
+        # ventana entre leer y escribir
+        row = register_weight(
+            db.session, id, Decimal(str(peso)), id_usuario, datetime.datetime.now(), row_version
+        )
+        if row is None:
+            current = current_row_version(db.session, id)
+            db.session.rollback()
+            if current is None:
+                return jsonify({"error": "Ticket no encontrado"}), 404
+            return jsonify({
+                "error": "El ticket fue modificado por otro operador, vuelva a cargarlo",
+                "row_version": current,
+            }), 409
+        body = get_serializer(TicketPesaje)(row)
+        record_response(body)
         db.session.commit()
-        ticket = TicketPesaje.query.filter_by(id=id, is_deleted=False).first()
-        return jsonify(serialize(ticket))
+        return jsonify(body)
     except Exception as e:
         db.session.rollback()
         print("ERROR EN registrar_peso_ticket:", e)
@@ -1223,51 +1511,47 @@ def registrar_peso_ticket():
 @api_bp.route("/tickets_pesaje/<int:ticket_id>/imprimir", methods=["POST"])
 @jwt_required()
 def imprimir_ticket(ticket_id):
-    ticket = TicketPesaje.query.get_or_404(ticket_id)
-    asignacion = Asignaciones.query.get(ticket.id_asignaciones) if ticket.id_asignaciones else None
-    placa = "N/A"
-    nombre_chofer = "N/A"
-    if asignacion:
-        # Vehículo
-        vehiculo = Vehiculos.query.get(asignacion.id_vehiculos) if asignacion.id_vehiculos else None
-        if vehiculo:
-            placa = vehiculo.placa
-
-        # Chofer
-        chofer = Choferes.query.get(asignacion.id_chofer) if asignacion.id_chofer else None
-        if chofer:
-            persona = Personas.query.get(chofer.id_personas) if chofer.id_personas else None
-            if persona:
-                nombre_chofer = f"{persona.nombre} {persona.apellido} - {persona.tipo_cedula}{persona.cedula}"
-
-
-    producto = Productos.query.get(ticket.id_producto)
-    nombre_producto = producto.nombre if producto else "N/A"
-    
-    fecha_str = ticket.created_at.strftime("%d/%m/%Y") if ticket.created_at else datetime.datetime.now().strftime("%d/%m/%Y")
-    hora_str = datetime.datetime.now().strftime("%I:%M:%S %p")
-    
-    p_tara = float(ticket.peso_tara) if ticket.peso_tara is not None else 0.0
-    p_bruto = float(ticket.peso_bruto) if ticket.peso_bruto is not None else 0.0
+    from . import db
+    # Un solo SELECT con joins; los tickets Finalizados salen de la caché (services/printing.py)
+    payload = print_payloads(db.session, [ticket_id]).get(ticket_id)
+    if payload is None:
+        return jsonify({"error": "Ticket no encontrado"}), 404
+    return jsonify(payload)
 
-    if p_bruto > 0 and p_tara > 0:
-        p_neto = float(ticket.peso_neto) if ticket.peso_neto is not None else abs(p_bruto - p_tara)
+@api_bp.route("/tickets_pesaje/imprimir", methods=["POST"])
+@jwt_required()
+def imprimir_tickets():
+    """
+    Impresión por lote: {"ids": [1, 2, ...]} o un turno completo con
+    {"desde": "2026-01-05T06:00", "hasta": "2026-01-05T14:00"} (por created_at,
+    hasta exclusivo; opcional "estado"). Retorna los payloads en orden, cada
+    uno con el id del ticket.
+    """
+    from . import db
+    data = request.get_json(force=True) or {}
+    ids = data.get("ids")
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return jsonify({"error": "ids debe ser una lista de enteros"}), 400
     else:
-        p_neto = 0.0
+        try:
+            desde = datetime.datetime.fromisoformat(data["desde"])
+            hasta = datetime.datetime.fromisoformat(data["hasta"])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"error": "Envíe ids, o desde y hasta (fecha y hora ISO)"}), 400
+        query = db.session.query(TicketPesaje.id).filter(
+            TicketPesaje.created_at >= desde,
+            TicketPesaje.created_at < hasta,
+            TicketPesaje.is_deleted.is_(False),
+        )
+        if data.get("estado"):
+            query = query.filter(TicketPesaje.estado == data["estado"])
+        ids = [id_ for (id_,) in query.order_by(TicketPesaje.created_at, TicketPesaje.id)]
 
+    payloads = print_payloads(db.session, ids)
     return jsonify({
-        "nro_ticket": ticket.nro_ticket,
-        "empresa": "AVICOLA LA ROSITA, S.A.",
-        "sucursal": "MARA I",
-        "tipo_proceso": ticket.tipo.upper() or 'ENTRADA/SALIDA',
-        "fecha": fecha_str,
-        "hora": hora_str,
-        "placa": placa,
-        "chofer": nombre_chofer,
-        "producto": nombre_producto,
-        "peso_tara": p_tara,
-        "peso_bruto": p_bruto,
-        "peso_neto": p_neto
+        "tickets": [{"id": id_, **payload} for id_, payload in payloads.items()],
+        "no_encontrados": [id_ for id_ in dict.fromkeys(ids) if id_ not in payloads],
     })
 
 @api_bp.route("/tickets_pesaje/<int:id>/reimpresiones", methods=["GET"])
@@ -1277,108 +1561,102 @@ def get_reimpresiones(id):
 
 @api_bp.route("/tickets_pesaje", methods=["POST"])
 @jwt_required()
+@idempotent
 def create_ticket_pesaje():
     from .models import TicketPesaje, Asignaciones, Ubicaciones
     from . import db
-    import uuid
+    import traceback
 
     data = request.get_json(force=True) or {}
 
     data.pop("nro_ticket", None)
     data.pop("peso_neto", None)
-    data.pop("fecha_primer_peso", None)  # ignorar frontend
-
-    # Hora del servidor SQL Server en formato ISO-8601 (string)
-    fecha_sql_iso = db.session.execute(
-        text("SELECT CONVERT(varchar(23), GETDATE(), 126)")
-    ).scalar()
-    data["fecha_primer_peso"] = fecha_sql_iso
+    data.pop("fecha_primer_peso", None)  # ignorar frontend: la pone el servidor SQL al insertar
 
     # Asegurar usuario primer peso desde JWT si no viene
     if not data.get("id_usuarios_primer_peso"):
         jwt_user_id = get_jwt_identity()
         data["id_usuarios_primer_peso"] = int(jwt_user_id) if str(jwt_user_id).isdigit() else jwt_user_id
 
-    # --- Asignación ---
-    id_asignaciones = data.get("id_asignaciones")
-    id_vehiculo = data.pop("id_vehiculo", None)
-    id_chofer = data.pop("id_chofer", None)
-    if not id_asignaciones and id_vehiculo and id_chofer:
-        asignacion = Asignaciones.query.filter_by(
-            id_vehiculos=id_vehiculo,
-            id_chofer=id_chofer,
-            is_deleted=False
-        ).first()
-        if not asignacion:
-            now = datetime.datetime.now()
-            asignacion = Asignaciones(
+    try:
+        # --- Asignación ---
+        id_asignaciones = data.get("id_asignaciones")
+        id_vehiculo = data.pop("id_vehiculo", None)
+        id_chofer = data.pop("id_chofer", None)
+        if not id_asignaciones and id_vehiculo and id_chofer:
+            asignacion = Asignaciones.query.filter_by(
                 id_vehiculos=id_vehiculo,
                 id_chofer=id_chofer,
-                fecha=now.date(),
-                hora=now.time()
+                is_deleted=False
+            ).first()
+            if not asignacion:
+                now = datetime.datetime.now()
+                asignacion = Asignaciones(
+                    id_vehiculos=id_vehiculo,
+                    id_chofer=id_chofer,
+                    fecha=now.date(),
+                    hora=now.time()
+                )
+                db.session.add(asignacion)
+                db.session.flush()
+            data["id_asignaciones"] = asignacion.id
+
+        # --- Ubicación Origen ---
+        id_origen = data.get("id_origen")
+        origen_data = data.pop("origen_data", None)
+        if not id_origen and origen_data:
+            # origen_data debe ser un dict con al menos nombre y tipo
+            direccion_data = origen_data.pop("direccion", {})
+            from .models import Direcciones
+            direccion = Direcciones(**direccion_data)
+            db.session.add(direccion)
+            db.session.flush()
+            origen = Ubicaciones(
+                id_direcciones=direccion.id,
+                **origen_data
             )
-            db.session.add(asignacion)
+            db.session.add(origen)
             db.session.flush()
-        data["id_asignaciones"] = asignacion.id
-
-    # --- Ubicación Origen ---
-    id_origen = data.get("id_origen")
-    origen_data = data.pop("origen_data", None)
-    if not id_origen and origen_data:
-        # origen_data debe ser un dict con al menos nombre y tipo
-        direccion_data = origen_data.pop("direccion", {})
-        from .models import Direcciones
-        direccion = Direcciones(**direccion_data)
-        db.session.add(direccion)
-        db.session.flush()
-        origen = Ubicaciones(
-            id_direcciones=direccion.id,
-            **origen_data
-        )
-        db.session.add(origen)
-        db.session.flush()
-        data["id_origen"] = origen.id
-
-    # --- Ubicación Destino ---
-    id_destino = data.get("id_destino")
-    destino_data = data.pop("destino_data", None)
-    if not id_destino and destino_data:
-        direccion_data = destino_data.pop("direccion", {})
-        from .models import Direcciones
-        direccion = Direcciones(**direccion_data)
-        db.session.add(direccion)
-        db.session.flush()
-        destino = Ubicaciones(
-            id_direcciones=direccion.id,
-            **destino_data
-        )
-        db.session.add(destino)
-        db.session.flush()
-        data["id_destino"] = destino.id
-
-    print("Received data for new ticket:", data)
-    ok, err = validate_payload(TicketPesaje, data, partial=False)
-    if not ok:
-        print("VALIDATION ERROR create_ticket_pesaje:", err, "PAYLOAD:", data)
-        return jsonify({"error": err, "payload": data}), 400
-
-    temp_code = f"PEND-{uuid.uuid4().hex[:8]}"
-    ticket = TicketPesaje(nro_ticket=temp_code, **data)
-    db.session.add(ticket)
-    db.session.flush()  # Asigna el id sin cerrar la transacción
-
-    ticket_id = ticket.id
-
-    db.session.commit()  # Guarda el registro con el nro_ticket temporal
-
-    # Ahora actualiza el nro_ticket real usando una consulta directa
-    real_code = f"TKT-{ticket_id:06d}"
-    db.session.query(TicketPesaje).filter_by(id=ticket_id).update({"nro_ticket": real_code})
-    db.session.commit()
-
-    # Recupera el ticket actualizado para serializarlo
-    ticket = TicketPesaje.query.get(ticket_id)
-    return jsonify(serialize(ticket)), 201
+            data["id_origen"] = origen.id
+
+        # --- Ubicación Destino ---
+        id_destino = data.get("id_destino")
+        destino_data = data.pop("destino_data", None)
+        if not id_destino and destino_data:
+            direccion_data = destino_data.pop("direccion", {})
+            from .models import Direcciones
+            direccion = Direcciones(**direccion_data)
+            db.session.add(direccion)
+            db.session.flush()
+            destino = Ubicaciones(
+                id_direcciones=direccion.id,
+                **destino_data
+            )
+            db.session.add(destino)
+            db.session.flush()
+            data["id_destino"] = destino.id
+
+        ok, err = validate_payload(TicketPesaje, data, partial=False, server_generated=TICKET_SERVER_GENERATED)
+        if not ok:
+            db.session.rollback()
+            return jsonify({"error": err, "payload": data}), 400
+
+        # Un solo statement: INSERT con nro_ticket (secuencia) y fecha del servidor,
+        # que devuelve la fila insertada; un solo commit (services/tickets.py)
+        row = insert_ticket(db.session, data)
+        body = get_serializer(TicketPesaje)(row)
+        # Con Idempotency-Key, la respuesta se guarda en la misma transacción
+        record_response(body, 201)
+        db.session.commit()
+        return jsonify(body), 201
+    except IntegrityError as e:
+        db.session.rollback()
+        return jsonify({"error": f"Error de integridad: {e.orig}"}), 409
+    except Exception as e:
+        db.session.rollback()
+        print("ERROR EN create_ticket_pesaje:", e)
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
 
 @api_bp.route("/tickets_pesaje/<int:ticket_id>/nota_entrega", methods=["POST"])
 @jwt_required()
@@ -1582,11 +1860,15 @@ def registrar_nota_entrega(ticket_id):
     )
     db.session.add(estadisticas)
 
+    # Resumen diario (Reportes_diarios): se recalcula antes del commit, en la
+    # misma transacción, el día y origen previos del ticket y los nuevos
+    rollup_ticket_written(db.session, ticket_id)
     # Cambia el estado del ticket a Finalizado
     db.session.execute(
-        text("UPDATE Ticket_pesaje SET estado = 'Finalizado' WHERE id = :id"),
+        text("UPDATE Ticket_pesaje SET estado = 'Finalizado', row_version = row_version + 1 WHERE id = :id"),
         {"id": ticket_id}
     )
+    ticket_written(db.session, ticket_id)
 
     db.session.commit()
     return jsonify({"status": "ok"})
@@ -1635,90 +1917,61 @@ def reporte_transporte_aves_sql():
     fecha_fin = request.args.get("fecha_fin")
     fecha = request.args.get("fecha")
 
-    # Usamos GROUP BY para colapsar cualquier duplicado por ticket
-    # Usamos MAX() en las tablas relacionadas para traer el registro más reciente/relevante
-    sql = """
-    SELECT 
-        tp.nro_ticket,
-        MAX(tp.estado) AS estado,
-        MAX(v.placa) AS placa,
-        MAX(CONCAT(p.nombre, ' ', p.apellido)) AS chofer,
-        MAX(vt.hora_salida_granja) AS hora_salida_granja,
-        MAX(vt.hora_llegada_romana) AS hora_llegada_romana,
-        MAX(vt.tiempo_transito) AS tiempo_recorrido,
-        MAX(vt.hora_inicio_descarga) AS hora_inicio_proceso,
-        MAX(vt.tiempo_espera) AS tiempo_espera,
-        MAX(u.nombre) AS granja,
-        MAX(vc.aves_recibidas) AS aves_contadas,
-        MAX(vc.aves_faltantes) AS aves_faltantes,
-        MAX(ISNULL(e.porcentaje_aves_faltantes, 0)) AS porcentaje_aves_faltantes,
-        MAX(ISNULL(tp.peso_neto, 0)) AS kilos_netos,
-        MAX(ISNULL(e.peso_promedio_aves, 0)) AS peso_promedio,
-        MAX(vc.aves_aho) AS aves_ahogadas,
-        MAX(ISNULL(e.porcentaje_aves_ahogadas, 0)) AS porcentaje_aves_ahogadas,
-        MAX(vc.numero_de_jaulas) AS numero_jaulas,
-        MAX(vc.aves_por_jaula) AS aves_por_jaula,
-        MAX(g.nro_galpon) AS numero_galpon,
-        MAX(l.fecha_alojamiento) AS fecha_alojamiento,
-        MAX(DATEDIFF(day, l.fecha_alojamiento, vt.hora_llegada_romana)) AS edad_aves
-    FROM Ticket_pesaje tp
-    LEFT JOIN Asignaciones a ON tp.id_asignaciones = a.id
-    LEFT JOIN Vehiculos v ON a.id_vehiculos = v.id
-    LEFT JOIN Choferes c ON a.id_chofer = c.id
-    LEFT JOIN Personas p ON c.id_personas = p.id
-    LEFT JOIN Viajes_tiempos vt ON vt.id_ticket = tp.id
-    LEFT JOIN Viajes_conteos vc ON vc.id_ticket = tp.id
-    LEFT JOIN Viajes_origen vo ON vo.id_ticket = tp.id
-    LEFT JOIN Lotes l ON vo.id_lote = l.id
-    LEFT JOIN Galpones g ON l.id_galpones = g.id
-    LEFT JOIN Granjas gr ON g.id_granja = gr.id
-    LEFT JOIN Ubicaciones u ON gr.id_ubicaciones = u.id
-    LEFT JOIN Estadisticas e ON e.id_ticket = tp.id
-    WHERE tp.estado = 'Finalizado'
-    """
-
-    params = {}
-    if fecha_inicio and fecha_fin:
-        sql += " AND CAST(vt.hora_llegada_romana AS DATE) BETWEEN :f_inicio AND :f_fin"
-        params["f_inicio"] = fecha_inicio
-        params["f_fin"] = fecha_fin
-    elif fecha:
-        sql += " AND CAST(vt.hora_llegada_romana AS DATE) = :fecha"
-        params["fecha"] = fecha
-
-    # Agrupamos por el número de ticket para asegurar unicidad
-    sql += " GROUP BY tp.nro_ticket ORDER BY MAX(vt.hora_llegada_romana) DESC"
-
-    try:
-        result = db.session.execute(text(sql), params)
-        data = []
-        
-        for r in result.mappings():
-            data.append({
-                "nro_ticket": r["nro_ticket"],
-                "estado": r["estado"],
-                "placa": r["placa"] or "N/A",
-                "chofer": r["chofer"] or "N/A",
-                "hora_salida_granja": str(r["hora_salida_granja"]) if r["hora_salida_granja"] else None,
-                "hora_llegada_romana": str(r["hora_llegada_romana"]) if r["hora_llegada_romana"] else None,
-                "tiempo_recorrido": str(r["tiempo_recorrido"]) if r["tiempo_recorrido"] else None,
-                "hora_inicio_proceso": str(r["hora_inicio_proceso"]) if r["hora_inicio_proceso"] else None,
-                "tiempo_espera": str(r["tiempo_espera"]) if r["tiempo_espera"] else None,
-                "granja": r["granja"] or "N/A",
+    # Rango [desde, hasta) de hora_llegada_romana (fecha_fin inclusive)
+    rango = None
+    if fecha or (fecha_inicio and fecha_fin):
+        try:
+            rango = arrival_range(fecha, fecha_inicio, fecha_fin)
+        except ValueError:
+            return jsonify({"error": "Fechas inválidas (AAAA-MM-DD)"}), 400
+
+    # ?resumen=1: totales por día y granja desde Reportes_diarios (una fila
+    # por día, granja y galpón) en lugar del detalle por ticket
+    if request.args.get("resumen") in ("1", "true"):
+        if rango is None:
+            return jsonify({"error": "Debe enviar fecha, o fecha_inicio y fecha_fin"}), 400
+        desde, hasta = rollup_days(fecha, fecha_inicio, fecha_fin)
+        rows = db.session.execute(text("""
+            SELECT rd.fecha, rd.id_granja, MAX(u.nombre) AS granja,
+                SUM(rd.tickets) AS tickets,
+                SUM(rd.total_aves) AS aves_contadas,
+                SUM(rd.aves_faltantes) AS aves_faltantes,
+                SUM(rd.aves_ahogadas) AS aves_ahogadas,
+                SUM(rd.peso_neto) AS kilos_netos,
+                SUM(rd.suma_peso_promedio) AS suma_peso_promedio,
+                SUM(rd.tickets_con_peso_promedio) AS tickets_con_peso_promedio
+            FROM Reportes_diarios rd
+            LEFT JOIN Granjas gr ON gr.id = rd.id_granja
+            LEFT JOIN Ubicaciones u ON u.id = gr.id_ubicaciones
+            WHERE rd.fecha >= :desde AND rd.fecha < :hasta
+            GROUP BY rd.fecha, rd.id_granja
+            ORDER BY rd.fecha DESC, rd.id_granja
+        """), {"desde": desde, "hasta": hasta}).mappings().all()
+
+        def totales(r):
+            con_peso = r["tickets_con_peso_promedio"] or 0
+            return {
+                "tickets": r["tickets"] or 0,
                 "aves_contadas": r["aves_contadas"] or 0,
                 "aves_faltantes": r["aves_faltantes"] or 0,
-                "porcentaje_aves_faltantes": float(r["porcentaje_aves_faltantes"]),
-                "kilos_netos": float(r["kilos_netos"]),
-                "peso_promedio": float(r["peso_promedio_aves"]),
                 "aves_ahogadas": r["aves_ahogadas"] or 0,
-                "porcentaje_aves_ahogadas": float(r["porcentaje_aves_ahogadas"]),
-                "numero_jaulas": r["numero_jaulas"] or 0,
-                "aves_por_jaula": r["aves_por_jaula"] or 0,
-                "numero_galpon": r["numero_galpon"] or "N/A",
-                "fecha_alojamiento": str(r["fecha_alojamiento"]) if r["fecha_alojamiento"] else None,
-                "edad_aves": r["edad_aves"] if r["edad_aves"] is not None else 0
-            })
-            
+                "kilos_netos": float(r["kilos_netos"] or 0),
+                "peso_promedio": float(r["suma_peso_promedio"]) / con_peso if con_peso else 0,
+            }
+
+        campos = ("tickets", "aves_contadas", "aves_faltantes", "aves_ahogadas", "kilos_netos",
+                  "suma_peso_promedio", "tickets_con_peso_promedio")
+        suma = {k: sum((r[k] or 0) for r in rows) for k in campos}
+        return jsonify({
+            "por_dia": [
+                {"fecha": str(r["fecha"]), "granja": r["granja"] or "N/A", **totales(r)} for r in rows
+            ],
+            "resumen": totales(suma),
+        }), 200
+
+    try:
+        query, params = transporte_query(rango)
+        data = [transporte_row(r) for r in db.session.execute(query, params).mappings()]
         return jsonify(data), 200
 
     except Exception as e:
@@ -1738,116 +1991,37 @@ def reporte_granja_dia():
     if not id_ubicacion_granja or (not fecha and not (fecha_inicio and fecha_fin)):
         return jsonify({"error": "Debe enviar id_granja (ubicación) y fecha, o fecha_inicio y fecha_fin"}), 400
 
-    # 1. Consulta de Detalles (Tickets)
-    sql = """
-        SELECT 
-    et.nombre AS empresa_transporte,
-    CONCAT(p.nombre, ' ', p.apellido) AS chofer,
-    v.placa,
-    vo.numero_de_orden,
-    g.nro_galpon,
-    l.codigo_lote AS nro_lote,
-    vc.total_aves AS cantidad_aves,
-    tp.peso_neto,
-    e.peso_prom_aves AS peso_promedio_aves
-        FROM Ticket_pesaje tp
-        LEFT JOIN Asignaciones a ON tp.id_asignaciones = a.id
-        LEFT JOIN Vehiculos v ON a.id_vehiculos = v.id
-        LEFT JOIN Empresas_transportes et ON v.id_empresas_transportes = et.id
-        LEFT JOIN Choferes c ON a.id_chofer = c.id
-        LEFT JOIN Personas p ON c.id_personas = p.id
-        LEFT JOIN Viajes_tiempos vt ON vt.id_ticket = tp.id
-        LEFT JOIN Viajes_origen vo ON vo.id_ticket = tp.id
-        LEFT JOIN Lotes l ON vo.id_lote = l.id
-        LEFT JOIN Galpones g ON l.id_galpones = g.id
-        LEFT JOIN Granjas gr ON g.id_granja = gr.id
-
-        -- 1. Agrupamos conteos para evitar duplicar las filas del ticket
-        LEFT JOIN (
-            SELECT id_ticket, SUM(aves_recibidas) AS total_aves
-            FROM Viajes_conteos
-            GROUP BY id_ticket
-        ) vc ON vc.id_ticket = tp.id
-
-        -- 2. Agrupamos estadísticas para evitar duplicar las filas del ticket
-        LEFT JOIN (
-            SELECT id_ticket, AVG(peso_promedio_aves) AS peso_prom_aves
-            FROM Estadisticas
-            GROUP BY id_ticket
-        ) e ON e.id_ticket = tp.id
-
-        WHERE tp.estado = 'Finalizado'
-        AND tp.id_origen = :id_ubicacion_granja
-    """
+    # 1. Consulta de Detalles (Tickets): Formato Nro. 1 (services/reports.py)
 
-    # 2. Consulta de Resumen
-    # Se eliminó el ';' al final y se agregó el JOIN a Viajes_tiempos (vt)
+    # 2. Consulta de Resumen: desde Reportes_diarios (services/rollup.py),
+    # una fila por día y galpón en lugar de recorrer todos los tickets del rango
     resumen_sql = """
         SELECT
-            COALESCE(SUM(vc.total_aves), 0) AS total_aves,
-            COALESCE(SUM(tp.peso_neto), 0) AS total_peso_neto,
-            COALESCE(AVG(e.peso_prom_aves), 0) AS peso_promedio
-        FROM Ticket_pesaje tp
-
-        -- Agrupamos conteos
-        LEFT JOIN (
-            SELECT id_ticket, SUM(aves_recibidas) AS total_aves
-            FROM Viajes_conteos
-            GROUP BY id_ticket
-        ) vc ON vc.id_ticket = tp.id
-
-        -- Agrupamos estadísticas
-        LEFT JOIN (
-            SELECT id_ticket, AVG(peso_promedio_aves) AS peso_prom_aves
-            FROM Estadisticas
-            GROUP BY id_ticket
-        ) e ON e.id_ticket = tp.id
-        
-        -- Agregamos vt para poder filtrar por fechas
-        LEFT JOIN Viajes_tiempos vt ON vt.id_ticket = tp.id
-
-        WHERE tp.estado = 'Finalizado'
-        AND tp.id_origen = :id_ubicacion_granja
+            COALESCE(SUM(total_aves), 0) AS total_aves,
+            COALESCE(SUM(peso_neto), 0) AS total_peso_neto,
+            COALESCE(SUM(suma_peso_promedio) / NULLIF(SUM(tickets_con_peso_promedio), 0), 0) AS peso_promedio
+        FROM Reportes_diarios
+        WHERE id_origen = :id_ubicacion_granja
+          AND fecha >= :desde AND fecha < :hasta
     """
 
-    params = {"id_ubicacion_granja": id_ubicacion_granja}
-
-    # 3. Filtrar por intervalo o por fecha única
-    if fecha_inicio and fecha_fin:
-        filtro_fechas = """
-            AND CAST(vt.hora_llegada_romana AS DATE) >= :fecha_inicio
-            AND CAST(vt.hora_llegada_romana AS DATE) <= :fecha_fin
-        """
-        sql += filtro_fechas
-        resumen_sql += filtro_fechas
-        params["fecha_inicio"] = fecha_inicio
-        params["fecha_fin"] = fecha_fin
-    elif fecha:
-        filtro_fechas = " AND CAST(vt.hora_llegada_romana AS DATE) = :fecha"
-        sql += filtro_fechas
-        resumen_sql += filtro_fechas
-        params["fecha"] = fecha
+    # 3. Filtrar por intervalo o por fecha única: rango [desde, hasta) sobre
+    # la columna (sin CAST) para usar idx_viajes_tiempos_llegada
+    try:
+        desde, hasta = rollup_days(fecha, fecha_inicio, fecha_fin)
+        rango = arrival_range(fecha, fecha_inicio, fecha_fin)
+    except ValueError:
+        return jsonify({"error": "Fechas inválidas (AAAA-MM-DD)"}), 400
     
     try:
         # Ejecutar consulta de tickets
-        result = db.session.execute(text(sql), params)
-        tickets = []
-        for row in result:
-            r = row._mapping
-            tickets.append({
-                "empresa_transporte": r["empresa_transporte"],
-                "chofer": r["chofer"],
-                "placa": r["placa"],
-                "numero_de_orden": r["numero_de_orden"],
-                "nro_galpon": r["nro_galpon"],
-                "nro_lote": r["nro_lote"],
-                "cantidad_aves": r["cantidad_aves"],
-                "peso_neto": float(r["peso_neto"]) if r["peso_neto"] is not None else 0,
-                "peso_promedio": float(r["peso_promedio_aves"]) if r["peso_promedio_aves"] is not None else 0
-            })
+        query, params = granja_query(id_ubicacion_granja, rango)
+        tickets = [granja_row(r) for r in db.session.execute(query, params).mappings()]
 
         # Ejecutar consulta de resumen
-        resumen = db.session.execute(text(resumen_sql), params).fetchone()
+        resumen = db.session.execute(text(resumen_sql), {
+            "id_ubicacion_granja": id_ubicacion_granja, "desde": desde, "hasta": hasta,
+        }).fetchone()
         
         # Validación extra en caso de que no haya resultados
         if resumen:
@@ -1870,4 +2044,56 @@ def reporte_granja_dia():
         }), 200
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
\ No newline at end of file
+        return jsonify({"error": str(e)}), 500
+
+def _export_args():
+    """((formato, periodo, rango), None) de una exportación, o (None, respuesta 400)"""
+    formato = request.args.get("formato", "csv").lower()
+    if formato not in EXPORT_FORMATS:
+        return None, (jsonify({"error": f"formato debe ser uno de {', '.join(EXPORT_FORMATS)}"}), 400)
+    fecha = request.args.get("fecha")
+    fecha_inicio = request.args.get("fecha_inicio")
+    fecha_fin = request.args.get("fecha_fin")
+    rango = None
+    if fecha or (fecha_inicio and fecha_fin):
+        try:
+            rango = arrival_range(fecha, fecha_inicio, fecha_fin)
+        except ValueError:
+            return None, (jsonify({"error": "Fechas inválidas (AAAA-MM-DD)"}), 400)
+    periodo = f"{fecha_inicio}_{fecha_fin}" if fecha_inicio and fecha_fin else fecha
+    return (formato, periodo, rango), None
+
+@api_bp.route("/reporte_transporte_aves_sql/export", methods=["GET"])
+@jwt_required()
+def exportar_reporte_transporte_aves():
+    """
+    Formato Nro. 2 (entradas) como CSV o XLSX (?formato=), con los mismos
+    filtros que el reporte. Las filas se leen con un cursor por lotes y se
+    escriben al archivo mientras se envía (respuesta chunked).
+    """
+    from . import db
+    args, error = _export_args()
+    if error:
+        return error
+    formato, periodo, rango = args
+    query, params = transporte_query(rango)
+    nombre = f"formato_2_entradas_{periodo}" if periodo else "formato_2_entradas"
+    return export_response(formato, nombre, FORMATO_2_COLUMNS, stream_rows(db.session, query, params),
+                           sheet_name="Formato Nro. 2")
+
+@api_bp.route("/reporte_granja_dia/export", methods=["GET"])
+@jwt_required()
+def exportar_reporte_granja_dia():
+    """Formato Nro. 1 (transportes de una granja) como CSV o XLSX; mismos parámetros que el reporte"""
+    from . import db
+    args, error = _export_args()
+    if error:
+        return error
+    formato, periodo, rango = args
+    id_ubicacion_granja = request.args.get("id_granja", type=int)
+    if not id_ubicacion_granja or rango is None:
+        return jsonify({"error": "Debe enviar id_granja (ubicación) y fecha, o fecha_inicio y fecha_fin"}), 400
+    query, params = granja_query(id_ubicacion_granja, rango)
+    nombre = f"formato_1_granja_{id_ubicacion_granja}_{periodo}"
+    return export_response(formato, nombre, FORMATO_1_COLUMNS, stream_rows(db.session, query, params),
+                           sheet_name="Formato Nro. 1")
@@ -0,0 +1,354 @@
+import csv
+import time
+
+from sqlalchemy import Boolean, Integer, Numeric, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..db import db
+from ..models import (
+    Productos, Vehiculos, Choferes, Ubicaciones, Personas, Direcciones, EmpresasTransporte,
+    TIPOS_UBICACION, TIPOS_CEDULA,
+)
+from .validation import validate_payload
+
+class RowError(ValueError):
+    """Fila inválida: se informa en el reporte y se salta"""
+
+class HeaderError(ValueError):
+    """El encabezado del CSV no tiene las columnas requeridas"""
+
+DIRECCION_REQUIRED = ("estado", "municipio", "sector")
+DIRECCION_OPTIONAL = ("pais", "descripcion")
+DIRECCION_COLUMNS = DIRECCION_REQUIRED + DIRECCION_OPTIONAL
+
+def _coerce(model, data):
+    """Convierte los textos del CSV al tipo de cada columna y valida con validate_payload"""
+    columns = model.__table__.c
+    values = {}
+    for name, value in data.items():
+        if value is not None:
+            col_type = columns[name].type
+            try:
+                if isinstance(col_type, Boolean):
+                    value = value.lower() in ("1", "true", "si", "sí", "yes")
+                elif isinstance(col_type, Integer):
+                    value = int(value)
+                elif isinstance(col_type, Numeric):
+                    value = float(value.replace(",", "."))
+            except ValueError:
+                raise RowError(f"'{name}' debe ser numérico")
+        values[name] = value
+    ok, err = validate_payload(model, values, partial=True)
+    if not ok:
+        raise RowError(err)
+    return values
+
+def _direccion(data):
+    direccion = {name: data.pop(name) for name in DIRECCION_COLUMNS}
+    if direccion["pais"] is None:
+        direccion["pais"] = Direcciones.__table__.c.pais.default.arg
+    return _coerce(Direcciones, direccion)
+
+def _existing(column, values, *criteria):
+    """Valores de `values` que ya existen en la columna (un SELECT ... IN por lote)"""
+    if not values:
+        return set()
+    stmt = select(column).where(column.in_(values), *criteria)
+    return set(db.session.execute(stmt).scalars())
+
+def _insert_returning_ids(model, rows, key):
+    """
+    INSERT de varias filas que devuelve los ids en el mismo orden que `rows`.
+    No depende de que la BDD devuelva las filas en orden (SQL Server no lo
+    garantiza con IDENTITY, y SQLAlchemy caería a un INSERT por fila): el
+    RETURNING trae también las columnas `key` y cada fila toma el id de una
+    devuelta con los mismos valores. Filas con la misma clave son iguales en
+    esas columnas, así que da igual cuál id toma cada una.
+    """
+    table = model.__table__
+    columns = [table.c[name] for name in key]
+    stmt = insert(table).returning(table.c.id, *columns)
+    ids = {}
+    for id_, *values in db.session.execute(stmt, rows):
+        ids.setdefault(tuple(values), []).append(id_)
+    return [ids[tuple(row.get(name) for name in key)].pop() for row in rows]
+
+class CsvImporter:
+    """
+    Importación de un recurso desde CSV. Cada subclase define las columnas,
+    cómo validar una fila (parse), las validaciones que consultan la BDD por
+    lote (check) y la inserción del lote (insert, con executemany).
+    """
+    model = None
+    required = ()
+    optional = ()
+
+    def __init__(self):
+        # Claves únicas ya vistas en el archivo (duplicados dentro del CSV)
+        self.seen = set()
+
+    @property
+    def columns(self):
+        return self.required + self.optional
+
+    def check_header(self, fieldnames):
+        missing = [name for name in self.required if name not in (fieldnames or ())]
+        if missing:
+            raise HeaderError(f"Faltan columnas en el encabezado: {', '.join(missing)}")
+
+    def parse(self, raw):
+        data = {}
+        for name in self.columns:
+            value = (raw.get(name) or "").strip()
+            data[name] = value or None
+        missing = [name for name in self.required if data[name] is None]
+        if missing:
+            raise RowError(f"Faltan campos requeridos: {', '.join(missing)}")
+        return self.validate(data)
+
+    def validate(self, data):
+        return _coerce(self.model, data)
+
+    def check(self, batch, report):
+        """Descarta (e informa) las filas del lote que chocan con datos de la BDD"""
+        return batch
+
+    def insert(self, rows):
+        db.session.execute(insert(self.model.__table__), rows)
+
+    def unique(self, batch, report, key, column, label):
+        """Filtra las filas cuyo valor `key` está repetido en el archivo o ya existe (activo) en la BDD"""
+        existing = _existing(column, {data[key] for _, data in batch}, self.model.is_deleted.is_(False))
+        ok = []
+        for line, data in batch:
+            value = data[key]
+            if value in existing:
+                report.error(line, f"{label} ya existe: {value}")
+            elif value in self.seen:
+                report.error(line, f"{label} repetido en el archivo: {value}")
+            else:
+                self.seen.add(value)
+                ok.append((line, data))
+        return ok
+
+class EmpresaMixin:
+    """Valida id_empresas_transportes contra las empresas activas (consultas cacheadas por importación)"""
+
+    def known_empresas(self, ids):
+        cache = self.__dict__.setdefault("_empresas", {})
+        unknown = [i for i in ids if i not in cache]
+        found = _existing(EmpresasTransporte.id, unknown, EmpresasTransporte.is_deleted.is_(False))
+        for i in unknown:
+            cache[i] = i in found
+        return {i for i in ids if cache[i]}
+
+    def check_empresas(self, batch, report):
+        valid = self.known_empresas({data["id_empresas_transportes"] for _, data in batch})
+        ok = []
+        for line, data in batch:
+            if data["id_empresas_transportes"] in valid:
+                ok.append((line, data))
+            else:
+                report.error(line, f"Empresa de transporte no encontrada: {data['id_empresas_transportes']}")
+        return ok
+
+class ProductosImporter(CsvImporter):
+    model = Productos
+    required = ("nombre", "codigo")
+
+    def check(self, batch, report):
+        return self.unique(batch, report, "codigo", Productos.codigo, "codigo")
+
+class VehiculosImporter(EmpresaMixin, CsvImporter):
+    model = Vehiculos
+    required = ("placa", "id_empresas_transportes")
+
+    def validate(self, data):
+        data["placa"] = data["placa"].upper()
+        return super().validate(data)
+
+    def check(self, batch, report):
+        batch = self.check_empresas(batch, report)
+        return self.unique(batch, report, "placa", Vehiculos.placa, "placa")
+
+class UbicacionesImporter(CsvImporter):
+    model = Ubicaciones
+    required = ("nombre", "tipo") + DIRECCION_REQUIRED
+    optional = DIRECCION_OPTIONAL
+
+    def validate(self, data):
+        direccion = _direccion(data)
+        if data["tipo"] not in TIPOS_UBICACION:
+            raise RowError(f"tipo debe ser uno de: {', '.join(TIPOS_UBICACION)}")
+        data = _coerce(Ubicaciones, data)
+        data["direccion"] = direccion
+        return data
+
+    def insert(self, rows):
+        ids = _insert_returning_ids(Direcciones, [row["direccion"] for row in rows], DIRECCION_COLUMNS)
+        db.session.execute(insert(Ubicaciones.__table__), [
+            {"id_direcciones": id_dir, "nombre": row["nombre"], "tipo": row["tipo"]}
+            for row, id_dir in zip(rows, ids)
+        ])
+
+class ChoferesImporter(EmpresaMixin, CsvImporter):
+    """
+    Una fila = persona + dirección + empresa. Si ya existe una persona con la
+    cédula se reutiliza (como process_persona, pero sin actualizar sus datos);
+    si esa persona ya es chofer, la fila se rechaza.
+    Los teléfonos se siguen cargando con /combined/choferes.
+    """
+    model = Choferes
+    required = ("nombre", "apellido", "tipo_cedula", "cedula", "id_empresas_transportes") + DIRECCION_REQUIRED
+    optional = DIRECCION_OPTIONAL
+
+    def validate(self, data):
+        direccion = _direccion(data)
+        data["tipo_cedula"] = data["tipo_cedula"].upper()
+        if data["tipo_cedula"] not in TIPOS_CEDULA:
+            raise RowError(f"tipo_cedula debe ser uno de: {', '.join(TIPOS_CEDULA)}")
+        chofer = _coerce(Choferes, {"id_empresas_transportes": data.pop("id_empresas_transportes")})
+        persona = _coerce(Personas, data)
+        return {"persona": persona, "direccion": direccion, **chofer}
+
+    def check(self, batch, report):
+        batch = self.check_empresas(batch, report)
+        cedulas = {data["persona"]["cedula"] for _, data in batch}
+        personas = dict(db.session.execute(
+            select(Personas.cedula, Personas.id).where(Personas.cedula.in_(cedulas), Personas.is_deleted.is_(False))
+        ).all()) if cedulas else {}
+        choferes = _existing(Choferes.id_personas, set(personas.values()), Choferes.is_deleted.is_(False))
+        ok = []
+        for line, data in batch:
+            cedula = data["persona"]["cedula"]
+            if cedula in self.seen:
+                report.error(line, f"cedula repetida en el archivo: {cedula}")
+            elif personas.get(cedula) in choferes:
+                report.error(line, f"La persona con cédula {cedula} ya está registrada como Chofer")
+            else:
+                self.seen.add(cedula)
+                data["id_personas"] = personas.get(cedula)
+                ok.append((line, data))
+        return ok
+
+    def insert(self, rows):
+        # Los ids nuevos quedan en un dict local: si el lote se revierte, el
+        # reintento fila por fila vuelve a crear la persona (las filas no cambian)
+        new = [row for row in rows if row["id_personas"] is None]
+        created = {}
+        if new:
+            dir_ids = _insert_returning_ids(Direcciones, [row["direccion"] for row in new], DIRECCION_COLUMNS)
+            persona_ids = _insert_returning_ids(Personas, [
+                {**row["persona"], "id_direcciones": id_dir} for row, id_dir in zip(new, dir_ids)
+            ], ("cedula",))
+            created = {row["persona"]["cedula"]: id_persona for row, id_persona in zip(new, persona_ids)}
+        db.session.execute(insert(Choferes.__table__), [
+            {
+                "id_personas": row["id_personas"] or created[row["persona"]["cedula"]],
+                "id_empresas_transportes": row["id_empresas_transportes"],
+            }
+            for row in rows
+        ])
+
+IMPORTERS = {
+    "productos": ProductosImporter,
+    "vehiculos": VehiculosImporter,
+    "ubicaciones": UbicacionesImporter,
+    "choferes": ChoferesImporter,
+}
+
+class ImportReport:
+    def __init__(self, resource, max_errors):
+        self.resource = resource
+        self.max_errors = max_errors
+        self.total = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self.batches = 0
+        # Motivo si la lectura se cortó a mitad de archivo (los lotes anteriores quedan guardados)
+        self.aborted = None
+        self.started = time.perf_counter()
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"fila": line, "error": message})
+
+    def to_dict(self):
+        return {
+            "recurso": self.resource,
+            "filas": self.total,
+            "insertadas": self.inserted,
+            "con_error": self.failed,
+            "lotes": self.batches,
+            "segundos": round(time.perf_counter() - self.started, 3),
+            "errores": sorted(self.errors, key=lambda e: e["fila"]),
+            "errores_truncados": self.failed > len(self.errors),
+            **({"error": self.aborted} if self.aborted else {}),
+        }
+
+def _sniff_delimiter(text_stream):
+    """',' o ';' (Excel en español exporta con ';') según la primera línea"""
+    header = text_stream.readline()
+    delimiter = ";" if header.count(";") > header.count(",") else ","
+    return header, delimiter
+
+def import_csv(resource, text_stream, batch_size=1000, max_errors=500):
+    """
+    Lee el CSV fila por fila (sin cargarlo entero en memoria) y lo inserta en
+    lotes de batch_size filas, cada lote en su propia transacción.
+    Retorna el ImportReport (con aborted si el archivo no se pudo leer
+    completo). Lanza HeaderError si faltan columnas.
+    """
+    importer = IMPORTERS[resource]()
+    report = ImportReport(resource, max_errors)
+    header, delimiter = _sniff_delimiter(text_stream)
+    fieldnames = [name.strip().lower() for name in next(csv.reader([header], delimiter=delimiter), [])]
+    importer.check_header(fieldnames)
+    reader = csv.DictReader(text_stream, fieldnames=fieldnames, delimiter=delimiter)
+
+    batch = []
+    try:
+        for raw in reader:
+            # Número de línea del archivo (el encabezado es la 1)
+            line = reader.line_num + 1
+            if not any(raw.values()):
+                continue
+            report.total += 1
+            try:
+                batch.append((line, importer.parse(raw)))
+            except RowError as e:
+                report.error(line, str(e))
+            if len(batch) >= batch_size:
+                _import_batch(importer, batch, report)
+                batch = []
+    except (UnicodeDecodeError, csv.Error) as e:
+        report.aborted = f"Lectura interrumpida en la línea {reader.line_num + 1}: {e}"
+        return report
+    if batch:
+        _import_batch(importer, batch, report)
+    return report
+
+def _import_batch(importer, batch, report):
+    report.batches += 1
+    rows = importer.check(batch, report)
+    if not rows:
+        return
+    try:
+        importer.insert([data for _, data in rows])
+        db.session.commit()
+        report.inserted += len(rows)
+        return
+    except SQLAlchemyError:
+        db.session.rollback()
+    # La BDD rechazó el lote (p. ej. un duplicado creado mientras tanto):
+    # se reintenta fila por fila para saber cuáles fallan
+    for line, data in rows:
+        try:
+            importer.insert([data])
+            db.session.commit()
+            report.inserted += 1
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            report.error(line, f"Error de base de datos: {str(getattr(e, 'orig', e))[:200]}")
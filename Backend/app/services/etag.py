@@ -0,0 +1,166 @@
+import hashlib
+import re
+import time
+from collections import defaultdict
+from functools import lru_cache
+from threading import Lock, local
+
+from flask import Response
+from sqlalchemy import BigInteger, cast, event, func, literal, literal_column, null, select, text, union_all
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from ..db import db
+from .prefetch import EXPANSION_TREE, plan_includes, subplan
+
+# Columna rowversion (migración 8d3f5a1c6e29, solo SQL Server): SQL Server la
+# cambia en cada INSERT/UPDATE de la fila, venga de donde venga la escritura
+ROW_STAMP = "row_stamp"
+# Tablas con ROW_STAMP, por engine (se consulta una vez)
+_stamped = {}
+# Vigencia (s) de un ETag de tablas sin ROW_STAMP (ver table_fingerprint)
+_fallback_ttl = 60
+
+# Contador de escrituras confirmadas por tabla (en este proceso). Solo se usa
+# para las tablas sin ROW_STAMP (SQLite de los benchmarks, tablas sin migrar):
+# cubre los UPDATE de este proceso que no cambian COUNT(*) ni MAX(id).
+_generations = defaultdict(int)
+_generations_lock = Lock()
+# Tablas escritas por la transacción que se está confirmando en este hilo
+_pending = local()
+
+# Funciones a notificar con las tablas escritas después de cada commit
+_commit_listeners = []
+
+# Tablas que los triggers de BDD/TRIGGERS AVIGES.sql modifican al escribir en otra
+TRIGGER_DEPENDENCIES = {
+    "Ticket_pesaje": ("Viajes_tiempos", "Estadisticas"),
+}
+
+# Al inicio del statement o después de un ";" (lotes T-SQL con DECLARE / SET previos)
+_DML_TABLE = re.compile(r"(?:^|;)\s*(?:UPDATE|INSERT\s+INTO|DELETE\s+FROM|MERGE(?:\s+INTO)?)\s+[\[\"`]?(\w+)", re.IGNORECASE)
+
+def _on_execute(conn, cursor, statement, parameters, context, executemany):
+    tables = _DML_TABLE.findall(statement)
+    if tables:
+        conn.info.setdefault("_etag_touched", set()).update(tables)
+
+def _on_commit(conn):
+    # El evento "commit" del engine ocurre ANTES del COMMIT real; el contador se
+    # sube en after_commit de la sesión, cuando los datos ya son visibles.
+    # Si se subiera antes, un lector podría asociar la huella nueva a datos viejos.
+    touched = conn.info.pop("_etag_touched", None)
+    if touched:
+        if not hasattr(_pending, "tables"):
+            _pending.tables = set()
+        _pending.tables |= touched
+
+def _on_rollback(conn):
+    conn.info.pop("_etag_touched", None)
+
+def _on_session_commit(session):
+    touched = getattr(_pending, "tables", None)
+    if not touched:
+        return
+    _pending.tables = set()
+    for table in list(touched):
+        touched.update(TRIGGER_DEPENDENCIES.get(table, ()))
+    with _generations_lock:
+        for table in touched:
+            _generations[table.lower()] += 1
+    for listener in _commit_listeners:
+        listener({table.lower() for table in touched})
+
+def _on_session_rollback(session):
+    _pending.tables = set()
+
+def install_write_tracking(fallback_ttl=60):
+    """
+    Registra los eventos que detectan INSERT/UPDATE/DELETE (ORM o SQL directo
+    vía db.session): avisan a los commit listeners (cachés) y suben el
+    contador de la tabla al confirmarse la transacción. fallback_ttl acota la
+    vigencia de los ETag de tablas sin ROW_STAMP.
+    """
+    global _fallback_ttl
+    _fallback_ttl = fallback_ttl
+    if not event.contains(Engine, "after_cursor_execute", _on_execute):
+        event.listen(Engine, "after_cursor_execute", _on_execute)
+        event.listen(Engine, "commit", _on_commit)
+        event.listen(Engine, "rollback", _on_rollback)
+        event.listen(Session, "after_commit", _on_session_commit)
+        event.listen(Session, "after_rollback", _on_session_rollback)
+
+def add_commit_listener(fn):
+    """Registra fn(tablas) para recibir las tablas (en minúsculas) escritas en cada commit"""
+    if fn not in _commit_listeners:
+        _commit_listeners.append(fn)
+
+@lru_cache(maxsize=256)
+def tables_for(model, resource_name, plan=None):
+    """Tablas cuyo contenido aparece en la respuesta (el modelo + las relaciones expandidas)"""
+    tables = {model.__table__}
+    for rel_name, child_resource in EXPANSION_TREE.get(resource_name, {}).items():
+        if not plan_includes(plan, rel_name):
+            continue
+        prop = getattr(model, rel_name).property
+        if prop.secondary is not None:
+            tables.add(prop.secondary)
+        child_model = prop.mapper.class_
+        if child_resource:
+            tables |= tables_for(child_model, child_resource, subplan(plan, rel_name))
+        else:
+            tables.add(child_model.__table__)
+    return frozenset(tables)
+
+def stamped_tables(session):
+    """Tablas (en minúsculas) que tienen ROW_STAMP; vacío fuera de SQL Server"""
+    engine = session.get_bind()
+    tables = _stamped.get(engine)
+    if tables is None:
+        tables = frozenset()
+        if engine.dialect.name == "mssql":
+            tables = frozenset(name.lower() for name in session.execute(text(
+                "SELECT TABLE_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE COLUMN_NAME = :column"
+            ), {"column": ROW_STAMP}).scalars())
+        _stamped[engine] = tables
+    return tables
+
+def table_fingerprint(tables):
+    """
+    Huella barata de un conjunto de tablas en una sola consulta: COUNT(*),
+    MAX(id) y MAX(row_stamp) por tabla (cada uno con un índice). Sale del
+    estado de la BDD, así que ve las escrituras de cualquier proceso.
+    Las tablas sin ROW_STAMP usan el contador de escrituras de este proceso
+    y un período de _fallback_ttl segundos: su ETag deja de valer a lo sumo
+    en ese tiempo, aunque la escritura la haya hecho otro proceso.
+    """
+    ordered = sorted(tables, key=lambda t: t.name)
+    stamped = stamped_tables(db.session)
+    stmt = union_all(*(
+        select(
+            literal(t.name).label("t"), func.count().label("n"), func.max(t.c.id).label("max_id"),
+            (cast(func.max(literal_column(ROW_STAMP)), BigInteger) if t.name.lower() in stamped
+             else cast(null(), BigInteger)).label("stamp"),
+        ).select_from(t)
+        for t in ordered
+    ))
+    rows = db.session.execute(stmt).all()
+    unstamped = [t.name for t in ordered if t.name.lower() not in stamped]
+    fallback = ()
+    if unstamped:
+        with _generations_lock:
+            generations = [(name, _generations[name.lower()]) for name in unstamped]
+        fallback = (generations, int(time.time() // _fallback_ttl) if _fallback_ttl else None)
+    return repr((sorted(tuple(r) for r in rows), fallback))
+
+def resource_etag(model, resource_name, plan, *variant):
+    """ETag fuerte para una respuesta: huella de las tablas involucradas + variante (URL, Accept, ...)"""
+    fingerprint = table_fingerprint(tables_for(model, resource_name, plan))
+    digest = hashlib.sha1(repr((fingerprint, variant)).encode("utf-8")).hexdigest()
+    return digest
+
+def not_modified(etag):
+    """Respuesta 304 sin cuerpo (no se consulta ni se serializa nada)"""
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
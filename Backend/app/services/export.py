@@ -0,0 +1,211 @@
+import csv
+import datetime
+import decimal
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from flask import Response, stream_with_context
+
+# Exportación de reportes como archivo, escrito mientras se leen las filas:
+# la respuesta es chunked y la memoria queda acotada a un lote, sin armar la
+# lista completa ni el archivo completo antes de enviarlo.
+
+EXPORT_FORMATS = ("csv", "xlsx")
+CSV_MIMETYPE = "text/csv"
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Filas que se acumulan antes de enviar un chunk
+CHUNK_ROWS = 500
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, decimal.Decimal):
+        return format(value, "f")
+    return value
+
+def csv_chunks(columns, rows):
+    """
+    CSV con encabezados, en chunks de CHUNK_ROWS filas. Empieza con BOM para
+    que Excel lo abra como UTF-8 (acentos y ñ).
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(header for _, header in columns)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(_csv_value(row[key]) for key, _ in columns)
+        if i % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+# --- XLSX ---
+# Un .xlsx es un zip de XML. zipfile escribe sin seek sobre un destino que no
+# lo permite (con data descriptors), así que la hoja se comprime a medida que
+# se escriben las filas y los bytes se envían apenas salen del compresor.
+# Las celdas de texto van inline (sin sharedStrings, que obligaría a guardar
+# todos los textos hasta el final).
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Estilos (índice de cellXfs): 0 normal, 1 encabezado en negrita,
+# 2 fecha y hora (formato 22), 3 fecha (formato 14)
+_STYLE_HEADER, _STYLE_DATETIME, _STYLE_DATE = 1, 2, 3
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="4">'
+    '<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '</cellXfs>'
+    '</styleSheet>'
+)
+
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_END = '</sheetData></worksheet>'
+
+# Caracteres de control que XML 1.0 no admite
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_EXCEL_EPOCH = datetime.datetime(1899, 12, 30)
+
+class _Sink:
+    """Destino del zip sin seek ni tell: acumula los bytes hasta que se envían"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def _text_cell(value, style=0):
+    value = _INVALID_XML.sub("", str(value))
+    s = f' s="{style}"' if style else ""
+    return f'<c t="inlineStr"{s}><is><t xml:space="preserve">{escape(value)}</t></is></c>'
+
+def _cell(value):
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, datetime.datetime):
+        serial = (value.replace(tzinfo=None) - _EXCEL_EPOCH).total_seconds() / 86400
+        return f'<c s="{_STYLE_DATETIME}"><v>{serial!r}</v></c>'
+    if isinstance(value, datetime.date):
+        return f'<c s="{_STYLE_DATE}"><v>{(value - _EXCEL_EPOCH.date()).days}</v></c>'
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return f"<c><v>{value}</v></c>"
+    return _text_cell(value)
+
+def _sheet_name(name):
+    # Excel: hasta 31 caracteres y sin []:*?/\
+    return escape(re.sub(r"[\[\]:*?/\\]", "_", name)[:31] or "Hoja1", {'"': "&quot;"})
+
+def xlsx_chunks(columns, rows, sheet_name="Hoja1"):
+    """
+    XLSX de una hoja con encabezados en negrita, en chunks de CHUNK_ROWS
+    filas. Fechas y números se escriben como tales (no como texto).
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _ROOT_RELS)
+        zf.writestr("xl/workbook.xml", _WORKBOOK.format(name=_sheet_name(sheet_name)))
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        zf.writestr("xl/styles.xml", _STYLES)
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            header = "".join(_text_cell(title, _STYLE_HEADER) for _, title in columns)
+            sheet.write(f"{_SHEET_START}<row>{header}</row>".encode())
+            lines = []
+            for i, row in enumerate(rows, 1):
+                lines.append("<row>" + "".join(_cell(row[key]) for key, _ in columns) + "</row>")
+                if i % CHUNK_ROWS == 0:
+                    sheet.write("".join(lines).encode())
+                    lines.clear()
+                    data = sink.take()
+                    if data:
+                        yield data
+            sheet.write(("".join(lines) + _SHEET_END).encode())
+    yield sink.take()
+
+def export_response(formato, filename, columns, rows, sheet_name="Hoja1"):
+    """
+    Respuesta chunked con el archivo `filename` (sin extensión) en el formato
+    pedido (csv o xlsx). `rows` es un iterable de mappings que se consume
+    mientras se envía la respuesta (ver reports.stream_rows).
+    """
+    if formato == "xlsx":
+        chunks, mimetype = xlsx_chunks(columns, rows, sheet_name), XLSX_MIMETYPE
+    else:
+        chunks, mimetype = csv_chunks(columns, rows), CSV_MIMETYPE
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}.{formato}"'
+    response.headers["Cache-Control"] = "no-store"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
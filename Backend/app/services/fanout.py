@@ -0,0 +1,42 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from ..db import db
+from .refcache import reference_cache
+
+_executor = None
+_executor_lock = Lock()
+
+def _get_executor(max_workers):
+    """Pool compartido por todos los requests: acota las conexiones que /bulk puede tomar a la vez"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bulk")
+        return _executor
+
+def _run_task(app, fn):
+    start = time.perf_counter()
+    # App context propio: Flask-SQLAlchemy asocia la sesión al contexto, así que
+    # cada worker usa su propia sesión y su propia conexión del pool, que se
+    # devuelve al cerrar el contexto (teardown -> db.session.remove()).
+    with app.app_context():
+        reference_cache.begin()
+        try:
+            result = fn()
+        except Exception as e:
+            db.session.rollback()
+            result = {"error": f"Error interno: {str(e)}"}
+    return result, (time.perf_counter() - start) * 1000
+
+def run_fanout(app, tasks):
+    """
+    Ejecuta tasks = [(nombre, callable), ...] en paralelo sobre el pool acotado
+    y devuelve [(nombre, resultado, ms), ...] en el mismo orden de entrada.
+    Con una sola tarea se ejecuta en el hilo del request (sin costo de pool).
+    """
+    if len(tasks) <= 1:
+        return [(name, *_run_task(app, fn)) for name, fn in tasks]
+    executor = _get_executor(app.config.get("BULK_MAX_WORKERS", 4))
+    futures = [(name, executor.submit(_run_task, app, fn)) for name, fn in tasks]
+    return [(name, *future.result()) for name, future in futures]
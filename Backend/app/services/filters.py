@@ -0,0 +1,142 @@
+import datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from sqlalchemy import (
+    inspect as sa_inspect, false, true,
+    Integer, Numeric, Float, Boolean, Date, DateTime, Time, String, Text,
+)
+from .serializers import SENSITIVE_FIELDS
+
+# Parámetros de query string que no son filtros
+RESERVED_PARAMS = {"page", "per_page", "after", "limit", "fields", "expand", "stream", "sort", "order"}
+
+# Operadores de rango: ?peso_neto__gte=100&fecha_primer_peso__lt=2026-02-01
+RANGE_OPS = {
+    "gt": lambda col, v: col > v,
+    "gte": lambda col, v: col >= v,
+    "lt": lambda col, v: col < v,
+    "lte": lambda col, v: col <= v,
+}
+RANGE_TYPES = (Integer, Numeric, Float, Date, DateTime, Time)
+
+def _parse_bool(raw):
+    value = raw.lower()
+    if value in ("1", "true", "yes"):
+        return True
+    if value in ("0", "false", "no"):
+        return False
+    raise ValueError
+
+def _parse_datetime(raw):
+    # Se acepta fecha sola (medianoche) o ISO completo
+    return datetime.datetime.fromisoformat(raw)
+
+def _parser_for(col_type):
+    if isinstance(col_type, Boolean):
+        return _parse_bool
+    if isinstance(col_type, Integer):
+        return int
+    if isinstance(col_type, Float):
+        return float
+    if isinstance(col_type, Numeric):
+        return Decimal
+    if isinstance(col_type, DateTime):
+        return _parse_datetime
+    if isinstance(col_type, Date):
+        return datetime.date.fromisoformat
+    if isinstance(col_type, Time):
+        return datetime.time.fromisoformat
+    return str
+
+@lru_cache(maxsize=None)
+def filterable_columns(model):
+    """
+    Lista blanca de columnas filtrables/ordenables del modelo:
+    todas menos las sensibles y los Text (descripciones libres).
+    Retorna {nombre: (atributo, parser, admite_rango)}.
+    """
+    columns = {}
+    for prop in sa_inspect(model).column_attrs:
+        col = prop.columns[0]
+        if col.name in SENSITIVE_FIELDS or isinstance(col.type, Text):
+            continue
+        columns[col.name] = (
+            getattr(model, prop.key),
+            _parser_for(col.type),
+            isinstance(col.type, RANGE_TYPES),
+        )
+    return columns
+
+def _convert(name, parser, raw):
+    try:
+        return parser(raw)
+    except (ValueError, TypeError, InvalidOperation):
+        raise ValueError(f"Valor inválido para '{name}': {raw}")
+
+def apply_filters(query, model, args):
+    """
+    Compila los filtros del query string a expresiones SQLAlchemy.
+      - col=valor          igualdad
+      - col=v1,v2          IN (enteros y strings)
+      - col__gte=valor     rangos (también gt, lt, lte) sobre números, fechas y horas
+      - is_deleted         por defecto solo activos (is_deleted = 0); is_deleted=all lo desactiva
+    Se filtra la columna directamente (sin CAST ni funciones) para que SQL Server
+    pueda usar los índices, incluidos los filtrados por is_deleted = 0.
+    Lanza ValueError si un parámetro no está en la lista blanca o su valor es inválido.
+    """
+    columns = filterable_columns(model)
+    conditions = []
+
+    for key in args:
+        if key in RESERVED_PARAMS:
+            continue
+        name, _, op = key.partition("__")
+        if name not in columns:
+            raise ValueError(f"Filtro no permitido: '{key}'")
+        attr, parser, supports_range = columns[name]
+        for raw in args.getlist(key):
+            if name == "is_deleted" and not op and raw == "all":
+                continue
+            if op:
+                if op not in RANGE_OPS or not supports_range:
+                    raise ValueError(f"Operador no permitido: '{key}'")
+                conditions.append(RANGE_OPS[op](attr, _convert(name, parser, raw)))
+            elif "," in raw and parser in (int, str):
+                values = [_convert(name, parser, v.strip()) for v in raw.split(",") if v.strip()]
+                conditions.append(attr.in_(values))
+            elif parser is _parse_bool:
+                # Literal (no parámetro) para que coincida con los índices filtrados
+                conditions.append(attr == (true() if _convert(name, parser, raw) else false()))
+            else:
+                conditions.append(attr == _convert(name, parser, raw))
+
+    if "is_deleted" in columns and "is_deleted" not in args:
+        conditions.append(columns["is_deleted"][0] == false())
+
+    return query.filter(*conditions) if conditions else query
+
+def sort_columns(model, args):
+    """
+    Orden pedido con ?sort=col1,-col2&order=asc|desc ("-" invierte esa columna;
+    order aplica a las que no llevan prefijo). Siempre se desempata por id.
+    Retorna la lista de expresiones ORDER BY o None si no se pidió orden.
+    """
+    sort = args.get("sort")
+    if not sort:
+        return None
+    descending = args.get("order", "asc").lower() == "desc"
+    columns = filterable_columns(model)
+    clauses = []
+    names = []
+    for item in (s.strip() for s in sort.split(",") if s.strip()):
+        desc = descending
+        if item.startswith("-"):
+            desc, item = True, item[1:]
+        if item not in columns:
+            raise ValueError(f"Orden no permitido: '{item}'")
+        attr = columns[item][0]
+        clauses.append(attr.desc() if desc else attr.asc())
+        names.append(item)
+    if "id" not in names:
+        clauses.append(model.id.asc())
+    return clauses
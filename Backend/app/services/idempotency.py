@@ -0,0 +1,115 @@
+import datetime
+import hashlib
+from functools import wraps
+from itertools import count
+
+from flask import Response, current_app, g, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete, select
+
+from ..db import db
+from ..models import SolicitudesIdempotentes
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+# Cada cuántas respuestas guardadas (en este proceso) se borran las vencidas
+EVICT_EVERY = 200
+
+_stored = count(1)
+
+def idempotent(fn):
+    """
+    Decorador para POST que escriben en la BDD (va debajo de jwt_required).
+
+    Con el header Idempotency-Key:
+      - Si la clave ya tiene una respuesta vigente, se repite tal cual (con
+        Idempotent-Replayed: true) sin ejecutar la vista.
+      - Si no, se ejecuta la vista, que llama a record_response() antes de su
+        commit: la respuesta se guarda en la misma transacción que la escritura,
+        así que o quedan las dos o ninguna.
+      - Dos reintentos simultáneos chocan en el índice único de la clave: el
+        segundo falla al confirmar (la vista responde un error, 409 si captura
+        el IntegrityError o 500) y se responde con lo que guardó el primero.
+      - La misma clave con otro cuerpo responde 422.
+    Sin el header, la vista se ejecuta como siempre.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return fn(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({"error": f"{HEADER} admite hasta {MAX_KEY_LENGTH} caracteres"}), 400
+
+        clave = f"{get_jwt_identity()}:{key}"
+        huella = _fingerprint()
+        replay = _replay(clave, huella)
+        if replay is not None:
+            return replay
+
+        g.idempotency = (clave, huella)
+        try:
+            response = current_app.make_response(fn(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            replay = _replay(clave, huella)
+            if replay is not None:
+                return replay
+            raise
+        finally:
+            g.pop("idempotency", None)
+        if not 200 <= response.status_code < 300:
+            # Por ejemplo, el commit falló porque un reintento simultáneo ya guardó la clave
+            db.session.rollback()
+            replay = _replay(clave, huella)
+            if replay is not None:
+                return replay
+        return response
+    return wrapper
+
+def record_response(body, status=200):
+    """
+    Agrega la respuesta a la transacción en curso si el request trae
+    Idempotency-Key. Se llama justo antes del commit de la vista.
+    """
+    pending = g.get("idempotency")
+    if pending is None:
+        return
+    clave, huella = pending
+    now = datetime.datetime.now()
+    ttl = datetime.timedelta(hours=current_app.config["IDEMPOTENCY_TTL_HOURS"])
+    db.session.add(SolicitudesIdempotentes(
+        clave=clave,
+        huella=huella,
+        estado_http=status,
+        respuesta=current_app.json.dumps(body),
+        created_at=now,
+        expires_at=now + ttl,
+    ))
+    if next(_stored) % EVICT_EVERY == 0:
+        db.session.execute(delete(SolicitudesIdempotentes).where(SolicitudesIdempotentes.expires_at < now))
+
+def _fingerprint():
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.path}\n".encode("utf-8"))
+    digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+def _replay(clave, huella):
+    """Respuesta guardada para la clave, o None si no hay una vigente"""
+    model = SolicitudesIdempotentes
+    row = db.session.execute(
+        select(model.huella, model.estado_http, model.respuesta, model.expires_at).where(model.clave == clave)
+    ).first()
+    if row is None:
+        return None
+    now = datetime.datetime.now()
+    if row.expires_at < now:
+        # Vencida: se borra junto con la escritura de este request (si no hay commit, queda para la limpieza)
+        db.session.execute(delete(model).where(model.clave == clave, model.expires_at < now))
+        return None
+    if row.huella != huella:
+        return jsonify({"error": f"{HEADER} ya se usó con otra solicitud"}), 422
+    response = Response(row.respuesta, status=row.estado_http, mimetype="application/json")
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
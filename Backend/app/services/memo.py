@@ -0,0 +1,52 @@
+from flask import request, has_request_context
+
+class SerializationMemo:
+    """
+    Memo de serialización con alcance de request, indexado por
+    (modelo, id, recurso). Un mismo objeto anidado (empresa, dirección, RIF,
+    chofer...) referenciado por muchas filas se expande y convierte una sola
+    vez por respuesta; las demás referencias reutilizan el mismo dict.
+    Los dicts guardados no deben mutarse después de devolverse.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        data = self.entries.get(key)
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        self.entries[key] = data
+
+    def clear(self):
+        """Libera las entradas conservando los contadores (usado al hacer streaming por lotes)"""
+        self.entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
+
+def current_memo():
+    """Memo del request actual (None fuera de un request, p. ej. en scripts o benchmarks)"""
+    if not has_request_context():
+        return None
+    # Se guarda en el objeto request (no en g) para que nunca sobreviva al request,
+    # aunque el app context se reutilice
+    req = request._get_current_object()
+    memo = getattr(req, "_serialization_memo", None)
+    if memo is None:
+        memo = req._serialization_memo = SerializationMemo()
+    return memo
+
+def memo_stats_header():
+    """Valor para la cabecera X-Serialize-Memo, o None si el request no serializó nada"""
+    memo = getattr(request._get_current_object(), "_serialization_memo", None)
+    if memo is None:
+        return None
+    return "hits={hits}; misses={misses}; entries={entries}".format(**memo.stats())
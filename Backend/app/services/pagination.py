@@ -0,0 +1,45 @@
+import base64
+import binascii
+
+MAX_PER_PAGE = 100
+
+def clamp_per_page(value, default=20):
+    """Normaliza per_page/limit al rango permitido (1..100)"""
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        value = default
+    return max(1, min(value, MAX_PER_PAGE))
+
+def encode_cursor(last_id):
+    """Cursor opaco para el cliente a partir del último id entregado"""
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """
+    Devuelve el id a partir del cual seguir. Un cursor vacío significa
+    "desde el principio" (primera página). Lanza ValueError si es inválido.
+    """
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError("Cursor inválido")
+    prefix, _, value = raw.partition(":")
+    if prefix != "id" or not value.isdigit():
+        raise ValueError("Cursor inválido")
+    return int(value)
+
+def keyset_page(query, model, after_id, limit):
+    """
+    Paginación por cursor: busca por la PK (WHERE id > :after ORDER BY id)
+    en lugar de OFFSET, y no ejecuta COUNT(*). Se pide una fila extra solo
+    para saber si hay página siguiente.
+    Retorna (filas, next_cursor) con next_cursor = None en la última página.
+    """
+    rows = query.filter(model.id > after_id).order_by(None).order_by(model.id).limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1].id)
+    return rows, None
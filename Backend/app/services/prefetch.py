@@ -0,0 +1,141 @@
+from functools import lru_cache
+from sqlalchemy.orm import selectinload
+
+# Árbol de expansión que recorre expand_resource en routes.py:
+# recurso -> {relación del modelo: recurso con el que se serializa el hijo}.
+# None indica que el hijo se serializa plano (sin expandir más niveles).
+# Si se agrega una expansión en expand_resource, debe reflejarse aquí.
+EXPANSION_TREE = {
+    "usuarios": {"rol": "roles", "persona": "personas"},
+    "personas": {"direccion": None, "telefonos": None},
+    "choferes": {"persona": "personas", "empresa": "empresas_transporte"},
+    "vehiculos": {"empresa": "empresas_transporte"},
+    "empresas_transporte": {"direccion": None, "rif": None, "telefonos": None},
+    "granjas": {
+        "rif": None,
+        "telefonos": None,
+        "ubicacion": "ubicaciones",
+        "responsable": "personas",
+    },
+    "ubicaciones": {"direccion": None},
+    "galpones": {"granja": "granjas"},
+    "lotes": {"galpon": "galpones"},
+    "asignaciones": {"vehiculo": "vehiculos", "chofer": "choferes"},
+    "tickets_pesaje": {
+        "producto": "productos",
+        "asignacion": "asignaciones",
+        "operador_entrada": None,
+        "operador_salida": None,
+        "origen": "ubicaciones",
+        "destino": "ubicaciones",
+    },
+}
+
+# Profundidad máxima de ?expand= (ticket -> asignacion -> chofer -> persona -> direccion)
+MAX_EXPAND_DEPTH = 4
+
+class ExpandPlan:
+    """
+    Subconjunto del árbol de expansión pedido por el cliente (?expand=).
+    children: {relación: ExpandPlan}. Un plan sin hijos no expande nada.
+    Se usa plan=None para indicar "árbol completo" (comportamiento por defecto).
+    Es inmutable y hasheable para poder usarse como clave de caché.
+    """
+    __slots__ = ("children", "_key")
+
+    def __init__(self, children=None):
+        self.children = dict(children or {})
+        self._key = tuple(sorted((rel, sub._key) for rel, sub in self.children.items()))
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __eq__(self, other):
+        return isinstance(other, ExpandPlan) and self._key == other._key
+
+NO_EXPANSION = ExpandPlan()
+
+def plan_includes(plan, rel_name):
+    return plan is None or rel_name in plan.children
+
+def subplan(plan, rel_name):
+    return None if plan is None else plan.children[rel_name]
+
+def _full_plan(resource_name, depth):
+    if depth <= 0:
+        return NO_EXPANSION
+    return ExpandPlan({
+        rel: _full_plan(child, depth - 1) if child else NO_EXPANSION
+        for rel, child in EXPANSION_TREE.get(resource_name, {}).items()
+    })
+
+def _merge(a, b):
+    children = dict(a.children)
+    for rel, sub in b.children.items():
+        children[rel] = _merge(children[rel], sub) if rel in children else sub
+    return ExpandPlan(children)
+
+def build_plan(resource_name, expand):
+    """
+    Traduce ?expand= a un ExpandPlan validado contra EXPANSION_TREE.
+      - "" / "0" / "none": sin expansión (se devuelven las FKs como ids)
+      - "N": árbol completo hasta N niveles (máximo MAX_EXPAND_DEPTH)
+      - "asignacion.chofer.persona,producto": solo esas rutas
+    Acepta también una lista de rutas. Lanza ValueError si una ruta no existe.
+    """
+    if isinstance(expand, str):
+        expand = [p.strip() for p in expand.split(",") if p.strip()]
+    paths = list(expand or [])
+    if not paths or paths == ["none"]:
+        return NO_EXPANSION
+    if len(paths) == 1 and paths[0].isdigit():
+        return _full_plan(resource_name, min(int(paths[0]), MAX_EXPAND_DEPTH))
+
+    plan = NO_EXPANSION
+    for path in paths:
+        parts = path.split(".")
+        if len(parts) > MAX_EXPAND_DEPTH:
+            raise ValueError(f"expand '{path}' supera la profundidad máxima ({MAX_EXPAND_DEPTH})")
+        current = resource_name
+        node = None
+        for rel in reversed(parts):
+            node = ExpandPlan({rel: node or NO_EXPANSION})
+        # Validar la ruta recorriendo el árbol
+        for rel in parts:
+            tree = EXPANSION_TREE.get(current, {}) if current else {}
+            if rel not in tree:
+                raise ValueError(f"expand '{path}': relación desconocida '{rel}'")
+            current = tree[rel]
+        plan = _merge(plan, node)
+    return plan
+
+def _load_options(model, resource_name, plan, skip):
+    options = []
+    for rel_name, child_resource in EXPANSION_TREE.get(resource_name, {}).items():
+        if not plan_includes(plan, rel_name):
+            continue
+        rel = getattr(model, rel_name)
+        if rel.property.mapper.class_ in skip:
+            continue
+        option = selectinload(rel)
+        if child_resource:
+            child_options = _load_options(rel.property.mapper.class_, child_resource, subplan(plan, rel_name), skip)
+            if child_options:
+                option = option.options(*child_options)
+        options.append(option)
+    return options
+
+# Acotado: los planes vienen de ?expand= y pueden variar por cliente
+@lru_cache(maxsize=256)
+def prefetch_options(model, resource_name, plan=None, skip=frozenset()):
+    """
+    Devuelve las opciones de carga para query.options(...) que resuelven todas
+    las FKs de la página en lote: por cada relación del árbol se emite un solo
+    SELECT ... WHERE id IN (...) con los ids recolectados de todas las filas,
+    en lugar de un Model.query.get() por fila.
+    El número de consultas queda constante sin importar cuántas filas se listen.
+    Con un ExpandPlan solo se cargan las relaciones incluidas en el plan.
+    skip: modelos que no se cargan aquí porque los resuelve la caché de
+    referencia (services/refcache.py).
+    """
+    return tuple(_load_options(model, resource_name, plan, skip))
@@ -0,0 +1,204 @@
+import datetime
+import re
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from ..models import TicketPesaje, Asignaciones, Vehiculos, Choferes, Personas, Productos
+from .refcache import ReferenceCache
+
+EMPRESA = "AVICOLA LA ROSITA, S.A."
+SUCURSAL = "MARA I"
+
+# Tablas (además de Ticket_pesaje) de las que sale el payload de impresión y
+# columnas de cada una que aparecen en él (o que llevan a otra tabla)
+PRINT_DEPENDENCIES = {
+    Asignaciones: ("id_vehiculos", "id_chofer"),
+    Vehiculos: ("placa",),
+    Choferes: ("id_personas",),
+    Personas: ("nombre", "apellido", "tipo_cedula", "cedula"),
+    Productos: ("nombre",),
+}
+PRINT_TABLES = frozenset(m.__table__.name.lower() for m in PRINT_DEPENDENCIES)
+
+# Columnas del ticket que aparecen en el payload (cambiar otras, como
+# reimpresiones, no invalida la caché)
+PAYLOAD_FIELDS = ("nro_ticket", "tipo", "estado", "created_at", "peso_tara", "peso_bruto", "peso_neto",
+                  "id_asignaciones", "id_producto")
+
+# Máximo de ids por SELECT ... IN (SQL Server admite 2100 parámetros)
+CHUNK_SIZE = 1000
+
+_STALE_KEY = "print_cache_stale"
+# Filas (tabla, id) de PRINT_TABLES modificadas, y tablas escritas con un
+# UPDATE/DELETE masivo o SQL directo (sin ids conocidos)
+_STALE_ROWS_KEY = "print_cache_stale_rows"
+
+# UPDATE/DELETE/MERGE en SQL directo (los INSERT no cambian tickets ya cacheados)
+_DML_TABLE = re.compile(r"(?:^|;)\s*(?:UPDATE|DELETE\s+FROM|MERGE(?:\s+INTO)?)\s+[\[\"`]?(\w+)", re.IGNORECASE)
+
+# Payloads de tickets Finalizados (ya no cambian): clave = id del ticket.
+# Cada entrada depende de las filas que usó, como (tabla, id), y de esas
+# tablas por nombre. Se descarta al confirmarse una escritura del ticket
+# (ticket_written), de una de sus filas (asignación, vehículo, chofer,
+# persona, producto) o un UPDATE/DELETE sin ids de una de sus tablas, y por TTL.
+# Crear asignaciones o personas nuevas no descarta nada.
+print_cache = ReferenceCache()
+
+def _payload_query(ids):
+    """Ticket + asignación + vehículo + chofer + persona + producto en un solo SELECT"""
+    t = TicketPesaje
+    return (
+        select(
+            t.id, t.nro_ticket, t.tipo, t.estado, t.created_at, t.peso_tara, t.peso_bruto, t.peso_neto,
+            Vehiculos.placa,
+            Personas.nombre.label("chofer_nombre"), Personas.apellido.label("chofer_apellido"),
+            Personas.tipo_cedula, Personas.cedula,
+            Productos.nombre.label("producto"),
+            t.id_asignaciones, t.id_producto, Asignaciones.id_vehiculos, Asignaciones.id_chofer,
+            Choferes.id_personas,
+        )
+        .select_from(t)
+        .outerjoin(Asignaciones, Asignaciones.id == t.id_asignaciones)
+        .outerjoin(Vehiculos, Vehiculos.id == Asignaciones.id_vehiculos)
+        .outerjoin(Choferes, Choferes.id == Asignaciones.id_chofer)
+        .outerjoin(Personas, Personas.id == Choferes.id_personas)
+        .outerjoin(Productos, Productos.id == t.id_producto)
+        .where(t.id.in_(ids))
+    )
+
+def _build_payload(row):
+    """Payload sin la hora de impresión (la agrega print_payloads en cada llamada)"""
+    nombre_chofer = "N/A"
+    if row.chofer_nombre is not None:
+        nombre_chofer = f"{row.chofer_nombre} {row.chofer_apellido} - {row.tipo_cedula}{row.cedula}"
+
+    p_tara = float(row.peso_tara) if row.peso_tara is not None else 0.0
+    p_bruto = float(row.peso_bruto) if row.peso_bruto is not None else 0.0
+    if p_bruto > 0 and p_tara > 0:
+        p_neto = float(row.peso_neto) if row.peso_neto is not None else abs(p_bruto - p_tara)
+    else:
+        p_neto = 0.0
+
+    return {
+        "nro_ticket": row.nro_ticket,
+        "empresa": EMPRESA,
+        "sucursal": SUCURSAL,
+        "tipo_proceso": (row.tipo or "").upper() or 'ENTRADA/SALIDA',
+        "fecha": row.created_at.strftime("%d/%m/%Y") if row.created_at else None,
+        "placa": row.placa if row.placa is not None else "N/A",
+        "chofer": nombre_chofer,
+        "producto": row.producto if row.producto is not None else "N/A",
+        "peso_tara": p_tara,
+        "peso_bruto": p_bruto,
+        "peso_neto": p_neto,
+    }
+
+def _dependencies(row):
+    """Filas (tabla, id) y tablas de las que sale el payload"""
+    rows = (
+        (Asignaciones, row.id_asignaciones), (Vehiculos, row.id_vehiculos), (Choferes, row.id_chofer),
+        (Personas, row.id_personas), (Productos, row.id_producto),
+    )
+    return PRINT_TABLES | {(model.__table__.name.lower(), id_) for model, id_ in rows if id_ is not None}
+
+def print_payloads(session, ids):
+    """
+    Payloads de impresión {id: payload} de los tickets `ids`, en el mismo
+    orden (sin los que no existen). Los Finalizados salen de la caché; los demás se
+    resuelven con un SELECT con joins por cada CHUNK_SIZE ids.
+    """
+    ids = list(dict.fromkeys(ids))
+    payloads = {}
+    missing = []
+    for id_ in ids:
+        cached = print_cache.get(id_)
+        if cached is None:
+            missing.append(id_)
+        else:
+            payloads[id_] = cached
+    for start in range(0, len(missing), CHUNK_SIZE):
+        for row in session.execute(_payload_query(missing[start:start + CHUNK_SIZE])):
+            payload = _build_payload(row)
+            payloads[row.id] = payload
+            if row.estado == "Finalizado":
+                print_cache.put(row.id, payload, _dependencies(row))
+
+    now = datetime.datetime.now()
+    hoy = now.strftime("%d/%m/%Y")
+    hora = now.strftime("%I:%M:%S %p")
+    # Copias: los valores de la caché son compartidos entre hilos
+    return {
+        id_: {**payloads[id_], "fecha": payloads[id_]["fecha"] or hoy, "hora": hora}
+        for id_ in ids if id_ in payloads
+    }
+
+def ticket_written(session, ticket_id):
+    """
+    Marca el ticket como modificado en la transacción de la sesión: su payload
+    cacheado se descarta cuando se confirme. Para escrituras con SQL directo;
+    las del ORM se detectan solas.
+    """
+    session.info.setdefault(_STALE_KEY, set()).add(ticket_id)
+
+def _on_ticket_update(mapper, connection, target):
+    state = inspect(target)
+    if state.session is not None and any(state.attrs[name].history.has_changes() for name in PAYLOAD_FIELDS):
+        ticket_written(state.session, target.id)
+
+def _on_ticket_delete(mapper, connection, target):
+    session = inspect(target).session
+    if session is not None:
+        ticket_written(session, target.id)
+
+def _rows_written(session, keys):
+    session.info.setdefault(_STALE_ROWS_KEY, set()).update(keys)
+
+def _on_dependency_update(mapper, connection, target):
+    state = inspect(target)
+    fields = PRINT_DEPENDENCIES[mapper.class_]
+    if state.session is not None and any(state.attrs[name].history.has_changes() for name in fields):
+        _rows_written(state.session, {(mapper.local_table.name.lower(), target.id)})
+
+def _on_dependency_delete(mapper, connection, target):
+    session = inspect(target).session
+    if session is not None:
+        _rows_written(session, {(mapper.local_table.name.lower(), target.id)})
+
+def _on_orm_execute(orm_execute_state):
+    # UPDATE/DELETE masivos y SQL directo por la sesión: no se sabe qué filas
+    # cambiaron, se descarta todo lo que depende de la tabla
+    statement = orm_execute_state.statement
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        tables = {statement.table.name}
+    elif orm_execute_state.is_select or orm_execute_state.is_insert:
+        return
+    else:
+        tables = set(_DML_TABLE.findall(str(statement)))
+    tables = {name.lower() for name in tables} & PRINT_TABLES
+    if tables:
+        _rows_written(orm_execute_state.session, tables)
+
+def _on_commit(session):
+    stale = session.info.pop(_STALE_KEY, None)
+    if stale:
+        print_cache.discard(stale)
+    rows = session.info.pop(_STALE_ROWS_KEY, None)
+    if rows:
+        print_cache.invalidate_tables(rows)
+
+def _on_rollback(session):
+    session.info.pop(_STALE_KEY, None)
+    session.info.pop(_STALE_ROWS_KEY, None)
+
+def install_print_cache(max_entries, ttl):
+    print_cache.configure(max_entries, ttl)
+    if not event.contains(TicketPesaje, "after_update", _on_ticket_update):
+        event.listen(TicketPesaje, "after_update", _on_ticket_update)
+        event.listen(TicketPesaje, "after_delete", _on_ticket_delete)
+        for model in PRINT_DEPENDENCIES:
+            event.listen(model, "after_update", _on_dependency_update)
+            event.listen(model, "after_delete", _on_dependency_delete)
+        event.listen(Session, "do_orm_execute", _on_orm_execute)
+        event.listen(Session, "after_commit", _on_commit)
+        event.listen(Session, "after_rollback", _on_rollback)
@@ -0,0 +1,54 @@
+from sqlalchemy.orm import load_only
+from .prefetch import NO_EXPANSION, build_plan, prefetch_options
+from .serializers import get_serializer
+
+def _as_list(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    return [str(v) for v in value]
+
+def _relation_fk_columns(model, plan):
+    """Columnas FK que hay que leer para poder expandir las relaciones del plan"""
+    columns = set()
+    for rel_name in plan.children:
+        columns.update(c.name for c in getattr(model, rel_name).property.local_columns)
+    return columns
+
+def parse_projection(model, resource_name, fields=None, expand=None):
+    """
+    Interpreta ?fields= y ?expand= (string "a,b" o lista).
+    Retorna (fields, plan):
+      - fields: frozenset de columnas a leer (id siempre incluido) o None = todas
+      - plan: ExpandPlan con las relaciones a expandir o None = árbol completo.
+        Si se piden fields sin expand, no se expande nada.
+    Lanza ValueError con un mensaje para el cliente si algo no es válido.
+    """
+    field_set = None
+    names = _as_list(fields)
+    if names:
+        unknown = set(names) - get_serializer(model).field_names
+        if unknown:
+            raise ValueError(f"Campos desconocidos en fields: {', '.join(sorted(unknown))}")
+        field_set = frozenset(names) | {"id"}
+
+    if expand is not None:
+        plan = build_plan(resource_name, expand)
+    else:
+        plan = NO_EXPANSION if field_set is not None else None
+
+    if field_set is not None:
+        field_set |= _relation_fk_columns(model, plan)
+    return field_set, plan
+
+def projection_options(model, resource_name, fields, plan, skip=frozenset()):
+    """
+    Opciones de consulta para la proyección: solo las columnas pedidas en el
+    SELECT (load_only) y solo las relaciones del plan en el prefetch.
+    skip: modelos que se resuelven con la caché de referencia en vez del prefetch.
+    """
+    options = list(prefetch_options(model, resource_name, plan, skip))
+    if fields is not None:
+        options.append(load_only(*(getattr(model, name) for name in fields)))
+    return options
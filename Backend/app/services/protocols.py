@@ -0,0 +1,194 @@
+import re
+from collections import namedtuple
+
+# Trama decodificada de un indicador de peso.
+# Las banderas son None cuando el protocolo no las informa.
+Frame = namedtuple("Frame", ["weight", "stable", "motion", "overload", "negative", "net", "unit", "raw"])
+
+# Si no aparece un fin de trama en tantos bytes, se descarta lo acumulado (ruido o baudios errados)
+MAX_PENDING = 4096
+
+_NUMBER = re.compile(r"[-+]?\d+(?:[.,]\d+)?")
+
+# Construcción directa de la tupla (como Frame._make), sin el __new__ en Python
+# de namedtuple: con salida continua se crean cientos de miles de tramas
+_new_frame = tuple.__new__
+
+def parse_weight(raw):
+    """Primer número de la trama ("  1234.50 kg" -> 1234.5) o None"""
+    match = _NUMBER.search(raw)
+    if not match:
+        return None
+    return float(match.group(0).replace(",", "."))
+
+class FrameParser:
+    """
+    Decodificador incremental de un protocolo de indicador.
+    feed() recibe bytes, bytearray o memoryview (por ejemplo una vista sobre el
+    buffer de recepción reutilizado, sin crear un bytes intermedio) y devuelve
+    todas las tramas completas del lote. Los bytes de una trama incompleta
+    quedan pendientes para el próximo feed(). El buffer pendiente se compacta
+    una sola vez por lote, no una vez por trama.
+    """
+    name = None
+
+    def __init__(self):
+        self._buf = bytearray()
+
+    def feed(self, data):
+        buf = self._buf
+        buf += data
+        frames, consumed = self._decode(buf)
+        if consumed:
+            del buf[:consumed]
+        if len(buf) > MAX_PENDING:
+            buf.clear()
+        return frames
+
+    def _decode(self, buf):
+        """Retorna (tramas, bytes consumidos desde el inicio de buf)"""
+        raise NotImplementedError
+
+    def reset(self):
+        self._buf.clear()
+
+class LineParser(FrameParser):
+    """
+    Texto terminado en salto de línea con el peso como número
+    (formato de simulador_balanza.py y de indicadores en modo "impresora").
+    No informa banderas de estado.
+    """
+    name = "line"
+
+    def _decode(self, buf):
+        end = buf.rfind(b"\n")
+        if end < 0:
+            return [], 0
+        frames = []
+        # Un solo decode y un solo split para todo el lote
+        for text in buf[:end].decode("utf-8", errors="ignore").split("\n"):
+            text = text.strip()
+            if not text:
+                continue
+            try:
+                weight = float(text)
+            except ValueError:
+                # Con unidad u otro texto alrededor ("1234.5 kg")
+                weight = parse_weight(text)
+            frames.append(_new_frame(Frame, (weight, None, None, None, None, None, None, text)))
+        return frames, end + 1
+
+# Punto decimal según los bits 0-2 de la palabra de estado A de Toledo:
+# peso = dígitos * multiplicador / divisor (enteros, sin error de redondeo binario)
+_TOLEDO_SCALE = ((100, 1), (10, 1), (1, 1), (1, 10), (1, 100), (1, 1000), (1, 10000), (1, 100000))
+_TOLEDO = re.compile(rb"\x02(.)(.).(\d{6})\d{6}\r", re.DOTALL)
+
+class ToledoParser(FrameParser):
+    """
+    Salida continua Mettler Toledo:
+    STX, SWA, SWB, SWC, 6 dígitos de peso, 6 dígitos de tara, CR [, checksum].
+    SWA bits 0-2: punto decimal. SWB: bit 0 neto, bit 1 negativo,
+    bit 2 fuera de rango, bit 3 en movimiento, bit 4 kg (si no, lb).
+    Todas las tramas del lote se ubican con un solo recorrido de la expresión
+    regular (en C); los bytes que no forman una trama válida se saltan.
+    """
+    name = "toledo"
+    FRAME_LEN = 17
+
+    def _decode(self, buf):
+        frames = []
+        consumed = 0
+        for match in _TOLEDO.finditer(buf):
+            swa, swb, digits = match.groups()
+            swa, swb = swa[0], swb[0]
+            multiplier, divisor = _TOLEDO_SCALE[swa & 0x07]
+            weight = int(digits) * multiplier
+            if divisor != 1:
+                weight /= divisor
+            negative = bool(swb & 0x02)
+            if negative:
+                weight = -weight
+            motion = bool(swb & 0x08)
+            overload = bool(swb & 0x04)
+            frames.append(_new_frame(Frame, (
+                weight, not motion and not overload, motion, overload, negative,
+                bool(swb & 0x01), "kg" if swb & 0x10 else "lb",
+                match.group(0)[1:-1].decode("latin-1"),
+            )))
+            consumed = match.end()
+        # Se conserva desde el último STX que no alcanzó a formar una trama
+        last_stx = buf.rfind(b"\x02", consumed)
+        if last_stx >= 0 and len(buf) - last_stx < self.FRAME_LEN:
+            return frames, last_stx
+        return frames, len(buf)
+
+_TAGGED = re.compile(rb"(ST|US|OL|QT),(GS|NT|TR),\s*([+-]?)\s*([0-9.]+)\s*([A-Za-z]*)\s*\r?\n")
+
+class TaggedParser(FrameParser):
+    """
+    Formato ASCII con encabezados (A&D y muchos indicadores genéricos):
+    "ST,GS,+0012345.6 kg\\r\\n". ST estable, US inestable, OL sobrecarga;
+    GS bruto, NT neto. Todas las tramas del lote se extraen con un solo
+    recorrido de la expresión regular.
+    """
+    name = "tagged"
+
+    def _decode(self, buf):
+        frames = []
+        consumed = 0
+        for match in _TAGGED.finditer(buf):
+            header, kind, sign, number, unit = match.groups()
+            overload = header == b"OL"
+            negative = sign == b"-"
+            weight = None if overload else float(number) * (-1 if negative else 1)
+            frames.append(_new_frame(Frame, (
+                weight, header == b"ST", header == b"US", overload, negative,
+                kind == b"NT", unit.decode("ascii").lower() or None,
+                match.group(0).decode("ascii").strip(),
+            )))
+            consumed = match.end()
+        # Sin coincidencias: se conserva desde el último salto de línea (trama en curso)
+        if not frames:
+            last_nl = buf.rfind(b"\n")
+            consumed = last_nl + 1 if last_nl >= 0 else 0
+        return frames, consumed
+
+PARSERS = {parser.name: parser for parser in (LineParser, ToledoParser, TaggedParser)}
+
+# --- Codificación (simulador de balanza y benchmarks) ---
+
+def encode_line(weight, motion=False, overload=False):
+    return f"{weight:.2f}\n".encode("ascii")
+
+def encode_toledo(weight, motion=False, overload=False):
+    # Kilos enteros como una romana de camiones (SWA: bit 5 fijo, incremento x1,
+    # punto decimal código 010), SWB: bit 5 fijo, kg y banderas; tara en cero
+    swa = 0x20 | 0x08 | 0x02
+    swb = 0x20 | 0x10 | (0x02 if weight < 0 else 0) | (0x04 if overload else 0) | (0x08 if motion else 0)
+    value = min(int(round(abs(weight))), 999999)
+    return b"\x02" + bytes((swa, swb, 0x20)) + b"%06d000000\r" % value
+
+def encode_tagged(weight, motion=False, overload=False):
+    header = "OL" if overload else ("US" if motion else "ST")
+    return f"{header},GS,{weight:+010.2f}kg\r\n".encode("ascii")
+
+ENCODERS = {"line": encode_line, "toledo": encode_toledo, "tagged": encode_tagged}
+
+def make_parser(protocol):
+    """Nuevo decodificador para el protocolo. Lanza ValueError si no existe."""
+    try:
+        return PARSERS[protocol]()
+    except KeyError:
+        raise ValueError(f"Protocolo desconocido: {protocol}")
+
+def frame_flags(frame):
+    """Banderas informadas por el indicador (solo las que el protocolo trae)"""
+    flags = {
+        "stable": frame.stable,
+        "motion": frame.motion,
+        "overload": frame.overload,
+        "negative": frame.negative,
+        "net": frame.net,
+        "unit": frame.unit,
+    }
+    return {key: value for key, value in flags.items() if value is not None}
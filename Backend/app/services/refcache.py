@@ -0,0 +1,140 @@
+import time
+from collections import OrderedDict
+from threading import Lock, local
+
+from ..models import Productos, Roles, Ubicaciones, Vehiculos, Choferes, EmpresasTransporte
+from .etag import add_commit_listener, tables_for
+
+# Datos de referencia: se leen en casi cada ticket y cambian muy poco
+REFERENCE_MODELS = frozenset({Productos, Roles, Ubicaciones, Vehiculos, Choferes, EmpresasTransporte})
+
+class ReferenceCache:
+    """
+    Caché LRU con TTL, compartida por el proceso, de entidades de referencia ya
+    serializadas. Clave: (modelo, id, recurso, plan de expansión).
+
+    Invalidación:
+      - Por escritura: cada commit notifica las tablas escritas (services/etag.py)
+        y se descartan las entradas que dependen de alguna de ellas. Cubre
+        CRUDService, los endpoints genéricos, los combinados y el SQL directo.
+      - Por tiempo (ttl): acota lo que tarda en verse una escritura hecha por otro
+        proceso o directamente en la BDD.
+
+    Para no guardar datos leídos antes de una invalidación, cada hilo toma una
+    época al iniciar el request (begin) y put() descarta el valor si la época
+    cambió desde entonces. Sin begin() no se guarda nada.
+    Los valores son compartidos entre hilos: no deben modificarse.
+    """
+
+    def __init__(self, max_entries=2000, ttl=300):
+        self._entries = OrderedDict()  # clave -> (expira, valor, tablas)
+        self._lock = Lock()
+        self._local = local()
+        self._epoch = 0
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def configure(self, max_entries, ttl):
+        with self._lock:
+            self.max_entries = max_entries
+            self.ttl = ttl
+            self._entries.clear()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def begin(self):
+        """Marca el inicio de un request (o tarea) en este hilo"""
+        self._local.epoch = self._epoch
+
+    def peek(self, key):
+        """Valor vigente o None, sin contar acierto/fallo"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        value = self.peek(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def record_hit(self):
+        self.hits += 1
+
+    def put(self, key, value, tables):
+        if not self.enabled:
+            return
+        epoch = getattr(self._local, "epoch", None)
+        with self._lock:
+            if epoch is None or epoch != self._epoch:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value, tables)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_tables(self, tables):
+        """Descarta las entradas que dependen de alguna de las tablas (nombres en minúsculas)"""
+        with self._lock:
+            self._epoch += 1
+            stale = [key for key, entry in self._entries.items() if not entry[2].isdisjoint(tables)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def discard(self, keys):
+        """Descarta entradas puntuales (por ejemplo, un registro que se acaba de modificar)"""
+        with self._lock:
+            self._epoch += 1
+            for key in keys:
+                if self._entries.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+reference_cache = ReferenceCache()
+
+def reference_key(model, id_, resource_name, plan):
+    return (model, id_, resource_name, plan)
+
+def reference_tables(model, resource_name, plan):
+    """Nombres (en minúsculas) de las tablas de las que depende una entrada"""
+    return frozenset(t.name.lower() for t in tables_for(model, resource_name, plan))
+
+def reference_skip():
+    """Modelos que prefetch_options no debe cargar porque los resuelve la caché"""
+    return REFERENCE_MODELS if reference_cache.enabled else frozenset()
+
+def install_reference_cache(max_entries, ttl):
+    reference_cache.configure(max_entries, ttl)
+    add_commit_listener(reference_cache.invalidate_tables)
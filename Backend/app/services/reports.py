@@ -0,0 +1,198 @@
+from sqlalchemy import text
+
+from .streaming import STREAM_BATCH_SIZE
+
+# Detalle de los reportes por ticket. Los usan GET /api/reporte_transporte_aves_sql
+# y GET /api/reporte_granja_dia (JSON) y sus exportaciones (/export, CSV o XLSX).
+# El filtro por día es un rango [llegada_desde, llegada_hasta) sobre
+# hora_llegada_romana (idx_viajes_tiempos_llegada, ver rollup.arrival_range).
+
+# Formato Nro. 2 (entradas). Usamos GROUP BY para colapsar cualquier duplicado
+# por ticket, y MAX() en las tablas relacionadas para traer el registro más
+# reciente/relevante
+TRANSPORTE_SQL = """
+    SELECT
+        tp.nro_ticket,
+        MAX(tp.estado) AS estado,
+        MAX(v.placa) AS placa,
+        MAX(CONCAT(p.nombre, ' ', p.apellido)) AS chofer,
+        MAX(vt.hora_salida_granja) AS hora_salida_granja,
+        MAX(vt.hora_llegada_romana) AS hora_llegada_romana,
+        MAX(vt.tiempo_transito) AS tiempo_recorrido,
+        MAX(vt.hora_inicio_descarga) AS hora_inicio_proceso,
+        MAX(vt.tiempo_espera) AS tiempo_espera,
+        MAX(u.nombre) AS granja,
+        MAX(vc.aves_recibidas) AS aves_contadas,
+        MAX(vc.aves_faltantes) AS aves_faltantes,
+        MAX(ISNULL(e.porcentaje_aves_faltantes, 0)) AS porcentaje_aves_faltantes,
+        MAX(ISNULL(tp.peso_neto, 0)) AS kilos_netos,
+        MAX(ISNULL(e.peso_promedio_aves, 0)) AS peso_promedio,
+        MAX(vc.aves_aho) AS aves_ahogadas,
+        MAX(ISNULL(e.porcentaje_aves_ahogadas, 0)) AS porcentaje_aves_ahogadas,
+        MAX(vc.numero_de_jaulas) AS numero_jaulas,
+        MAX(vc.aves_por_jaula) AS aves_por_jaula,
+        MAX(g.nro_galpon) AS numero_galpon,
+        MAX(l.fecha_alojamiento) AS fecha_alojamiento,
+        MAX(DATEDIFF(day, l.fecha_alojamiento, vt.hora_llegada_romana)) AS edad_aves
+    FROM Ticket_pesaje tp
+    LEFT JOIN Asignaciones a ON tp.id_asignaciones = a.id
+    LEFT JOIN Vehiculos v ON a.id_vehiculos = v.id
+    LEFT JOIN Choferes c ON a.id_chofer = c.id
+    LEFT JOIN Personas p ON c.id_personas = p.id
+    LEFT JOIN Viajes_tiempos vt ON vt.id_ticket = tp.id
+    LEFT JOIN Viajes_conteos vc ON vc.id_ticket = tp.id
+    LEFT JOIN Viajes_origen vo ON vo.id_ticket = tp.id
+    LEFT JOIN Lotes l ON vo.id_lote = l.id
+    LEFT JOIN Galpones g ON l.id_galpones = g.id
+    LEFT JOIN Granjas gr ON g.id_granja = gr.id
+    LEFT JOIN Ubicaciones u ON gr.id_ubicaciones = u.id
+    LEFT JOIN Estadisticas e ON e.id_ticket = tp.id
+    WHERE tp.estado = 'Finalizado'
+    {rango}
+    GROUP BY tp.nro_ticket ORDER BY MAX(vt.hora_llegada_romana) DESC
+"""
+
+# Formato Nro. 1 (transportes de una granja)
+GRANJA_SQL = """
+        SELECT
+    et.nombre AS empresa_transporte,
+    CONCAT(p.nombre, ' ', p.apellido) AS chofer,
+    v.placa,
+    vo.numero_de_orden,
+    g.nro_galpon,
+    l.codigo_lote AS nro_lote,
+    vc.total_aves AS cantidad_aves,
+    tp.peso_neto,
+    e.peso_prom_aves AS peso_promedio_aves
+        FROM Ticket_pesaje tp
+        LEFT JOIN Asignaciones a ON tp.id_asignaciones = a.id
+        LEFT JOIN Vehiculos v ON a.id_vehiculos = v.id
+        LEFT JOIN Empresas_transportes et ON v.id_empresas_transportes = et.id
+        LEFT JOIN Choferes c ON a.id_chofer = c.id
+        LEFT JOIN Personas p ON c.id_personas = p.id
+        LEFT JOIN Viajes_tiempos vt ON vt.id_ticket = tp.id
+        LEFT JOIN Viajes_origen vo ON vo.id_ticket = tp.id
+        LEFT JOIN Lotes l ON vo.id_lote = l.id
+        LEFT JOIN Galpones g ON l.id_galpones = g.id
+        LEFT JOIN Granjas gr ON g.id_granja = gr.id
+
+        -- 1. Agrupamos conteos para evitar duplicar las filas del ticket
+        LEFT JOIN (
+            SELECT id_ticket, SUM(aves_recibidas) AS total_aves
+            FROM Viajes_conteos
+            GROUP BY id_ticket
+        ) vc ON vc.id_ticket = tp.id
+
+        -- 2. Agrupamos estadísticas para evitar duplicar las filas del ticket
+        LEFT JOIN (
+            SELECT id_ticket, AVG(peso_promedio_aves) AS peso_prom_aves
+            FROM Estadisticas
+            GROUP BY id_ticket
+        ) e ON e.id_ticket = tp.id
+
+        WHERE tp.estado = 'Finalizado'
+        AND tp.id_origen = :id_ubicacion_granja
+        AND vt.hora_llegada_romana >= :llegada_desde AND vt.hora_llegada_romana < :llegada_hasta
+"""
+
+_RANGO = "AND vt.hora_llegada_romana >= :llegada_desde AND vt.hora_llegada_romana < :llegada_hasta"
+
+# Columnas de las exportaciones: (columna de la consulta, encabezado)
+FORMATO_1_COLUMNS = (
+    ("empresa_transporte", "Empresa de transporte"),
+    ("chofer", "Chofer"),
+    ("placa", "Placa"),
+    ("numero_de_orden", "Nro. de orden"),
+    ("nro_galpon", "Galpón"),
+    ("nro_lote", "Lote"),
+    ("cantidad_aves", "Cantidad de aves"),
+    ("peso_neto", "Peso neto (kg)"),
+    ("peso_promedio_aves", "Peso promedio (kg)"),
+)
+
+FORMATO_2_COLUMNS = (
+    ("nro_ticket", "Nro. ticket"),
+    ("placa", "Placa"),
+    ("chofer", "Chofer"),
+    ("hora_salida_granja", "Hora salida granja"),
+    ("hora_llegada_romana", "Hora llegada romana"),
+    ("tiempo_recorrido", "Tiempo recorrido (min)"),
+    ("hora_inicio_proceso", "Hora inicio"),
+    ("tiempo_espera", "Tiempo de espera (min)"),
+    ("granja", "Granja"),
+    ("aves_contadas", "Aves contadas"),
+    ("aves_faltantes", "Aves faltantes"),
+    ("porcentaje_aves_faltantes", "% aves faltantes"),
+    ("kilos_netos", "Peso neto (kg)"),
+    ("peso_promedio", "Peso promedio (kg)"),
+    ("aves_ahogadas", "Aves AHO"),
+    ("porcentaje_aves_ahogadas", "% aves AHO"),
+    ("numero_jaulas", "Nro. jaulas"),
+    ("aves_por_jaula", "Aves por jaula"),
+    ("numero_galpon", "Galpón"),
+    ("edad_aves", "Edad (días)"),
+)
+
+def transporte_query(rango=None):
+    """(sql, params) del Formato Nro. 2; rango = (desde, hasta) datetimes o None para todo"""
+    if rango is None:
+        return text(TRANSPORTE_SQL.format(rango="")), {}
+    return text(TRANSPORTE_SQL.format(rango=_RANGO)), {"llegada_desde": rango[0], "llegada_hasta": rango[1]}
+
+def granja_query(id_ubicacion_granja, rango):
+    """(sql, params) del Formato Nro. 1 de la granja (id de su ubicación)"""
+    return text(GRANJA_SQL), {
+        "id_ubicacion_granja": id_ubicacion_granja, "llegada_desde": rango[0], "llegada_hasta": rango[1],
+    }
+
+def stream_rows(session, query, params, batch_size=STREAM_BATCH_SIZE):
+    """
+    Filas (mappings) de la consulta por lotes de batch_size con yield_per
+    (cursor del lado del servidor): la consulta se ejecuta al empezar a iterar
+    """
+    result = session.execute(query.execution_options(yield_per=batch_size), params)
+    try:
+        yield from result.mappings()
+    finally:
+        result.close()
+
+def transporte_row(r):
+    """Fila del Formato Nro. 2 como la devuelve el JSON del reporte"""
+    return {
+        "nro_ticket": r["nro_ticket"],
+        "estado": r["estado"],
+        "placa": r["placa"] or "N/A",
+        "chofer": r["chofer"] or "N/A",
+        "hora_salida_granja": str(r["hora_salida_granja"]) if r["hora_salida_granja"] else None,
+        "hora_llegada_romana": str(r["hora_llegada_romana"]) if r["hora_llegada_romana"] else None,
+        "tiempo_recorrido": str(r["tiempo_recorrido"]) if r["tiempo_recorrido"] else None,
+        "hora_inicio_proceso": str(r["hora_inicio_proceso"]) if r["hora_inicio_proceso"] else None,
+        "tiempo_espera": str(r["tiempo_espera"]) if r["tiempo_espera"] else None,
+        "granja": r["granja"] or "N/A",
+        "aves_contadas": r["aves_contadas"] or 0,
+        "aves_faltantes": r["aves_faltantes"] or 0,
+        "porcentaje_aves_faltantes": float(r["porcentaje_aves_faltantes"]),
+        "kilos_netos": float(r["kilos_netos"]),
+        "peso_promedio": float(r["peso_promedio"]),
+        "aves_ahogadas": r["aves_ahogadas"] or 0,
+        "porcentaje_aves_ahogadas": float(r["porcentaje_aves_ahogadas"]),
+        "numero_jaulas": r["numero_jaulas"] or 0,
+        "aves_por_jaula": r["aves_por_jaula"] or 0,
+        "numero_galpon": r["numero_galpon"] or "N/A",
+        "fecha_alojamiento": str(r["fecha_alojamiento"]) if r["fecha_alojamiento"] else None,
+        "edad_aves": r["edad_aves"] if r["edad_aves"] is not None else 0
+    }
+
+def granja_row(r):
+    """Fila del Formato Nro. 1 como la devuelve el JSON del reporte"""
+    return {
+        "empresa_transporte": r["empresa_transporte"],
+        "chofer": r["chofer"],
+        "placa": r["placa"],
+        "numero_de_orden": r["numero_de_orden"],
+        "nro_galpon": r["nro_galpon"],
+        "nro_lote": r["nro_lote"],
+        "cantidad_aves": r["cantidad_aves"],
+        "peso_neto": float(r["peso_neto"]) if r["peso_neto"] is not None else 0,
+        "peso_promedio": float(r["peso_promedio_aves"]) if r["peso_promedio_aves"] is not None else 0
+    }
@@ -0,0 +1,249 @@
+import datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+
+from ..db import db
+from ..models import ReportesDiarios, TicketPesaje, ViajesTiempos, ViajesConteos, Estadisticas, ViajesOrigen
+
+# Resumen diario de los tickets Finalizados (tabla Reportes_diarios).
+# Una fila por ticket y luego GROUP BY (fecha, origen, granja, galpón):
+#   - fecha: día de la llegada a la romana (MAX de Viajes_tiempos del ticket)
+#   - aves: SUM de Viajes_conteos; peso promedio: AVG de Estadisticas
+#   - granja/galpón: del primer Viajes_origen del ticket (0 si no tiene)
+# Los duplicados de Viajes_tiempos / Estadisticas (triggers + nota de entrega)
+# se agrupan por ticket, así que cada ticket cuenta una sola vez.
+_REFRESH_SQL = """
+INSERT INTO Reportes_diarios (
+    fecha, id_origen, id_granja, id_galpon, tickets, total_aves, aves_faltantes, aves_ahogadas,
+    peso_neto, suma_peso_promedio, tickets_con_peso_promedio, updated_at
+)
+SELECT
+    t.fecha, t.id_origen, t.id_granja, t.id_galpon,
+    COUNT(*), SUM(t.aves), SUM(t.faltantes), SUM(t.ahogadas), SUM(t.peso_neto),
+    COALESCE(SUM(t.peso_promedio), 0), COUNT(t.peso_promedio), CURRENT_TIMESTAMP
+FROM (
+    SELECT
+        {fecha} AS fecha,
+        tp.id_origen,
+        COALESCE(g.id_granja, 0) AS id_granja,
+        COALESCE(g.id, 0) AS id_galpon,
+        COALESCE(vc.aves, 0) AS aves,
+        COALESCE(vc.faltantes, 0) AS faltantes,
+        COALESCE(vc.ahogadas, 0) AS ahogadas,
+        COALESCE(tp.peso_neto, 0) AS peso_neto,
+        e.peso_promedio
+    FROM Ticket_pesaje tp
+    JOIN (
+        SELECT id_ticket, MAX(hora_llegada_romana) AS llegada
+        FROM Viajes_tiempos
+        WHERE id_ticket IN (
+            -- Seek en idx_viajes_tiempos_llegada: solo los tickets con alguna llegada en el rango
+            SELECT id_ticket FROM Viajes_tiempos
+            WHERE hora_llegada_romana >= :desde AND hora_llegada_romana < :hasta
+        )
+        GROUP BY id_ticket
+    ) vt ON vt.id_ticket = tp.id
+    LEFT JOIN (
+        SELECT id_ticket, SUM(aves_recibidas) AS aves, SUM(aves_faltantes) AS faltantes, SUM(aves_aho) AS ahogadas
+        FROM Viajes_conteos
+        GROUP BY id_ticket
+    ) vc ON vc.id_ticket = tp.id
+    LEFT JOIN (
+        SELECT id_ticket, AVG(peso_promedio_aves) AS peso_promedio
+        FROM Estadisticas
+        GROUP BY id_ticket
+    ) e ON e.id_ticket = tp.id
+    LEFT JOIN (
+        SELECT id_ticket, MIN(id) AS id
+        FROM Viajes_origen
+        GROUP BY id_ticket
+    ) vo1 ON vo1.id_ticket = tp.id
+    LEFT JOIN Viajes_origen vo ON vo.id = vo1.id
+    LEFT JOIN Lotes l ON l.id = vo.id_lote
+    LEFT JOIN Galpones g ON g.id = l.id_galpones
+    WHERE tp.estado = 'Finalizado'
+      AND vt.llegada >= :desde AND vt.llegada < :hasta
+      {origen}
+) t
+GROUP BY t.fecha, t.id_origen, t.id_granja, t.id_galpon
+"""
+
+_DELETE_SQL = "DELETE FROM Reportes_diarios WHERE fecha >= :desde AND fecha < :hasta {origen}"
+
+def _date_expr(dialect):
+    # SQLite (benchmarks / pruebas locales) no tiene el tipo DATE
+    return "CAST(vt.llegada AS DATE)" if dialect.name == "mssql" else "DATE(vt.llegada)"
+
+def refresh_rollup(session, desde, hasta, id_origen=None):
+    """
+    Recalcula Reportes_diarios para los días [desde, hasta) (fechas), y solo
+    para un origen si se indica. Borra e inserta en la transacción de la
+    sesión (no hace commit). En SQL Server las actualizaciones se serializan
+    con un applock para que dos notas de entrega del mismo día no choquen.
+    """
+    dialect = session.get_bind(mapper=ReportesDiarios).dialect
+    if dialect.name == "mssql":
+        session.execute(text(
+            "EXEC sp_getapplock @Resource = 'Reportes_diarios', @LockMode = 'Exclusive', @LockOwner = 'Transaction'"
+        ))
+    params = {"desde": desde, "hasta": hasta}
+    origen = ""
+    if id_origen is not None:
+        params["id_origen"] = id_origen
+        origen = "AND id_origen = :id_origen"
+    session.execute(text(_DELETE_SQL.format(origen=origen)), params)
+    session.execute(text(_REFRESH_SQL.format(
+        fecha=_date_expr(dialect),
+        origen=origen.replace("id_origen", "tp.id_origen", 1),
+    )), {**params, "desde": _midnight(desde), "hasta": _midnight(hasta)})
+
+# --- Actualización al escribir un ticket ---
+# Como ticket_written de services/printing.py: las escrituras marcan el ticket
+# en la sesión y antes del commit se recalculan, en la misma transacción, el
+# día y origen donde estaba el ticket y donde quedó (una nota registrada de
+# nuevo con otra hora de llegada lo mueve de día; editar id_origen, de origen).
+
+_STALE_KEY = "rollup_stale"
+
+# Columnas del ticket que cambian el resumen (fecha_primer_peso: los triggers
+# la copian a Viajes_tiempos.hora_llegada_romana)
+TICKET_FIELDS = ("estado", "peso_neto", "id_origen", "fecha_primer_peso")
+# Tablas por ticket que entran en el resumen (columna id_ticket)
+DETAIL_MODELS = (ViajesTiempos, ViajesConteos, Estadisticas, ViajesOrigen)
+
+_SLICE_SQL = text(
+    "SELECT tp.id_origen, MAX(vt.hora_llegada_romana) AS llegada "
+    "FROM Ticket_pesaje tp JOIN Viajes_tiempos vt ON vt.id_ticket = tp.id "
+    "WHERE tp.id = :id GROUP BY tp.id_origen"
+)
+
+def _ticket_slice(connection, ticket_id):
+    """(día de llegada, id_origen) del ticket según la BDD, o None si no tiene llegada"""
+    row = connection.execute(_SLICE_SQL, {"id": ticket_id}).first()
+    if row is None or row.llegada is None:
+        return None
+    llegada = row.llegada
+    if isinstance(llegada, str):
+        llegada = datetime.datetime.fromisoformat(llegada)
+    return llegada.date(), row.id_origen
+
+def rollup_ticket_written(session, ticket_id, connection=None):
+    """
+    Marca el ticket para recalcular su parte de Reportes_diarios antes del
+    commit. La primera vez en la transacción guarda el día y origen que tiene
+    en la BDD, así que para SQL directo debe llamarse antes de escribir; las
+    escrituras del ORM se detectan solas. `connection`: la del flush, desde
+    los eventos del mapper.
+    """
+    stale = session.info.setdefault(_STALE_KEY, {})
+    if ticket_id not in stale:
+        before = _ticket_slice(connection if connection is not None else session, ticket_id)
+        # Si la consulta hizo autoflush, el evento del mapper ya guardó el estado anterior
+        stale.setdefault(ticket_id, before)
+
+def _on_ticket_update(mapper, connection, target):
+    state = inspect(target)
+    if state.session is not None and any(state.attrs[name].history.has_changes() for name in TICKET_FIELDS):
+        rollup_ticket_written(state.session, target.id, connection)
+
+def _on_ticket_delete(mapper, connection, target):
+    session = inspect(target).session
+    if session is not None:
+        rollup_ticket_written(session, target.id, connection)
+
+def _on_detail_write(mapper, connection, target):
+    state = inspect(target)
+    if state.session is None:
+        return
+    # Si la fila pasa a otro ticket, también cambia el anterior
+    history = state.attrs.id_ticket.history
+    for ticket_id in {target.id_ticket, *history.deleted}:
+        if ticket_id is not None:
+            rollup_ticket_written(state.session, ticket_id, connection)
+
+def _on_before_commit(session):
+    # Lo pendiente del ORM se escribe antes, para que sus eventos marquen los tickets
+    session.flush()
+    stale = session.info.pop(_STALE_KEY, None)
+    if not stale:
+        return
+    slices = set()
+    for ticket_id, before in stale.items():
+        slices.add(before)
+        slices.add(_ticket_slice(session, ticket_id))
+    slices.discard(None)
+    for dia, id_origen in sorted(slices, key=lambda s: (s[0], s[1] or 0)):
+        refresh_rollup(session, dia, dia + datetime.timedelta(days=1), id_origen)
+
+def _on_rollback(session):
+    session.info.pop(_STALE_KEY, None)
+
+def install_rollup_tracking():
+    """Registra los eventos que mantienen Reportes_diarios al día con las escrituras del ORM"""
+    if event.contains(Session, "before_commit", _on_before_commit):
+        return
+    event.listen(TicketPesaje, "before_update", _on_ticket_update)
+    event.listen(TicketPesaje, "before_delete", _on_ticket_delete)
+    for model in DETAIL_MODELS:
+        for name in ("before_insert", "before_update", "before_delete"):
+            event.listen(model, name, _on_detail_write)
+    event.listen(Session, "before_commit", _on_before_commit)
+    event.listen(Session, "after_rollback", _on_rollback)
+
+def rollup_days(fecha=None, fecha_inicio=None, fecha_fin=None):
+    """Rango [desde, hasta) a partir de los parámetros de los reportes (fecha, o fecha_inicio y fecha_fin inclusive)"""
+    if fecha_inicio and fecha_fin:
+        desde = datetime.date.fromisoformat(fecha_inicio)
+        hasta = datetime.date.fromisoformat(fecha_fin) + datetime.timedelta(days=1)
+    else:
+        desde = datetime.date.fromisoformat(fecha)
+        hasta = desde + datetime.timedelta(days=1)
+    return desde, hasta
+
+def _midnight(day):
+    return datetime.datetime.combine(day, datetime.time.min)
+
+def arrival_range(fecha=None, fecha_inicio=None, fecha_fin=None):
+    """
+    El rango de rollup_days en datetimes [desde, hasta) para filtrar
+    hora_llegada_romana sin CAST (usa idx_viajes_tiempos_llegada)
+    """
+    desde, hasta = rollup_days(fecha, fecha_inicio, fecha_fin)
+    return _midnight(desde), _midnight(hasta)
+
+rollup_cli = AppGroup("reportes", help="Resumen diario de los reportes (Reportes_diarios)")
+
+@rollup_cli.command("rebuild")
+@click.option("--desde", default=None, help="Primer día (AAAA-MM-DD); por defecto el primer ticket")
+@click.option("--hasta", default=None, help="Último día inclusive (AAAA-MM-DD); por defecto hoy")
+def rebuild_command(desde, hasta):
+    """Recalcula Reportes_diarios desde los datos históricos, un mes por transacción"""
+    session = db.session
+    if desde:
+        start = datetime.date.fromisoformat(desde)
+    else:
+        first = session.execute(text("SELECT MIN(hora_llegada_romana) FROM Viajes_tiempos")).scalar()
+        if first is None:
+            click.echo("No hay tickets con hora de llegada")
+            return
+        if isinstance(first, str):
+            first = datetime.datetime.fromisoformat(first)
+        start = first.date()
+    end = (datetime.date.fromisoformat(hasta) if hasta else datetime.date.today()) + datetime.timedelta(days=1)
+
+    total = 0
+    while start < end:
+        next_month = (start.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+        stop = min(next_month, end)
+        refresh_rollup(session, start, stop)
+        session.commit()
+        rows = session.execute(text(
+            "SELECT COUNT(*) FROM Reportes_diarios WHERE fecha >= :desde AND fecha < :hasta"
+        ), {"desde": start, "hasta": stop}).scalar()
+        total += rows
+        click.echo(f"{start} .. {stop - datetime.timedelta(days=1)}: {rows} filas")
+        start = stop
+    click.echo(f"Listo: {total} filas en Reportes_diarios")
@@ -0,0 +1,394 @@
+import datetime
+import threading
+import time
+from collections import deque, namedtuple
+
+import serial
+from serial.tools import list_ports
+
+from .protocols import PARSERS, frame_flags, make_parser
+from .stability import StabilityDetector, StableLock, state_to_dict
+
+# Lectura de la balanza: texto de la trama, peso numérico (None si no se pudo
+# interpretar), hora de recepción (epoch), reloj monotónico para medir antigüedad,
+# estado de estabilidad en ese momento (dict de state_to_dict o None) y
+# banderas informadas por el indicador (dict de frame_flags)
+ScaleReading = namedtuple("ScaleReading", ["raw", "weight", "timestamp", "monotonic", "stability", "flags"])
+
+# Bloqueos recientes que se pueden canjear por lock_id (el camión se va y la
+# balanza vacía se estabiliza con otro bloqueo antes de que el operador registre)
+RECENT_LOCKS = 16
+
+def reading_to_dict(reading):
+    return {
+        "data": reading.raw,
+        "weight": reading.weight,
+        "timestamp": datetime.datetime.fromtimestamp(reading.timestamp).isoformat(timespec="milliseconds"),
+        "age_ms": round((time.monotonic() - reading.monotonic) * 1000, 1),
+        "stability": reading.stability,
+        "flags": reading.flags,
+    }
+
+class Subscription:
+    """
+    Cola acotada de lecturas para un cliente (SSE). Si el cliente es lento y la
+    cola se llena, se descartan las lecturas más viejas: siempre recibe las más
+    recientes y el hilo lector nunca se bloquea por él.
+    """
+
+    def __init__(self, maxlen=1):
+        self._queue = deque(maxlen=maxlen)
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def push(self, reading):
+        with self._cond:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(reading)
+            self._cond.notify()
+
+    def get(self, timeout):
+        """Próxima lectura o None si no llegó ninguna en timeout segundos"""
+        with self._cond:
+            if not self._queue:
+                self._cond.wait(timeout)
+            return self._queue.popleft() if self._queue else None
+
+class ScaleReader:
+    """
+    Hilo de fondo dueño del puerto serial de una balanza.
+    Lee continuamente, separa las tramas por fin de línea y guarda las lecturas
+    en un buffer circular acotado; los requests solo consultan la última lectura
+    (sin abrir el puerto ni bloquear un worker de Flask).
+    Si el puerto falla o no existe, se reintenta cada reconnect_delay segundos.
+    """
+
+    def __init__(self, port, baudrate=9600, timeout=1.0, buffer_size=256, reconnect_delay=2.0, name=None,
+                 detector=None, protocol="line"):
+        self.port = port
+        self.baudrate = baudrate
+        self.protocol = protocol
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        self.name = name or port
+        self._readings = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self._subscribers = set()
+        self.detector = detector or StabilityDetector()
+        self._lock = None
+        self._lock_seq = 0
+        # lock_id -> StableLock de los últimos RECENT_LOCKS bloqueos (el último incluido)
+        self._recent_locks = {}
+        self.connected = False
+        self.error = None
+
+    # --- ciclo de vida ---
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=f"scale-{self.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, wait=True):
+        self._stop.set()
+        if wait and self._thread is not None:
+            self._thread.join(self.timeout + self.reconnect_delay + 1)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _open(self):
+        return serial.Serial(self.port, self.baudrate, timeout=self.timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self._open() as ser:
+                    self.connected, self.error = True, None
+                    # Se descarta lo acumulado antes de abrir: las lecturas viejas no sirven
+                    ser.reset_input_buffer()
+                    self._read_loop(ser)
+            except (serial.SerialException, OSError) as e:
+                self.error = str(e)
+                # Puerto perdido o ausente: la próxima consulta de /serial/list vuelve a enumerar
+                port_scanner.invalidate()
+            finally:
+                self.connected = False
+            self._stop.wait(self.reconnect_delay)
+
+    def _read_loop(self, ser):
+        # Decodificador del protocolo del indicador (services/protocols.py)
+        parser = make_parser(self.protocol)
+        while not self._stop.is_set():
+            # Bloquea hasta timeout como máximo; trae todo lo que haya disponible
+            # y decodifica todas las tramas completas del lote de una vez
+            chunk = ser.read(ser.in_waiting or 1)
+            if chunk:
+                frames = parser.feed(chunk)
+                if frames:
+                    self._publish(frames)
+
+    def _publish(self, frames):
+        now = time.monotonic()
+        timestamp = time.time()
+        readings = []
+        for frame in frames:
+            stability = None
+            if frame.weight is not None and not frame.overload:
+                stability = self._update_stability(frame.weight, now, frame.motion)
+            readings.append(ScaleReading(frame.raw, frame.weight, timestamp, now, stability, frame_flags(frame)))
+        with self._cond:
+            self._readings.extend(readings)
+            self._cond.notify_all()
+            subscribers = list(self._subscribers)
+        # A los clientes solo se les envía la última lectura del lote: con salida
+        # continua a cientos de Hz no tiene sentido enviar cada trama
+        for sub in subscribers:
+            sub.push(readings[-1])
+
+    def _update_stability(self, weight, now, motion=None):
+        previous = self.detector.state()
+        if motion:
+            # El indicador informa movimiento: la ventana estable se reinicia
+            self.detector.reset()
+        state = self.detector.add(weight, now)
+        if state.stable:
+            # Al pasar de inestable a estable se abre un bloqueo nuevo; mientras siga
+            # estable se actualiza su peso (promedio de la ventana) y su confirmación
+            if not previous.stable or self._lock is None:
+                self._lock_seq += 1
+                self._lock = StableLock(self._lock_seq, round(state.weight, 2), time.time(), now)
+                if len(self._recent_locks) >= RECENT_LOCKS:
+                    del self._recent_locks[next(iter(self._recent_locks))]
+            else:
+                self._lock = self._lock._replace(weight=round(state.weight, 2), confirmed_at=now)
+            self._recent_locks[self._lock.lock_id] = self._lock
+        return state_to_dict(state, self._lock)
+
+    def stable_lock(self, lock_id, max_age):
+        """
+        Bloqueo de peso estable con ese id si estuvo estable hace menos de
+        max_age segundos, aunque después se haya abierto otro (por ejemplo, la
+        balanza vacía al irse el camión). None si ya no es válido.
+        """
+        lock = self._recent_locks.get(lock_id)
+        if lock is None or time.monotonic() - lock.confirmed_at > max_age:
+            return None
+        return lock
+
+    def stability(self):
+        """Estado actual del detector y último bloqueo"""
+        state_dict = state_to_dict(self.detector.state(), self._lock)
+        lock = self._lock
+        state_dict["last_lock"] = None if lock is None else {
+            "lock_id": lock.lock_id,
+            "weight": lock.weight,
+            "since": datetime.datetime.fromtimestamp(lock.since).isoformat(timespec="milliseconds"),
+            "age_ms": round((time.monotonic() - lock.confirmed_at) * 1000, 1),
+        }
+        return state_dict
+
+    # --- suscripciones (un solo lector, muchos clientes) ---
+
+    def subscribe(self, maxlen=1):
+        sub = Subscription(maxlen)
+        with self._cond:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._cond:
+            self._subscribers.discard(sub)
+
+    # --- consultas ---
+
+    def latest(self, max_age=None):
+        """Última lectura (o None si no hay, o si es más vieja que max_age segundos)"""
+        with self._cond:
+            reading = self._readings[-1] if self._readings else None
+        if reading is None or (max_age is not None and time.monotonic() - reading.monotonic > max_age):
+            return None
+        return reading
+
+    def wait_for_reading(self, timeout, max_age=None):
+        """Última lectura vigente; si no hay, espera la próxima hasta timeout segundos"""
+        reading = self.latest(max_age)
+        if reading is not None:
+            return reading
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            last = self._readings[-1] if self._readings else None
+            while True:
+                remaining = deadline - time.monotonic()
+                current = self._readings[-1] if self._readings else None
+                if current is not last:
+                    return current
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def readings(self):
+        """Copia del buffer circular (de la más vieja a la más nueva)"""
+        with self._cond:
+            return list(self._readings)
+
+    def status(self):
+        latest = self.latest()
+        return {
+            "name": self.name,
+            "port": self.port,
+            "baudrate": self.baudrate,
+            "protocol": self.protocol,
+            "running": self.running,
+            "connected": self.connected,
+            "error": self.error,
+            "buffered": len(self._readings),
+            "subscribers": len(self._subscribers),
+            "latest": reading_to_dict(latest) if latest else None,
+        }
+
+def stability_detector(config):
+    return StabilityDetector(
+        window=config["SCALE_STABLE_WINDOW"],
+        tolerance=config["SCALE_STABLE_TOLERANCE"],
+        min_duration=config["SCALE_STABLE_MIN_DURATION"],
+        min_samples=config["SCALE_STABLE_MIN_SAMPLES"],
+    )
+
+# --- Registro de balanzas ---
+
+DEFAULT_SCALE_ID = "principal"
+
+def parse_scales(config):
+    """
+    Balanzas configuradas: SCALES="romana1=COM2:9600:line,romana2=COM3" (id=puerto[:baudios[:protocolo]]).
+    Sin SCALES hay una sola balanza, "principal", con SCALE_PORT y SCALE_BAUD_RATE.
+    Retorna [(id, puerto, baudios, protocolo), ...] en el orden configurado.
+    Lanza ValueError si la configuración es inválida.
+    """
+    spec = (config.get("SCALES") or "").strip()
+    if not spec:
+        return [(DEFAULT_SCALE_ID, config["SCALE_PORT"], config["SCALE_BAUD_RATE"], "line")]
+    scales = []
+    for item in (i.strip() for i in spec.split(",") if i.strip()):
+        scale_id, sep, target = item.partition("=")
+        parts = target.split(":")
+        if not sep or not scale_id.strip() or not parts[0]:
+            raise ValueError(f"Balanza mal configurada en SCALES: '{item}'")
+        port = parts[0].strip()
+        baudrate = int(parts[1]) if len(parts) > 1 and parts[1] else config["SCALE_BAUD_RATE"]
+        protocol = parts[2].strip() if len(parts) > 2 and parts[2] else "line"
+        if protocol not in PARSERS:
+            raise ValueError(f"Protocolo desconocido para la balanza '{scale_id}': {protocol}")
+        scales.append((scale_id.strip(), port, baudrate, protocol))
+    return scales
+
+class ScaleRegistry:
+    """
+    Un ScaleReader (con su propio hilo y su propio puerto) por balanza
+    configurada: cada romana se lee en paralelo sin bloquear a las demás.
+    Los lectores se crean y arrancan en el primer uso.
+    """
+
+    def __init__(self):
+        self._readers = {}
+        self._order = []
+        self._lock = threading.Lock()
+        self._configured = False
+
+    def _configure(self, config):
+        for scale_id, port, baudrate, protocol in parse_scales(config):
+            reader = ScaleReader(
+                port,
+                baudrate=baudrate,
+                timeout=config["SCALE_READ_TIMEOUT"],
+                buffer_size=config["SCALE_BUFFER_SIZE"],
+                reconnect_delay=config["SCALE_RECONNECT_DELAY"],
+                name=scale_id,
+                detector=stability_detector(config),
+                protocol=protocol,
+            )
+            self._readers[scale_id] = reader
+            self._order.append(scale_id)
+        self._configured = True
+
+    def readers(self, config):
+        """Todos los lectores (arrancados), en el orden configurado"""
+        with self._lock:
+            if not self._configured:
+                self._configure(config)
+            readers = [self._readers[scale_id] for scale_id in self._order]
+        return [reader.start() for reader in readers]
+
+    def get(self, config, scale_id=None):
+        """Lector de la balanza (la primera configurada si scale_id es None) o None si no existe"""
+        readers = self.readers(config)
+        if scale_id is None:
+            return readers[0] if readers else None
+        return self._readers.get(scale_id)
+
+scale_registry = ScaleRegistry()
+
+def get_scale_reader(config, scale_id=None):
+    """
+    Lector de una balanza, creado y arrancado en el primer uso con la
+    configuración de la app (SCALES / SCALE_*). Arrancar en el primer uso
+    evita que el proceso padre del reloader de Flask (debug) abra los puertos.
+    """
+    return scale_registry.get(config, scale_id)
+
+# --- Enumeración de puertos ---
+
+class PortScanner:
+    """
+    Caché de serial.tools.list_ports.comports(), que es lento (consulta el
+    sistema operativo en cada llamada). Se devuelve siempre la última lista;
+    si tiene más de ttl segundos se refresca en segundo plano, así un equipo
+    conectado o desconectado (hot-plug) aparece sin bloquear el request.
+    """
+
+    def __init__(self):
+        self._ports = None
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _scan(self):
+        try:
+            ports = [
+                {"device": p.device, "name": p.name, "description": p.description, "hwid": p.hwid}
+                for p in list_ports.comports()
+            ]
+            with self._lock:
+                self._ports = ports
+                self._scanned_at = time.monotonic()
+            return ports
+        finally:
+            self._refreshing = False
+
+    def _refresh_async(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._scan, name="scale-port-scan", daemon=True).start()
+
+    def invalidate(self):
+        """Marca la lista como vencida (se refresca en la próxima consulta)"""
+        self._scanned_at = 0.0
+
+    def ports(self, ttl, refresh=False):
+        """Lista de puertos; refresh=True fuerza una enumeración en el momento"""
+        if refresh or self._ports is None:
+            return self._scan()
+        if time.monotonic() - self._scanned_at > ttl:
+            self._refresh_async()
+        return self._ports
+
+port_scanner = PortScanner()
@@ -0,0 +1,93 @@
+from operator import attrgetter
+from sqlalchemy import inspect as sa_inspect, Date, DateTime, Time, Numeric, Float
+
+# Campos que nunca salen en una respuesta
+SENSITIVE_FIELDS = {"contraseña", "contrasena", "password_hash"}
+# Campos de sistema que se omiten en los objetos anidados (direccion, rif, telefonos)
+SYSTEM_FIELDS = {"created_at", "is_deleted", "modified_at"}
+
+def _iso(value):
+    return value.isoformat()
+
+def _hms(value):
+    return value.strftime("%H:%M:%S")
+
+def _converter_for(col_type):
+    """Conversor a JSON según el tipo de la columna (None = el valor sale tal cual)"""
+    # DateTime y Date comparten isoformat(); Float hereda de Numeric pero ya es float
+    if isinstance(col_type, (DateTime, Date)):
+        return _iso
+    if isinstance(col_type, Time):
+        return _hms
+    if isinstance(col_type, Float):
+        return None
+    if isinstance(col_type, Numeric):
+        # Mismo resultado que jsonify aplicaba a Decimal
+        return str
+    return None
+
+class _FieldSet:
+    """Columnas a leer y conversores a aplicar, resueltos una sola vez"""
+
+    def __init__(self, props):
+        self.names = tuple(col.name for _, col in props)
+        getter = attrgetter(*(key for key, _ in props))
+        # attrgetter con una sola clave devuelve el valor, no una tupla
+        self.values = getter if len(props) > 1 else (lambda obj: (getter(obj),))
+        self.converters = tuple(
+            (col.name, conv) for _, col in props
+            if (conv := _converter_for(col.type)) is not None
+        )
+
+    def __call__(self, obj):
+        data = dict(zip(self.names, self.values(obj)))
+        for name, conv in self.converters:
+            value = data[name]
+            if value is not None:
+                data[name] = conv(value)
+        return data
+
+class ModelSerializer:
+    """
+    Serializador compilado de un modelo: lista de columnas, conversor por tipo
+    (Date/Time/DateTime/Numeric) y campos excluidos se calculan al construirlo,
+    de modo que serializar una fila es un attrgetter + un dict.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._props = [
+            (prop.key, prop.columns[0])
+            for prop in sa_inspect(model).column_attrs
+            if prop.columns[0].name not in SENSITIVE_FIELDS
+        ]
+        self.field_names = frozenset(c.name for _, c in self._props)
+        self.full = _FieldSet(self._props)
+        self.clean = _FieldSet([(k, c) for k, c in self._props if c.name not in SYSTEM_FIELDS])
+        self._subsets = {}
+
+    def __call__(self, obj):
+        return self.full(obj)
+
+    def only(self, fields):
+        """Serializador de un subconjunto de columnas (?fields=), compilado una vez por combinación"""
+        fields = frozenset(fields)
+        subset = self._subsets.get(fields)
+        if subset is None:
+            subset = _FieldSet([(k, c) for k, c in self._props if c.name in fields])
+            if len(self._subsets) < 64:
+                self._subsets[fields] = subset
+        return subset
+
+_serializers = {}
+
+def get_serializer(model):
+    serializer = _serializers.get(model)
+    if serializer is None:
+        serializer = _serializers[model] = ModelSerializer(model)
+    return serializer
+
+def compile_serializers(models):
+    """Construye de antemano los serializadores (se llama al crear la app)"""
+    for model in models:
+        get_serializer(model)
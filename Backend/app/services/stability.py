@@ -0,0 +1,103 @@
+from collections import deque, namedtuple
+
+# Estado del detector después de cada muestra.
+# weight: promedio de la ventana estable (None si aún no hay muestras).
+# spread: max - min de la ventana; duration: segundos que cubre la ventana.
+# confidence: 0..1, ver StabilityDetector._confidence().
+StabilityState = namedtuple("StabilityState", ["stable", "weight", "spread", "duration", "samples", "confidence"])
+
+# Peso "bloqueado": la lectura estable que se puede registrar en un ticket.
+# lock_id cambia cada vez que el peso pasa de inestable a estable.
+StableLock = namedtuple("StableLock", ["lock_id", "weight", "since", "confirmed_at"])
+
+class StabilityDetector:
+    """
+    Detector de peso estable sobre el flujo de lecturas de la balanza.
+
+    Mantiene la ventana más larga de muestras recientes (como máximo `window`
+    segundos) cuyo rango max - min no supera `tolerance`. El peso es estable
+    cuando esa ventana cubre al menos `min_duration` segundos y tiene
+    `min_samples` muestras.
+
+    Cada muestra cuesta O(1) amortizado: el máximo y el mínimo de la ventana se
+    llevan con dos colas monótonas y el promedio con una suma acumulada, así que
+    nunca se recorre la ventana completa.
+    """
+
+    def __init__(self, window=5.0, tolerance=10.0, min_duration=2.0, min_samples=3):
+        self.window = window
+        self.tolerance = tolerance
+        self.min_duration = min_duration
+        self.min_samples = min_samples
+        self.reset()
+
+    def reset(self):
+        self._samples = deque()   # (t, peso)
+        self._max = deque()       # candidatos a máximo (pesos decrecientes)
+        self._min = deque()       # candidatos a mínimo (pesos crecientes)
+        self._sum = 0.0
+        self._state = StabilityState(False, None, None, 0.0, 0, 0.0)
+
+    def _evict_oldest(self):
+        sample = self._samples.popleft()
+        self._sum -= sample[1]
+        if self._max and self._max[0] is sample:
+            self._max.popleft()
+        if self._min and self._min[0] is sample:
+            self._min.popleft()
+
+    def add(self, weight, t):
+        """Agrega una muestra (t en segundos, reloj monotónico) y devuelve el nuevo estado"""
+        sample = (t, weight)
+        self._samples.append(sample)
+        self._sum += weight
+        while self._max and self._max[-1][1] <= weight:
+            self._max.pop()
+        self._max.append(sample)
+        while self._min and self._min[-1][1] >= weight:
+            self._min.pop()
+        self._min.append(sample)
+
+        # Se recorta por antigüedad y luego hasta que el rango entre en la tolerancia
+        while t - self._samples[0][0] > self.window:
+            self._evict_oldest()
+        while self._max[0][1] - self._min[0][1] > self.tolerance:
+            self._evict_oldest()
+
+        count = len(self._samples)
+        if count == 1:
+            # Se reinicia la suma para que no acumule error de redondeo
+            self._sum = weight
+        spread = self._max[0][1] - self._min[0][1]
+        duration = t - self._samples[0][0]
+        stable = duration >= self.min_duration and count >= self.min_samples
+        self._state = StabilityState(
+            stable,
+            self._sum / count,
+            spread,
+            duration,
+            count,
+            self._confidence(duration, spread),
+        )
+        return self._state
+
+    def _confidence(self, duration, spread):
+        # Crece con el tiempo estable (hasta min_duration) y baja cuanto más
+        # se acerca el rango a la tolerancia: 1.0 = quieto durante min_duration
+        coverage = min(1.0, duration / self.min_duration) if self.min_duration else 1.0
+        tightness = 1.0 - (spread / self.tolerance) / 2 if self.tolerance else 1.0
+        return round(coverage * tightness, 3)
+
+    def state(self):
+        return self._state
+
+def state_to_dict(state, lock=None):
+    return {
+        "stable": state.stable,
+        "weight": round(state.weight, 2) if state.weight is not None else None,
+        "spread": round(state.spread, 3) if state.spread is not None else None,
+        "duration_s": round(state.duration, 3),
+        "samples": state.samples,
+        "confidence": state.confidence,
+        "lock_id": lock.lock_id if lock is not None and state.stable else None,
+    }
@@ -0,0 +1,117 @@
+from flask import Response, current_app, stream_with_context
+from .memo import current_memo
+
+# Filas por cada lote (una consulta por lote, paginada por id)
+STREAM_BATCH_SIZE = 500
+NDJSON_MIMETYPE = "application/x-ndjson"
+SSE_MIMETYPE = "text/event-stream"
+
+def wants_stream(req):
+    """Streaming si el cliente acepta NDJSON o pide ?stream=1"""
+    if req.args.get("stream", "").lower() in ("1", "true", "yes"):
+        return True
+    return NDJSON_MIMETYPE in req.headers.get("Accept", "")
+
+def wants_ndjson(req):
+    return NDJSON_MIMETYPE in req.headers.get("Accept", "")
+
+def _json_layout():
+    """
+    Mismos argumentos de dumps que usa jsonify (app.json.response): indentado
+    en debug o con compact=False, compacto en otro caso. Devuelve (kwargs, indent).
+    """
+    provider = current_app.json
+    compact = getattr(provider, "compact", None)
+    if (compact is None and current_app.debug) or compact is False:
+        return {"indent": 2}, 2
+    return {"separators": (",", ":")}, None
+
+def stream_query(query, key, to_dict, ndjson=True, batch_size=STREAM_BATCH_SIZE, prefetch=None):
+    """
+    Respuesta chunked que recorre la consulta por lotes de batch_size con
+    paginación por clave (key > último ORDER BY key) y escribe cada fila
+    apenas se serializa.
+    - ndjson=True: un objeto JSON compacto por línea (application/x-ndjson).
+    - ndjson=False: un arreglo JSON emitido por partes, byte a byte igual al
+      que devolvería jsonify con la lista completa (mismo dumps, separadores
+      e indentación).
+    Cada lote se lee completo (.all()) antes de prefetch(lote) y de sus
+    selectinload: no queda un cursor abierto entre lotes, que en SQL Server
+    sin MARS haría fallar esas consultas ("Connection is busy with results
+    for another command"). La memoria queda acotada al lote actual: el memo
+    de serialización se vacía al terminar cada lote.
+    """
+    dumps = current_app.json.dumps
+    layout, indent = _json_layout()
+    if ndjson:
+        layout, indent = {"separators": (",", ":")}, None
+
+    def dump(obj):
+        row = dumps(obj, **layout)
+        if indent:
+            # Cada elemento del arreglo va un nivel más adentro
+            row = "\n".join(" " * indent + line for line in row.split("\n"))
+        return row
+
+    def batches():
+        last = None
+        while True:
+            page = query if last is None else query.filter(key > last)
+            batch = page.order_by(key).limit(batch_size).all()
+            if batch:
+                yield batch
+            if len(batch) < batch_size:
+                return
+            last = getattr(batch[-1], key.key)
+
+    def generate():
+        memo = current_memo()
+        first = True
+        for batch in batches():
+            if prefetch is not None:
+                prefetch(batch)
+            for obj in batch:
+                row = dump(to_dict(obj))
+                if ndjson:
+                    yield row + "\n"
+                elif first:
+                    yield ("[\n" if indent else "[") + row
+                else:
+                    yield (",\n" if indent else ",") + row
+                first = False
+            if memo is not None:
+                memo.clear()
+        if not ndjson:
+            # jsonify termina con salto de línea; la lista vacía es "[]"
+            if first:
+                yield "[]\n"
+            else:
+                yield ("\n]\n" if indent else "]\n")
+
+    mimetype = NDJSON_MIMETYPE if ndjson else "application/json"
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+def sse_message(data=None, event=None, id_=None, comment=None):
+    """Un mensaje Server-Sent Events (data se serializa como JSON)"""
+    lines = []
+    if comment is not None:
+        lines.append(f": {comment}")
+    if event:
+        lines.append(f"event: {event}")
+    if id_ is not None:
+        lines.append(f"id: {id_}")
+    if data is not None:
+        lines.append(f"data: {current_app.json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+def sse_response(events):
+    """
+    Respuesta text/event-stream a partir de un generador de mensajes.
+    Sin caché ni buffering de proxies (X-Accel-Buffering) para que cada
+    mensaje llegue apenas se genera.
+    """
+    response = Response(stream_with_context(events), mimetype=SSE_MIMETYPE)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
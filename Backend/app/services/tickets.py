@@ -0,0 +1,145 @@
+from functools import lru_cache
+
+from sqlalchemy import bindparam, func, literal, select, text
+
+from ..models import TicketPesaje, TICKET_NUMBER_SEQUENCE
+from .printing import ticket_written
+from .rollup import rollup_ticket_written
+
+TICKET_PREFIX = "TKT-"
+
+# Columnas que el servidor llena dentro del mismo INSERT
+SERVER_GENERATED = ("nro_ticket", "fecha_primer_peso")
+
+_SCALAR_DEFAULTS = {
+    c.name: c.default.arg for c in TicketPesaje.__table__.columns
+    if c.default is not None and c.default.is_scalar
+}
+
+def insert_ticket(session, values):
+    """
+    Crea un ticket de pesaje en un solo viaje a la BDD y devuelve la fila
+    insertada (Row con todas las columnas de Ticket_pesaje).
+    nro_ticket (de la secuencia) y fecha_primer_peso (hora del servidor SQL)
+    se generan en el mismo INSERT. No hace commit: queda en la transacción
+    de la sesión junto con lo que se haya hecho antes (asignación, ubicaciones).
+    """
+    dialect = session.get_bind(mapper=TicketPesaje).dialect
+    # Defaults de Python del modelo (reimpresiones=0, ...) que el ORM aplicaba
+    values = {**_SCALAR_DEFAULTS, **values}
+    if dialect.name == "mssql":
+        return session.execute(_mssql_insert(tuple(values), dialect), values).one()
+    return session.execute(_sqlite_insert(values)).one()
+
+@lru_cache(maxsize=64)
+def _mssql_insert(columns, dialect):
+    """INSERT con nro_ticket de la secuencia; se cachea por combinación de columnas enviadas"""
+    table = TicketPesaje.__table__
+    names = "".join(f"[{name}], " for name in columns)
+    params = "".join(f":{name}, " for name in columns)
+    number = f"CONCAT('{TICKET_PREFIX}', FORMAT(NEXT VALUE FOR [{TICKET_NUMBER_SEQUENCE.name}], '000000'))"
+    return _returning(
+        f"INSERT INTO [{table.name}] ({names}[nro_ticket], [fecha_primer_peso])",
+        f"VALUES ({params}{number}, GETDATE())",
+        dialect,
+        [bindparam(name, type_=table.c[name].type) for name in columns],
+    )
+
+def _returning(head, tail, dialect, binds):
+    """
+    Statement de escritura que devuelve las filas escritas de Ticket_pesaje.
+    head y tail son el INSERT/UPDATE partido donde va la cláusula OUTPUT
+    (antes de VALUES o de WHERE).
+    - SQL Server: lote con OUTPUT INSERTED.* INTO @ticket y SELECT de la
+      variable. Ticket_pesaje tiene triggers (BDD/TRIGGERS AVIGES.sql), y SQL
+      Server no permite OUTPUT sin INTO en una tabla con triggers.
+    - SQLite (benchmarks): RETURNING.
+    """
+    table = TicketPesaje.__table__
+    if dialect.name == "mssql":
+        declared = ", ".join(f"[{c.name}] {c.type.compile(dialect=dialect)}" for c in table.columns)
+        inserted = ", ".join(f"INSERTED.[{c.name}]" for c in table.columns)
+        sql = (
+            "SET NOCOUNT ON;\n"
+            f"DECLARE @ticket TABLE ({declared});\n"
+            f"{head}\nOUTPUT {inserted} INTO @ticket\n{tail};\n"
+            "SELECT * FROM @ticket;"
+        )
+    else:
+        sql = f"{head}\n{tail}\nRETURNING *"
+    return text(sql).bindparams(*binds).columns(*table.columns)
+
+def _sqlite_insert(values):
+    """
+    Equivalente para SQLite (benchmarks): sin secuencias, el número sale de
+    MAX(id) + 1, correcto porque SQLite serializa las escrituras.
+    """
+    table = TicketPesaje.__table__
+    next_number = select(func.coalesce(func.max(table.c.id), 0) + 1).scalar_subquery()
+    now = func.current_timestamp()
+    row = {"created_at": now, **values}
+    row["nro_ticket"] = literal(TICKET_PREFIX) + func.printf("%06d", next_number)
+    row["fecha_primer_peso"] = now
+    return table.insert().values(row).returning(*table.columns)
+
+# El peso que se registra depende del tipo: en una entrada el camión llega
+# cargado y se registra la tara al salir; en una salida, el bruto.
+# El "otro" peso es el registrado en el primer pesaje (None si aún no hay).
+_OTHER_WEIGHT = "(CASE WHEN [tipo] = 'Entrada' THEN [peso_bruto] ELSE [peso_tara] END)"
+
+def register_weight(session, ticket_id, peso, id_usuario, fecha, row_version=None):
+    """
+    Registra un pesaje con un solo UPDATE condicional que devuelve la fila:
+    el peso que corresponde al tipo, y si con él quedan ambos pesos, el neto,
+    el operador y la fecha del segundo pesaje; además el estado (Finalizado
+    si el producto no es el 1 o no tiene, si no En proceso mientras falte un
+    peso).
+    Sube row_version. Con row_version, solo escribe si el ticket sigue en esa
+    versión. Retorna la fila o None si no se escribió (no existe o cambió).
+    No hace commit.
+    """
+    dialect = session.get_bind(mapper=TicketPesaje).dialect
+    stmt = _register_weight(row_version is not None, dialect)
+    params = {"id": ticket_id, "peso": peso, "id_usuario": id_usuario, "fecha": fecha}
+    if row_version is not None:
+        params["row_version"] = row_version
+    row = session.execute(stmt, params).one_or_none()
+    if row is not None:
+        # El payload de impresión cacheado (services/printing.py) queda viejo al confirmar
+        ticket_written(session, ticket_id)
+        # Solo los Finalizados cuentan en Reportes_diarios (el peso no los cambia de día)
+        if row.estado == "Finalizado":
+            rollup_ticket_written(session, ticket_id)
+    return row
+
+@lru_cache(maxsize=8)
+def _register_weight(guarded, dialect):
+    table = TicketPesaje.__table__
+    other = _OTHER_WEIGHT
+    head = (
+        f"UPDATE [{table.name}] SET\n"
+        "    [peso_tara] = CASE WHEN [tipo] = 'Entrada' THEN :peso ELSE [peso_tara] END,\n"
+        "    [peso_bruto] = CASE WHEN [tipo] = 'Salida' THEN :peso ELSE [peso_bruto] END,\n"
+        f"    [peso_neto] = CASE WHEN {other} IS NOT NULL THEN ABS(:peso - {other}) ELSE [peso_neto] END,\n"
+        f"    [id_usuarios_segundo_peso] = CASE WHEN {other} IS NOT NULL THEN :id_usuario ELSE [id_usuarios_segundo_peso] END,\n"
+        f"    [fecha_segundo_peso] = CASE WHEN {other} IS NOT NULL THEN :fecha ELSE [fecha_segundo_peso] END,\n"
+        f"    [estado] = CASE WHEN [id_producto] IS NULL OR [id_producto] <> 1 THEN 'Finalizado' WHEN {other} IS NULL THEN 'En proceso' ELSE [estado] END,\n"
+        "    [row_version] = [row_version] + 1"
+    )
+    tail = "WHERE [id] = :id AND [is_deleted] = 0"
+    binds = [
+        bindparam("id", type_=table.c.id.type),
+        bindparam("peso", type_=table.c.peso_tara.type),
+        bindparam("id_usuario", type_=table.c.id_usuarios_segundo_peso.type),
+        bindparam("fecha", type_=table.c.fecha_segundo_peso.type),
+    ]
+    if guarded:
+        tail += " AND [row_version] = :row_version"
+        binds.append(bindparam("row_version", type_=table.c.row_version.type))
+    return _returning(head, tail, dialect, binds)
+
+def current_row_version(session, ticket_id):
+    """row_version vigente del ticket, o None si no existe (o está eliminado)"""
+    return session.execute(
+        select(TicketPesaje.row_version).where(TicketPesaje.id == ticket_id, TicketPesaje.is_deleted.is_(False))
+    ).scalar()
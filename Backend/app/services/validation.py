@@ -1,6 +1,7 @@
 from sqlalchemy import Integer, String, Boolean, Numeric, DateTime
 
-def validate_payload(model, data: dict, partial: bool = False):
+def validate_payload(model, data: dict, partial: bool = False, server_generated=()):
+    """server_generated: columnas que llena el servidor al insertar (no se exigen)"""
     cols = {c.name: c for c in model.__table__.columns}
     unknown = set(data.keys()) - set(cols.keys())
     if unknown:
@@ -8,7 +9,7 @@ def validate_payload(model, data: dict, partial: bool = False):
 
     required = []
     for c in cols.values():
-        if c.primary_key or c.autoincrement:
+        if c.primary_key or c.autoincrement or c.name in server_generated:
             continue
         if c.nullable:
             continue
@@ -0,0 +1,113 @@
+"""
+Carga masiva de vehículos y choferes: una fila por request como hasta ahora
+(validar, INSERT y COMMIT por fila) frente a import_csv (validación por lote
+con SELECT ... IN, executemany e INSERT múltiple con RETURNING, un COMMIT por
+lote).
+
+Cada statement y cada COMMIT esperan `rtt_ms` para simular el viaje a SQL
+Server. Un executemany cuenta como un solo viaje, que es lo que hace pyodbc
+con fast_executemany (DATABASE_FAST_EXECUTEMANY).
+
+En choferes, direcciones y personas van en un INSERT múltiple por lote: los
+ids se asignan por los valores devueltos (no por el orden de RETURNING, que ni
+SQLite ni SQL Server garantizan), así que la diferencia es similar a la de
+vehículos.
+
+    python -m benchmarks.bench_csv_import [filas] [rtt_ms] [lote]
+"""
+import io
+import sys
+
+from sqlalchemy import event, func, select
+
+from app.db import db
+from app.models import Choferes, Direcciones, EmpresasTransporte, Personas, Vehiculos
+from app.services.csv_import import import_csv
+from benchmarks.common import NOW, create_bench_app, count_queries, simulate_rtt, timer
+
+def vehiculos_csv(n, offset):
+    lines = ["placa,id_empresas_transportes"]
+    lines += [f"CSV{offset + i},{1 + i % 5}" for i in range(n)]
+    return "\n".join(lines) + "\n"
+
+def choferes_csv(n, offset):
+    lines = ["nombre,apellido,tipo_cedula,cedula,id_empresas_transportes,estado,municipio,sector"]
+    lines += [f"Chofer{i},Apellido,V,{offset + i},{1 + i % 5},Zulia,Mara,S{i}" for i in range(n)]
+    return "\n".join(lines) + "\n"
+
+def per_row_vehiculos(text):
+    """Lo que hace el frontend hoy: un POST por fila"""
+    rows = list(io.StringIO(text))[1:]
+    for line in rows:
+        placa, empresa = line.strip().split(",")
+        if db.session.execute(select(Vehiculos.id).where(Vehiculos.placa == placa)).first():
+            continue
+        if db.session.get(EmpresasTransporte, int(empresa)) is None:
+            continue
+        db.session.add(Vehiculos(placa=placa, id_empresas_transportes=int(empresa), created_at=NOW))
+        db.session.commit()
+
+def per_row_choferes(text):
+    """Un POST /combined/choferes por fila (sin teléfonos)"""
+    rows = list(io.StringIO(text))[1:]
+    for line in rows:
+        nombre, apellido, tipo, cedula, empresa, estado, municipio, sector = line.strip().split(",")
+        if db.session.execute(select(Personas.id).where(Personas.cedula == cedula)).first():
+            continue
+        direccion = Direcciones(estado=estado, municipio=municipio, sector=sector, created_at=NOW)
+        db.session.add(direccion)
+        db.session.flush()
+        persona = Personas(id_direcciones=direccion.id, nombre=nombre, apellido=apellido,
+                           tipo_cedula=tipo, cedula=cedula, created_at=NOW)
+        db.session.add(persona)
+        db.session.flush()
+        db.session.add(Choferes(id_personas=persona.id, id_empresas_transportes=int(empresa), created_at=NOW))
+        db.session.commit()
+
+def seed():
+    db.drop_all()
+    db.create_all()
+    db.session.add(Direcciones(id=1, estado="Zulia", municipio="Mara", sector="Centro", created_at=NOW))
+    for i in range(1, 6):
+        db.session.add(EmpresasTransporte(id=i, id_direcciones=1, nombre=f"Empresa{i}", created_at=NOW))
+    db.session.commit()
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rtt = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.001
+    batch_size = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+
+    app = create_bench_app()
+    with app.app_context():
+        @event.listens_for(db.engine, "connect")
+        def _getdate(dbapi_connection, record):
+            # created_at tiene DEFAULT getdate() de SQL Server
+            dbapi_connection.create_function("getdate", 0, lambda: NOW.isoformat(" "))
+
+        db.engine.dispose()
+        seed()
+        simulate_rtt(db.engine, rtt)
+
+        print(f"{n} filas por recurso, RTT simulado {rtt * 1000:g} ms, lotes de {batch_size}")
+        print(f"{'recurso':>9} | {'flujo':>10} | {'viajes':>6} | {'tiempo':>8} | {'filas/s':>8}")
+        cases = (
+            ("vehiculos", vehiculos_csv, per_row_vehiculos, Vehiculos),
+            ("choferes", choferes_csv, per_row_choferes, Choferes),
+        )
+        for resource, make_csv, per_row, model in cases:
+            before = db.session.execute(select(func.count()).select_from(model)).scalar()
+            for name, offset, fn in (
+                ("por fila", 0, per_row),
+                ("import_csv", n, lambda text: import_csv(resource, io.StringIO(text), batch_size)),
+            ):
+                text = make_csv(n, offset)
+                with count_queries() as counter, timer() as elapsed:
+                    fn(text)
+                db.session.remove()
+                print(f"{resource:>9} | {name:>10} | {counter['queries']:>6} | "
+                      f"{elapsed['seconds']:6.2f} s | {n / elapsed['seconds']:8.0f}")
+            after = db.session.execute(select(func.count()).select_from(model)).scalar()
+            assert after - before == 2 * n, f"{resource}: se esperaban {2 * n} filas nuevas"
+
+if __name__ == "__main__":
+    main()
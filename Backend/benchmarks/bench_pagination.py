@@ -0,0 +1,53 @@
+"""
+Compara la paginación por OFFSET (query.paginate: OFFSET + COUNT(*)) con la
+paginación por cursor (keyset_page: WHERE id > :after, sin COUNT) sobre una
+tabla Ticket_pesaje sintética grande, a distintas profundidades de página.
+
+    python -m benchmarks.bench_pagination [filas]
+"""
+import sys
+
+from app.db import db
+from app.models import TicketPesaje
+from app.services.pagination import keyset_page
+from benchmarks.common import create_bench_app, seed_ticket_rows, count_queries, timer
+
+PER_PAGE = 20
+REPEATS = 5
+
+def offset_page(page):
+    query = TicketPesaje.query.order_by(TicketPesaje.id)
+    return query.paginate(page=page, per_page=PER_PAGE, error_out=False).items
+
+def cursor_page(page):
+    # Con ids contiguos, el cursor de la página p es el último id de la página p-1
+    query = TicketPesaje.query.order_by(TicketPesaje.id)
+    rows, _ = keyset_page(query, TicketPesaje, (page - 1) * PER_PAGE, PER_PAGE)
+    return rows
+
+def measure(fn, page):
+    best = None
+    for _ in range(REPEATS):
+        db.session.expunge_all()
+        with count_queries() as counter, timer() as t:
+            rows = fn(page)
+        best = t["seconds"] if best is None else min(best, t["seconds"])
+    assert rows and rows[0].id == (page - 1) * PER_PAGE + 1
+    return counter["queries"], best
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    last_page = total // PER_PAGE
+    pages = sorted({1, 10, 100, last_page // 10, last_page // 2, last_page})
+    app = create_bench_app()
+    with app.app_context():
+        seed_ticket_rows(total)
+        print(f"Ticket_pesaje: {total} filas, {PER_PAGE} por página (mejor de {REPEATS})")
+        print(f"{'página':>8} | {'offset + count':>24} | {'cursor':>24}")
+        for page in pages:
+            q_off, t_off = measure(offset_page, page)
+            q_cur, t_cur = measure(cursor_page, page)
+            print(f"{page:>8} | {q_off} consultas {t_off * 1000:9.2f} ms | {q_cur} consultas {t_cur * 1000:9.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Cuenta las consultas necesarias para serializar N tickets con su expansión
+completa (producto, asignación -> chofer -> persona, vehículo -> empresa, ...).
+
+- sin prefetch: cada FK de cada fila se resuelve con un SELECT propio (N+1).
+- con prefetch: prefetch_options() resuelve cada tabla con un SELECT ... IN (...).
+  SQLAlchemy parte el IN en lotes de 500 ids, así que por encima de 500 filas
+  se agrega una consulta por relación cada 500 filas.
+
+    python -m benchmarks.bench_prefetch
+"""
+from app.db import db
+from app.models import TicketPesaje
+from app.routes import serialize
+from app.services.prefetch import prefetch_options
+from benchmarks.common import create_bench_app, seed_tickets, count_queries, timer
+
+SIZES = (10, 100, 1000)
+
+def run(n, prefetch):
+    db.session.expunge_all()
+    query = TicketPesaje.query
+    if prefetch:
+        query = query.options(*prefetch_options(TicketPesaje, "tickets_pesaje"))
+    with count_queries() as counter, timer() as t:
+        items = [serialize(x, "tickets_pesaje") for x in query.order_by(TicketPesaje.id).all()]
+    assert len(items) == n
+    return counter["queries"], t["seconds"]
+
+def main():
+    app = create_bench_app()
+    with app.app_context():
+        print(f"{'tickets':>8} | {'sin prefetch':>22} | {'con prefetch':>22}")
+        for n in SIZES:
+            seed_tickets(n)
+            q_old, t_old = run(n, prefetch=False)
+            q_new, t_new = run(n, prefetch=True)
+            print(f"{n:>8} | {q_old:>8} consultas {t_old:7.3f}s | {q_new:>8} consultas {t_new:7.3f}s")
+
+if __name__ == "__main__":
+    main()
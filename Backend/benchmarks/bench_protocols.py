@@ -0,0 +1,95 @@
+"""
+Tramas por segundo que decodifica cada protocolo de indicador
+(services/protocols.py), alimentando lotes como los que entrega el puerto
+serial con salida continua.
+
+Se compara con la lectura anterior (una línea por vez: find + decode + del
+por trama) y, para cada protocolo, se mide también la entrada por memoryview
+sobre un buffer de recepción reutilizado.
+
+    python -m benchmarks.bench_protocols [tramas] [bytes_por_lote]
+"""
+import random
+import sys
+
+from app.services.protocols import ENCODERS, Frame, make_parser, parse_weight
+from benchmarks.common import timer
+
+REPEATS = 3
+
+def sample_stream(protocol, frames):
+    """Camión que sube, se asienta con ruido y baja, repetido hasta completar las tramas"""
+    rng = random.Random(7)
+    encode = ENCODERS[protocol]
+    chunks = []
+    for i in range(frames):
+        phase = i % 400
+        if phase < 100:
+            weight, motion = phase * 150.0, True
+        elif phase < 300:
+            weight, motion = 15000 + rng.uniform(-5, 5), False
+        else:
+            weight, motion = (400 - phase) * 150.0, True
+        chunks.append(encode(weight, motion=motion))
+    return b"".join(chunks)
+
+def batches(stream, size):
+    return [stream[i:i + size] for i in range(0, len(stream), size)]
+
+def line_by_line(chunks):
+    # Lectura anterior de ScaleReader: una trama por iteración (find, decode,
+    # del del buffer y una tupla por lectura, como hacía _publish)
+    pending = bytearray()
+    count = 0
+    for chunk in chunks:
+        pending += chunk
+        while True:
+            end = pending.find(b"\n")
+            if end < 0:
+                break
+            line = pending[:end].decode("utf-8", errors="ignore").strip()
+            del pending[:end + 1]
+            if line:
+                Frame(parse_weight(line), None, None, None, None, None, None, line)
+                count += 1
+    return count
+
+def batched(protocol, chunks):
+    parser = make_parser(protocol)
+    return sum(len(parser.feed(chunk)) for chunk in chunks)
+
+def batched_view(protocol, chunks, size):
+    # Buffer de recepción reutilizado: el parser recibe una vista, sin bytes intermedios
+    parser = make_parser(protocol)
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    count = 0
+    for chunk in chunks:
+        n = len(chunk)
+        buffer[:n] = chunk
+        count += len(parser.feed(view[:n]))
+    return count
+
+def best_rate(fn, expected):
+    best = None
+    for _ in range(REPEATS):
+        with timer() as t:
+            count = fn()
+        assert count == expected, (count, expected)
+        best = t["seconds"] if best is None else min(best, t["seconds"])
+    return expected / best
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    print(f"{frames} tramas, lotes de {size} bytes (mejor de {REPEATS}), tramas/s")
+    print(f"{'protocolo':>10} | {'línea por línea':>16} | {'por lotes':>12} | {'memoryview':>12}")
+    for protocol in ENCODERS:
+        chunks = batches(sample_stream(protocol, frames), size)
+        baseline = f"{best_rate(lambda: line_by_line(chunks), frames):16,.0f}" if protocol != "toledo" else f"{'-':>16}"
+        rate = best_rate(lambda: batched(protocol, chunks), frames)
+        view_rate = best_rate(lambda: batched_view(protocol, chunks, size), frames)
+        print(f"{protocol:>10} | {baseline} | {rate:12,.0f} | {view_rate:12,.0f}")
+
+if __name__ == "__main__":
+    main()
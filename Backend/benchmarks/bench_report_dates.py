@@ -0,0 +1,105 @@
+"""
+Filtro por fecha de los reportes sobre un Viajes_tiempos sintético de varios
+años: la condición anterior, una función sobre la columna (CAST(... AS DATE)
+en SQL Server, DATE(...) aquí), frente al rango [desde, hasta) sobre
+hora_llegada_romana que usan ahora reporte_granja_dia y
+reporte_transporte_aves_sql.
+
+Muestra el plan de SQLite (EXPLAIN QUERY PLAN) y el tiempo de cada consulta:
+con la función el plan es un SCAN de Viajes_tiempos; con el rango, un SEARCH
+en idx_viajes_tiempos_llegada. En SQL Server el cambio equivalente es de
+Index Scan a Index Seek (SET SHOWPLAN_TEXT ON).
+
+    python -m benchmarks.bench_report_dates [tickets] [años]
+"""
+import datetime
+import sys
+
+from sqlalchemy import text
+
+from app.db import db
+from app import models as m
+from benchmarks.common import NOW, create_bench_app, timer
+
+REPEATS = 5
+START = datetime.datetime(2023, 1, 1, 6, 0, 0)
+
+BASE_SQL = """
+    SELECT COUNT(*), SUM(tp.peso_neto)
+    FROM Ticket_pesaje tp
+    JOIN Viajes_tiempos vt ON vt.id_ticket = tp.id
+    WHERE tp.estado = 'Finalizado' AND {filtro}
+"""
+# Antes: función sobre la columna, fecha_fin inclusive
+FUNCTION_FILTER = "DATE(vt.hora_llegada_romana) BETWEEN :fecha_inicio AND :fecha_fin"
+# Ahora: rango semiabierto sobre la columna
+RANGE_FILTER = "vt.hora_llegada_romana >= :desde AND vt.hora_llegada_romana < :hasta"
+
+def seed(n, years, batch=10000):
+    """n tickets Finalizados repartidos de forma uniforme en `years` años, una llegada por ticket"""
+    db.drop_all()
+    db.create_all()
+    step = datetime.timedelta(days=365 * years) / n
+    tickets = m.TicketPesaje.__table__
+    tiempos = m.ViajesTiempos.__table__
+    for start in range(1, n + 1, batch):
+        ids = range(start, min(start + batch, n + 1))
+        db.session.execute(tickets.insert(), [
+            {
+                "id": i, "id_producto": 1, "id_asignaciones": 1, "id_usuarios_primer_peso": 1,
+                "id_origen": 1, "id_destino": 2, "nro_ticket": f"TKT-{i:06d}", "tipo": "Entrada",
+                "peso_bruto": 15000, "peso_tara": 7000, "peso_neto": 8000, "estado": "Finalizado",
+                "fecha_primer_peso": START + step * i, "reimpresiones": 0, "is_deleted": False,
+                "created_at": NOW,
+            }
+            for i in ids
+        ])
+        db.session.execute(tiempos.insert(), [
+            {"id": i, "id_ticket": i, "hora_llegada_romana": START + step * i, "is_deleted": False,
+             "created_at": NOW}
+            for i in ids
+        ])
+    db.session.commit()
+
+def plan(sql, params):
+    rows = db.session.execute(text("EXPLAIN QUERY PLAN " + sql), params).all()
+    return "; ".join(row[-1] for row in rows)
+
+def measure(sql, params):
+    best = None
+    for _ in range(REPEATS):
+        with timer() as t:
+            result = db.session.execute(text(sql), params).one()
+        best = t["seconds"] if best is None else min(best, t["seconds"])
+    return tuple(result), best
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    years = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    app = create_bench_app()
+    with app.app_context():
+        seed(n, years)
+        print(f"Viajes_tiempos: {n} llegadas en {years} años (mejor de {REPEATS})")
+        first = START.date() + datetime.timedelta(days=180)
+        cases = (
+            ("1 día", first, first),
+            ("1 semana", first, first + datetime.timedelta(days=6)),
+            ("1 mes", first, first + datetime.timedelta(days=30)),
+        )
+        function_sql = BASE_SQL.format(filtro=FUNCTION_FILTER)
+        range_sql = BASE_SQL.format(filtro=RANGE_FILTER)
+        for name, fecha_inicio, fecha_fin in cases:
+            function_params = {"fecha_inicio": fecha_inicio.isoformat(), "fecha_fin": fecha_fin.isoformat()}
+            range_params = {
+                "desde": datetime.datetime.combine(fecha_inicio, datetime.time.min),
+                "hasta": datetime.datetime.combine(fecha_fin + datetime.timedelta(days=1), datetime.time.min),
+            }
+            function_result, t_function = measure(function_sql, function_params)
+            range_result, t_range = measure(range_sql, range_params)
+            assert function_result == range_result, (function_result, range_result)
+            print(f"\n{name}: {function_result[0]} tickets")
+            print(f"  función {t_function * 1000:9.2f} ms | {plan(function_sql, function_params)}")
+            print(f"  rango   {t_range * 1000:9.2f} ms | {plan(range_sql, range_params)}")
+
+if __name__ == "__main__":
+    main()
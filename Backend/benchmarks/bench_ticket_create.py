@@ -0,0 +1,130 @@
+"""
+Latencia de crear tickets en la entrada de la romana con varias estaciones
+creando a la vez: flujo anterior (SELECT GETDATE(), INSERT con nro_ticket
+temporal, COMMIT, UPDATE del nro_ticket, COMMIT, SELECT del ticket) frente a
+insert_ticket (un INSERT que genera nro_ticket y devuelve la fila, un COMMIT).
+
+SQLite no tiene latencia de red, así que cada statement y cada COMMIT esperan
+`rtt_ms` para simular el viaje a SQL Server. SQLite además serializa las
+escrituras (bloqueo de toda la base hasta el COMMIT), lo que castiga a ambos
+flujos; en SQL Server los INSERT de tickets distintos no se bloquean entre sí.
+
+    python -m benchmarks.bench_ticket_create [estaciones] [tickets_por_estación] [rtt_ms]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from sqlalchemy import event, text
+
+from app.db import db
+from app.models import TicketPesaje
+from app.services.serializers import get_serializer
+from app.services.tickets import insert_ticket
+from benchmarks.common import NOW, create_bench_app, seed_tickets, count_queries, simulate_rtt
+
+TICKET = {
+    "id_producto": 1, "id_asignaciones": 1, "id_usuarios_primer_peso": 1, "id_origen": 1,
+    "id_destino": 2, "tipo": "Entrada", "peso_bruto": 15000, "estado": "En proceso",
+}
+
+def create_before():
+    """Flujo anterior de create_ticket_pesaje"""
+    fecha = db.session.execute(text("SELECT CURRENT_TIMESTAMP")).scalar()
+    ticket = TicketPesaje(nro_ticket=f"PEND-{uuid.uuid4().hex[:8]}", created_at=NOW,
+                          fecha_primer_peso=NOW.fromisoformat(fecha), **TICKET)
+    db.session.add(ticket)
+    db.session.flush()
+    ticket_id = ticket.id
+    db.session.commit()
+    db.session.query(TicketPesaje).filter_by(id=ticket_id).update({"nro_ticket": f"TKT-{ticket_id:06d}"})
+    db.session.commit()
+    ticket = db.session.get(TicketPesaje, ticket_id)
+    return get_serializer(TicketPesaje)(ticket)
+
+def create_after():
+    row = insert_ticket(db.session, dict(TICKET))
+    db.session.commit()
+    return get_serializer(TicketPesaje)(row)
+
+def run(app, fn, stations, per_station):
+    latencies = []
+    lock = threading.Lock()
+    errors = []
+
+    def station():
+        with app.app_context():
+            mine = []
+            try:
+                for _ in range(per_station):
+                    start = time.perf_counter()
+                    fn()
+                    mine.append(time.perf_counter() - start)
+            except Exception as exc:
+                db.session.rollback()
+                errors.append(exc)
+            finally:
+                db.session.remove()
+            with lock:
+                latencies.extend(mine)
+
+    threads = [threading.Thread(target=station) for _ in range(stations)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+    return latencies, elapsed
+
+def round_trips(app, fn):
+    with app.app_context():
+        commits = []
+
+        def _on_commit(conn):
+            commits.append(conn)
+
+        event.listen(db.engine, "commit", _on_commit)
+        try:
+            with count_queries() as counter:
+                fn()
+        finally:
+            event.remove(db.engine, "commit", _on_commit)
+        return counter["queries"] + len(commits)
+
+def percentile(values, p):
+    return statistics.quantiles(values, n=100)[p - 1] if len(values) > 1 else values[0]
+
+def main():
+    stations = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    per_station = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rtt = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.001
+
+    path = os.path.join(tempfile.mkdtemp(), "tickets.db")
+    app = create_bench_app(f"sqlite:///{path}", {"connect_args": {"timeout": 60}})
+    with app.app_context():
+        seed_tickets(1)
+        simulate_rtt(db.engine, rtt)
+
+    print(f"{stations} estaciones x {per_station} tickets, RTT simulado {rtt * 1000:g} ms")
+    print(f"{'flujo':>9} | {'viajes':>6} | {'p50':>9} | {'p95':>9} | {'tickets/s':>9}")
+    for name, fn in (("anterior", create_before), ("un viaje", create_after)):
+        trips = round_trips(app, fn)
+        for concurrency in sorted({1, stations}):
+            latencies, elapsed = run(app, fn, concurrency, per_station)
+            print(f"{name:>9} | {trips:>6} | {percentile(latencies, 50) * 1000:6.2f} ms | "
+                  f"{percentile(latencies, 95) * 1000:6.2f} ms | {len(latencies) / elapsed:9.1f}"
+                  f"   ({concurrency} {'estaciones' if concurrency > 1 else 'estación'})")
+
+    with app.app_context():
+        numbers = [n for (n,) in db.session.query(TicketPesaje.nro_ticket).filter(TicketPesaje.nro_ticket.like("TKT-%"))]
+        assert len(numbers) == len(set(numbers)), "nro_ticket repetido"
+
+if __name__ == "__main__":
+    main()
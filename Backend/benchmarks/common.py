@@ -0,0 +1,122 @@
+"""
+Utilidades compartidas por los benchmarks.
+
+Los benchmarks corren contra una base SQLite en memoria para poder ejecutarse
+sin SQL Server; lo que miden (número de consultas, filas tocadas, tiempos
+relativos) no depende del motor.
+
+Uso (desde la carpeta Backend):
+    python -m benchmarks.bench_prefetch
+"""
+import datetime
+import time
+from contextlib import contextmanager
+
+from flask import Flask
+from sqlalchemy import event
+
+from app.db import db
+from app import models as m
+
+NOW = datetime.datetime(2026, 1, 5, 8, 0, 0)
+
+def create_bench_app(uri="sqlite://", engine_options=None):
+    """Crea una app Flask mínima (sin JWT ni blueprint) contra una base de prueba"""
+    app = Flask("benchmarks")
+    app.config["SQLALCHEMY_DATABASE_URI"] = uri
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    if engine_options:
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options
+    db.init_app(app)
+    return app
+
+def seed_tickets(n):
+    """
+    Crea n tickets, cada uno con su propia cadena asignación -> chofer -> persona
+    y vehículo -> empresa, que es el peor caso para las expansiones por FK.
+    Se envía created_at explícito porque SQLite no tiene GETDATE().
+    """
+    db.drop_all()
+    db.create_all()
+    rows = []
+    rows.append(m.Roles(id=1, nombre="Operador", created_at=NOW))
+    rows.append(m.Productos(id=1, nombre="Pollo vivo", codigo="PRD-1", created_at=NOW))
+    rows.append(m.RIF(id=1, tipo="J", numero="000", created_at=NOW))
+    rows.append(m.Direcciones(id=1, estado="Zulia", municipio="Mara", sector="Centro", created_at=NOW))
+    rows.append(m.Personas(id=1, id_direcciones=1, nombre="Operador", apellido="Romana",
+                           tipo_cedula="V", cedula="0", created_at=NOW))
+    rows.append(m.Usuarios(id=1, id_personas=1, id_roles=1, usuario="romana", contraseña="x", created_at=NOW))
+    rows.append(m.Ubicaciones(id=1, id_direcciones=1, nombre="Granja", tipo="Granja", created_at=NOW))
+    rows.append(m.Ubicaciones(id=2, id_direcciones=1, nombre="Matadero", tipo="Matadero", created_at=NOW))
+    for i in range(1, n + 1):
+        rows.append(m.Direcciones(id=i + 1, estado="Zulia", municipio="Mara", sector=f"S{i}", created_at=NOW))
+        rows.append(m.Personas(id=i + 1, id_direcciones=i + 1, nombre=f"Chofer{i}", apellido="X",
+                               tipo_cedula="V", cedula=str(i), created_at=NOW))
+        rows.append(m.EmpresasTransporte(id=i, id_direcciones=i + 1, nombre=f"Empresa{i}", created_at=NOW))
+        rows.append(m.Vehiculos(id=i, placa=f"P{i}", id_empresas_transportes=i, created_at=NOW))
+        rows.append(m.Choferes(id=i, id_personas=i + 1, id_empresas_transportes=i, created_at=NOW))
+        rows.append(m.Asignaciones(id=i, id_vehiculos=i, id_chofer=i, fecha=NOW.date(),
+                                   hora=NOW.time(), created_at=NOW))
+        rows.append(m.TicketPesaje(id=i, id_producto=1, id_asignaciones=i, id_usuarios_primer_peso=1,
+                                   id_usuarios_segundo_peso=1, id_origen=1, id_destino=2,
+                                   nro_ticket=f"TKT-{i:06d}", tipo="Entrada", peso_bruto=15000,
+                                   peso_tara=7000, peso_neto=8000, estado="Finalizado",
+                                   fecha_primer_peso=NOW, fecha_segundo_peso=NOW,
+                                   reimpresiones=0, created_at=NOW))
+    db.session.add_all(rows)
+    db.session.commit()
+    db.session.expunge_all()
+
+def seed_ticket_rows(n, batch=10000):
+    """
+    Llena Ticket_pesaje con n filas sintéticas vía executemany (sin objetos ORM).
+    Las FKs apuntan a ids fijos: SQLite no las valida por defecto y aquí solo
+    interesa el volumen de la tabla.
+    """
+    db.drop_all()
+    db.create_all()
+    table = m.TicketPesaje.__table__
+    for start in range(1, n + 1, batch):
+        rows = [
+            {
+                "id": i, "id_producto": 1, "id_asignaciones": 1, "id_usuarios_primer_peso": 1,
+                "id_origen": 1, "id_destino": 2, "nro_ticket": f"TKT-{i:06d}", "tipo": "Entrada",
+                "peso_bruto": 15000, "peso_tara": 7000, "peso_neto": 8000, "estado": "Finalizado",
+                "fecha_primer_peso": NOW + datetime.timedelta(minutes=i), "reimpresiones": 0,
+                "is_deleted": False, "created_at": NOW,
+            }
+            for i in range(start, min(start + batch, n + 1))
+        ]
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+
+@contextmanager
+def count_queries():
+    """Cuenta los statements que llegan al motor dentro del bloque"""
+    counter = {"queries": 0}
+
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        counter["queries"] += 1
+
+    engine = db.engine
+    event.listen(engine, "before_cursor_execute", _on_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", _on_execute)
+
+def simulate_rtt(engine, seconds):
+    """Cada statement y cada COMMIT esperan un viaje de red (SQLite no tiene latencia)"""
+    def _wait(*args):
+        time.sleep(seconds)
+    event.listen(engine, "before_cursor_execute", _wait)
+    event.listen(engine, "commit", _wait)
+
+@contextmanager
+def timer():
+    result = {"seconds": 0.0}
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["seconds"] = time.perf_counter() - start
@@ -22,6 +22,66 @@ class Config:
         f"&TrustServerCertificate={'yes' if TRUST_CERT else 'no'}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # pyodbc envía los executemany (importación CSV) como un arreglo de parámetros
+    # en un solo viaje en vez de una fila por viaje
+    FAST_EXECUTEMANY = _bool(os.getenv("DATABASE_FAST_EXECUTEMANY"), True)
+    SQLALCHEMY_ENGINE_OPTIONS = {"fast_executemany": FAST_EXECUTEMANY}
+    # Hilos para resolver en paralelo los recursos de POST /api/bulk.
+    # Debe ser menor que el pool de conexiones de SQLAlchemy (5 + 10 de overflow por defecto).
+    BULK_MAX_WORKERS = int(os.getenv("BULK_MAX_WORKERS", "4"))
+    # Caché de datos de referencia (productos, roles, ubicaciones, vehículos, choferes, empresas).
+    # Tamaño máximo en entradas (0 la desactiva) y vida máxima en segundos,
+    # que acota lo que tarda en verse un cambio hecho fuera de este proceso.
+    REFERENCE_CACHE_SIZE = int(os.getenv("REFERENCE_CACHE_SIZE", "2000"))
+    REFERENCE_CACHE_TTL = int(os.getenv("REFERENCE_CACHE_TTL", "300"))
+    # Caché de payloads de impresión de tickets Finalizados (reimpresiones).
+    # Se invalida al modificar el ticket o sus datos relacionados; el TTL acota
+    # los cambios hechos fuera de este proceso.
+    PRINT_CACHE_SIZE = int(os.getenv("PRINT_CACHE_SIZE", "1000"))
+    PRINT_CACHE_TTL = int(os.getenv("PRINT_CACHE_TTL", "3600"))
+    # ETag: en SQL Server la huella sale de la columna row_stamp (rowversion) de
+    # cada tabla. Las tablas sin ella (SQLite, tablas sin migrar) solo ven las
+    # escrituras de este proceso, así que sus ETag vencen a los ETAG_FALLBACK_TTL
+    # segundos (0: sin vencimiento)
+    ETAG_FALLBACK_TTL = int(os.getenv("ETAG_FALLBACK_TTL", "60"))
+
+    # Balanza: un hilo de fondo mantiene el puerto abierto y guarda las últimas lecturas.
+    # SCALE_READ_TIMEOUT: timeout de cada lectura del puerto (s).
+    # SCALE_WAIT_TIMEOUT: cuánto espera /api/serial/read una lectura nueva si no hay una vigente (s).
+    # SCALE_STALE_AFTER: antigüedad a partir de la cual una lectura ya no se considera vigente (s).
+    # Varias romanas: SCALES="romana1=COM2:9600:line,romana2=COM3" (id=puerto[:baudios[:protocolo]]).
+    # Sin SCALES se usa una sola balanza, "principal", con SCALE_PORT y SCALE_BAUD_RATE.
+    SCALES = os.getenv("SCALES", "")
+    SCALE_PORT = os.getenv("SCALE_PORT", "COM2")
+    SCALE_BAUD_RATE = int(os.getenv("SCALE_BAUD_RATE", "9600"))
+    SCALE_READ_TIMEOUT = float(os.getenv("SCALE_READ_TIMEOUT", "1"))
+    SCALE_WAIT_TIMEOUT = float(os.getenv("SCALE_WAIT_TIMEOUT", "5"))
+    SCALE_STALE_AFTER = float(os.getenv("SCALE_STALE_AFTER", "3"))
+    SCALE_RECONNECT_DELAY = float(os.getenv("SCALE_RECONNECT_DELAY", "2"))
+    SCALE_BUFFER_SIZE = int(os.getenv("SCALE_BUFFER_SIZE", "256"))
+    # Vigencia (s) de la lista de puertos de /api/serial/list antes de refrescarla en segundo plano
+    SCALE_PORTS_TTL = float(os.getenv("SCALE_PORTS_TTL", "30"))
+    # /api/serial/stream (SSE): lecturas pendientes por cliente antes de descartar
+    # las más viejas, y cada cuántos segundos se envía un keep-alive si no hay lecturas.
+    SCALE_SSE_QUEUE_SIZE = int(os.getenv("SCALE_SSE_QUEUE_SIZE", "1"))
+    SCALE_SSE_HEARTBEAT = float(os.getenv("SCALE_SSE_HEARTBEAT", "15"))
+    # Detección de peso estable: ventana máxima (s), variación tolerada (kg),
+    # tiempo y muestras mínimas dentro de la tolerancia, y vigencia (s) de un
+    # peso bloqueado para registrarlo en un ticket después de que el camión se mueva.
+    SCALE_STABLE_WINDOW = float(os.getenv("SCALE_STABLE_WINDOW", "5"))
+    SCALE_STABLE_TOLERANCE = float(os.getenv("SCALE_STABLE_TOLERANCE", "10"))
+    SCALE_STABLE_MIN_DURATION = float(os.getenv("SCALE_STABLE_MIN_DURATION", "2"))
+    SCALE_STABLE_MIN_SAMPLES = int(os.getenv("SCALE_STABLE_MIN_SAMPLES", "3"))
+    SCALE_LOCK_TTL = float(os.getenv("SCALE_LOCK_TTL", "30"))
+
+    # Idempotency-Key en la creación de tickets y el registro de pesos:
+    # horas que se guarda la respuesta para repetirla si el cliente reintenta
+    IDEMPOTENCY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+
+    # Importación CSV (/api/import/<recurso>): filas por lote (cada lote es una
+    # transacción) y máximo de errores por fila que se detallan en la respuesta
+    IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+    IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "500"))
 
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "1234")
     JWT_TOKEN_LOCATION = ["headers"]
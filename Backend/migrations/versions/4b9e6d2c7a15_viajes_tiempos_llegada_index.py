@@ -0,0 +1,29 @@
+"""índice de Viajes_tiempos.hora_llegada_romana
+
+Revision ID: 4b9e6d2c7a15
+Revises: e7b2c94a1f30
+Create Date: 2026-10-18 17:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b9e6d2c7a15'
+down_revision = 'e7b2c94a1f30'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Los reportes filtran por rango de hora_llegada_romana (>= desde y < hasta)
+    # en vez de CAST(... AS DATE), así que SQL Server puede hacer un seek
+    with op.batch_alter_table('Viajes_tiempos', schema=None) as batch_op:
+        batch_op.create_index('idx_viajes_tiempos_llegada', ['hora_llegada_romana'], unique=False,
+                              mssql_include=['id_ticket'])
+
+
+def downgrade():
+    with op.batch_alter_table('Viajes_tiempos', schema=None) as batch_op:
+        batch_op.drop_index('idx_viajes_tiempos_llegada')
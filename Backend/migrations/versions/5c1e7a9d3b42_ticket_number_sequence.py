@@ -0,0 +1,38 @@
+"""secuencia para nro_ticket
+
+Revision ID: 5c1e7a9d3b42
+Revises: 224b32de03b7
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1e7a9d3b42'
+down_revision = '224b32de03b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # El número del ticket sale de la secuencia dentro del mismo INSERT
+    # (services/tickets.py). Arranca después del mayor TKT-nnnnnn existente
+    # para continuar la numeración anterior (TKT-{id:06d}).
+    op.execute(
+        """
+        DECLARE @inicio bigint = (
+            SELECT ISNULL(MAX(TRY_CAST(SUBSTRING(nro_ticket, 5, 20) AS bigint)), 0) + 1
+            FROM Ticket_pesaje
+            WHERE nro_ticket LIKE 'TKT-%'
+        );
+        DECLARE @sql nvarchar(300) = N'CREATE SEQUENCE [seq_ticket_pesaje_nro] AS int START WITH '
+            + CAST(@inicio AS nvarchar(20)) + N' INCREMENT BY 1 CACHE 50';
+        EXEC sp_executesql @sql;
+        """
+    )
+
+
+def downgrade():
+    op.execute(sa.text("DROP SEQUENCE [seq_ticket_pesaje_nro]"))
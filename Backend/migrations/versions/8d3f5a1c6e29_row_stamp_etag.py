@@ -0,0 +1,45 @@
+"""row_stamp (rowversion) para los ETag
+
+Revision ID: 8d3f5a1c6e29
+Revises: 4b9e6d2c7a15
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3f5a1c6e29'
+down_revision = '4b9e6d2c7a15'
+branch_labels = None
+depends_on = None
+
+# Tablas que pueden aparecer en una respuesta con ETag (recursos y sus
+# expansiones, incluidas las tablas de relación)
+TABLES = (
+    'RIF', 'Direcciones', 'Personas_direcciones', 'Personas', 'Personas_telefonos', 'Telefonos', 'Roles',
+    'Usuarios', 'Productos', 'Empresas_transportes', 'Empresas_direcciones', 'Empresas_telefonos',
+    'Vehiculos', 'Choferes', 'Asignaciones', 'Ubicaciones', 'Granjas', 'Granjas_telefonos', 'Galpones',
+    'Lotes', 'Ticket_pesaje', 'Viajes_tiempos', 'Viajes_conteos', 'Viajes_origen', 'Estadisticas',
+)
+
+
+def upgrade():
+    # SQL Server cambia el rowversion de la fila en cada INSERT/UPDATE, lo haga
+    # quien lo haga (otro worker, otro proceso, SQL directo): MAX(row_stamp)
+    # junto con COUNT(*) es la huella de la tabla (services/etag.py).
+    # No está en los modelos; en otros motores los ETag usan el contador del proceso.
+    if op.get_bind().dialect.name != 'mssql':
+        return
+    for table in TABLES:
+        op.execute(f"ALTER TABLE [{table}] ADD [row_stamp] rowversion NOT NULL")
+        op.create_index(f'idx_{table.lower()}_row_stamp', table, ['row_stamp'], unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'mssql':
+        return
+    for table in TABLES:
+        op.drop_index(f'idx_{table.lower()}_row_stamp', table_name=table)
+        op.execute(f"ALTER TABLE [{table}] DROP COLUMN [row_stamp]")
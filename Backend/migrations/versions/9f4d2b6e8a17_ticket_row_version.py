@@ -0,0 +1,27 @@
+"""row_version en Ticket_pesaje
+
+Revision ID: 9f4d2b6e8a17
+Revises: 5c1e7a9d3b42
+Create Date: 2026-10-18 13:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f4d2b6e8a17'
+down_revision = '5c1e7a9d3b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Concurrencia optimista de registrar_peso: los tickets existentes quedan en la versión 1
+    with op.batch_alter_table('Ticket_pesaje', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('row_version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('Ticket_pesaje', schema=None) as batch_op:
+        batch_op.drop_column('row_version')
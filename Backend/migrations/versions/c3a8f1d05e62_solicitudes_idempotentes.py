@@ -0,0 +1,40 @@
+"""tabla Solicitudes_idempotentes
+
+Revision ID: c3a8f1d05e62
+Revises: 9f4d2b6e8a17
+Create Date: 2026-10-18 13:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3a8f1d05e62'
+down_revision = '9f4d2b6e8a17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('Solicitudes_idempotentes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('clave', sa.String(length=300), nullable=False),
+    sa.Column('huella', sa.String(length=64), nullable=False),
+    sa.Column('estado_http', sa.Integer(), nullable=False),
+    sa.Column('respuesta', sa.UnicodeText(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_Solicitudes_idempotentes'))
+    )
+    with op.batch_alter_table('Solicitudes_idempotentes', schema=None) as batch_op:
+        batch_op.create_index('idx_solicitudes_idempotentes_clave_unique', ['clave'], unique=True)
+        batch_op.create_index('idx_solicitudes_idempotentes_expires_at', ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('Solicitudes_idempotentes', schema=None) as batch_op:
+        batch_op.drop_index('idx_solicitudes_idempotentes_expires_at')
+        batch_op.drop_index('idx_solicitudes_idempotentes_clave_unique')
+
+    op.drop_table('Solicitudes_idempotentes')
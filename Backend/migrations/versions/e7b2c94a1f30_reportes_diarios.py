@@ -0,0 +1,48 @@
+"""tabla Reportes_diarios
+
+Revision ID: e7b2c94a1f30
+Revises: c3a8f1d05e62
+Create Date: 2026-10-18 15:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b2c94a1f30'
+down_revision = 'c3a8f1d05e62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Se llena con `flask --app run.py reportes rebuild` (services/rollup.py)
+    op.create_table('Reportes_diarios',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('fecha', sa.Date(), nullable=False),
+    sa.Column('id_origen', sa.Integer(), nullable=False),
+    sa.Column('id_granja', sa.Integer(), nullable=False),
+    sa.Column('id_galpon', sa.Integer(), nullable=False),
+    sa.Column('tickets', sa.Integer(), nullable=False),
+    sa.Column('total_aves', sa.Integer(), nullable=False),
+    sa.Column('aves_faltantes', sa.Integer(), nullable=False),
+    sa.Column('aves_ahogadas', sa.Integer(), nullable=False),
+    sa.Column('peso_neto', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('suma_peso_promedio', sa.Float(), nullable=False),
+    sa.Column('tickets_con_peso_promedio', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['id_origen'], ['Ubicaciones.id'], name=op.f('fk_Reportes_diarios_id_origen_Ubicaciones')),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_Reportes_diarios'))
+    )
+    with op.batch_alter_table('Reportes_diarios', schema=None) as batch_op:
+        batch_op.create_index('idx_reportes_diarios_clave_unique', ['fecha', 'id_origen', 'id_granja', 'id_galpon'], unique=True)
+        batch_op.create_index('idx_reportes_diarios_origen_fecha', ['id_origen', 'fecha'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('Reportes_diarios', schema=None) as batch_op:
+        batch_op.drop_index('idx_reportes_diarios_origen_fecha')
+        batch_op.drop_index('idx_reportes_diarios_clave_unique')
+
+    op.drop_table('Reportes_diarios')
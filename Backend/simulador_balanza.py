@@ -1,49 +1,263 @@
-import serial
-import time
+"""
+Simulador de balanza(s) para pruebas locales, de carga y de larga duración.
+
+Cada balanza simulada escribe tramas en un pseudo-terminal (pty) de Linux/macOS;
+el backend lo abre como si fuera el puerto serial de la romana. En Windows (sin
+pty) se puede escribir a un puerto real, por ejemplo un par virtual de com0com.
+
+El peso sigue ciclos realistas: báscula vacía, camión subiendo (movimiento),
+asentamiento con oscilación amortiguada, peso estable con ruido y bajada.
+
+Ejemplos (desde la carpeta Backend):
+    python simulador_balanza.py                          # 1 balanza, 10 Hz, protocolo line
+    python simulador_balanza.py --scales 3 --rate 200 --protocol toledo
+    python simulador_balanza.py --protocol tagged --link /tmp/romana   # /tmp/romana1, ...
+    python simulador_balanza.py --port COM1 --rate 1                # Windows + com0com
+
+Al arrancar imprime la variable SCALES lista para el .env del backend.
+"""
+import argparse
+import importlib.util
+import math
+import os
 import random
 import sys
+import threading
+import time
+
+def _load_protocols():
+    """
+    app/services/protocols.py cargado como módulo suelto: importarlo como
+    app.services.protocols ejecutaría app/__init__.py (Flask, modelos, config
+    de la BDD) solo para usar los codificadores. protocols.py no importa nada
+    de la app.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app", "services", "protocols.py")
+    spec = importlib.util.spec_from_file_location("protocols", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+ENCODERS = _load_protocols().ENCODERS
+
+class WeightProfile:
+    """
+    Generador de pesos por ciclo de pesaje (una muestra por llamada a next_sample).
+    Fases: vacía -> subiendo -> asentando -> estable -> bajando -> vacía ...
+    Las duraciones se miden en segundos simulados (muestras / rate).
+    """
+
+    def __init__(self, rate, rng, noise=2.0, division=10.0, min_load=8000.0, max_load=32000.0,
+                 empty_s=3.0, load_s=4.0, settle_s=2.0, stable_s=6.0, unload_s=4.0):
+        self.rate = rate
+        self.rng = rng
+        self.noise = noise
+        self.division = division
+        self.min_load, self.max_load = min_load, max_load
+        self.phases = (("empty", empty_s), ("loading", load_s), ("settling", settle_s),
+                       ("stable", stable_s), ("unloading", unload_s))
+        self._new_cycle()
+
+    def _new_cycle(self):
+        self.target = round(self.rng.uniform(self.min_load, self.max_load), -1)
+        self.phase_index = 0
+        self.elapsed = 0.0
+
+    def next_sample(self):
+        """Retorna (peso, en_movimiento)"""
+        name, duration = self.phases[self.phase_index]
+        progress = self.elapsed / duration if duration else 1.0
+        noise = self.rng.gauss(0, self.noise)
+        if name == "empty":
+            weight, motion = noise, False
+        elif name == "loading":
+            # Ejes del camión entrando: escalones suavizados
+            weight, motion = self.target * (0.5 - 0.5 * math.cos(math.pi * progress)), True
+        elif name == "settling":
+            # Oscilación amortiguada alrededor del peso final
+            amplitude = 0.01 * self.target * math.exp(-4 * progress)
+            weight = self.target + amplitude * math.sin(12 * math.pi * progress) + noise
+            motion = amplitude > 3 * self.noise
+        elif name == "stable":
+            weight, motion = self.target + noise, False
+        else:
+            weight, motion = self.target * (0.5 + 0.5 * math.cos(math.pi * progress)), True
+
+        self.elapsed += 1.0 / self.rate
+        if self.elapsed >= duration:
+            self.elapsed = 0.0
+            self.phase_index += 1
+            if self.phase_index == len(self.phases):
+                self._new_cycle()
+        # Como el display de la romana: en múltiplos de la división (10 kg, 20 kg, ...)
+        if self.division:
+            weight = round(weight / self.division) * self.division
+        return round(weight, 1), motion
+
+class PtyTransport:
+    """pty: el backend abre `path`; el simulador escribe en el extremo maestro"""
+
+    def __init__(self, link=None):
+        import tty
+        self.master, self.slave = os.openpty()
+        # Modo raw: sin traducir CR/LF ni eco (las tramas Toledo terminan en CR)
+        tty.setraw(self.slave)
+        os.set_blocking(self.master, False)
+        self.path = os.ttyname(self.slave)
+        self.link = link
+        if link:
+            if os.path.islink(link):
+                os.remove(link)
+            os.symlink(self.path, link)
+
+    def write(self, data):
+        """Escribe sin bloquear; si nadie lee y el buffer del pty está lleno, la trama se pierde"""
+        try:
+            os.write(self.master, data)
+            return True
+        except BlockingIOError:
+            return False
+
+    def close(self):
+        os.close(self.master)
+        os.close(self.slave)
+        if self.link and os.path.islink(self.link):
+            os.remove(self.link)
+
+class SerialTransport:
+    """Puerto serial real (Windows + com0com, o un adaptador físico)"""
+
+    def __init__(self, port, baudrate):
+        import serial
+        self.serial = serial.Serial(port, baudrate, timeout=1, write_timeout=0)
+        self.path = port
+
+    def write(self, data):
+        try:
+            self.serial.write(data)
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        self.serial.close()
+
+class SimulatedScale(threading.Thread):
+    """
+    Una balanza: escribe `rate` tramas por segundo con el protocolo indicado.
+    Se programa contra un reloj absoluto: si el sistema se atrasa, se envían
+    las tramas pendientes juntas en vez de acumular deriva.
+    """
+
+    def __init__(self, name, transport, protocol, rate, profile, verbose=False):
+        super().__init__(name=name, daemon=True)
+        self.transport = transport
+        self.encode = ENCODERS[protocol]
+        self.protocol = protocol
+        self.rate = rate
+        self.profile = profile
+        self.verbose = verbose
+        self.sent = 0
+        self.lost = 0
+        self.stop_event = threading.Event()
+
+    def run(self):
+        interval = 1.0 / self.rate
+        next_at = time.perf_counter()
+        while not self.stop_event.is_set():
+            now = time.perf_counter()
+            due = max(1, int((now - next_at) / interval) + 1)
+            frames = []
+            for _ in range(due):
+                weight, motion = self.profile.next_sample()
+                frames.append(self.encode(weight, motion=motion))
+            if self.transport.write(b"".join(frames)):
+                self.sent += due
+            else:
+                self.lost += due
+            if self.verbose:
+                print(f"[{self.name}] TX -> {weight:10.1f} {'(mov)' if motion else ''}")
+            next_at += due * interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                self.stop_event.wait(delay)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulador de balanza(s) sobre pty o puerto serial")
+    parser.add_argument("--scales", type=int, default=1, help="Cantidad de balanzas simultáneas")
+    parser.add_argument("--protocol", default="line", help=f"Protocolo o lista por balanza ({', '.join(ENCODERS)})")
+    parser.add_argument("--rate", type=float, default=10.0, help="Tramas por segundo por balanza")
+    parser.add_argument("--noise", type=float, default=2.0, help="Ruido (desviación estándar, kg)")
+    parser.add_argument("--division", type=float, default=10.0, help="División de la romana (kg, 0 = sin redondeo)")
+    parser.add_argument("--min-load", type=float, default=8000.0, help="Peso mínimo de un camión (kg)")
+    parser.add_argument("--max-load", type=float, default=32000.0, help="Peso máximo de un camión (kg)")
+    parser.add_argument("--stable", type=float, default=6.0, help="Segundos de peso estable por ciclo")
+    parser.add_argument("--duration", type=float, default=0, help="Segundos a simular (0 = hasta Ctrl+C)")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla para repetir la misma simulación")
+    parser.add_argument("--link", default=None, help="Prefijo de enlaces simbólicos estables (ej. /tmp/romana)")
+    parser.add_argument("--port", default=None, help="Puerto serial real en lugar de pty (una sola balanza)")
+    parser.add_argument("--baudrate", type=int, default=9600)
+    parser.add_argument("--verbose", action="store_true", help="Imprimir cada envío (solo a tasas bajas)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    protocols = [p.strip() for p in args.protocol.split(",")]
+    unknown = set(protocols) - set(ENCODERS)
+    if unknown:
+        sys.exit(f"Protocolo desconocido: {', '.join(sorted(unknown))}")
+    if args.port and args.scales != 1:
+        sys.exit("--port admite una sola balanza")
+    if not args.port and not hasattr(os, "openpty"):
+        sys.exit("Este sistema no tiene pty: use --port COMx (por ejemplo con com0com)")
+
+    rng = random.Random(args.seed)
+    scales = []
+    for i in range(1, args.scales + 1):
+        protocol = protocols[(i - 1) % len(protocols)]
+        if args.port:
+            transport = SerialTransport(args.port, args.baudrate)
+        else:
+            transport = PtyTransport(f"{args.link}{i}" if args.link else None)
+        profile = WeightProfile(args.rate, random.Random(rng.random()), noise=args.noise, division=args.division,
+                                min_load=args.min_load, max_load=args.max_load, stable_s=args.stable)
+        scales.append(SimulatedScale(f"sim{i}", transport, protocol, args.rate, profile, args.verbose))
 
-# Configuración del puerto EMISOR
-PORT = 'COM1' 
-BAUD_RATE = 9600
+    print("--- SIMULADOR DE BALANZA ---")
+    for scale in scales:
+        path = scale.transport.link if getattr(scale.transport, "link", None) else scale.transport.path
+        print(f"{scale.name}: {path} ({scale.protocol}, {args.rate:g} Hz)")
+    print("SCALES=" + ",".join(
+        f"{s.name}={getattr(s.transport, 'link', None) or s.transport.path}:{args.baudrate}:{s.protocol}"
+        for s in scales
+    ))
+    for protocol in set(protocols):
+        # 10 bits por byte en la línea serial (start + 8 + stop)
+        needed = len(ENCODERS[protocol](args.max_load)) * args.rate * 10
+        if needed > args.baudrate:
+            print(f"Aviso: {protocol} a {args.rate:g} Hz necesita ~{needed:.0f} baudios; "
+                  f"un puerto real a {args.baudrate} no lo sostiene (el pty sí)")
+    print("Presiona Ctrl+C para detener.\n")
 
-def simular_balanza():
+    for scale in scales:
+        scale.start()
+    started = time.perf_counter()
     try:
-        print(f"--- SIMULADOR DE BALANZA ---")
-        print(f"Intentando abrir {PORT} para enviar datos...")
-        
-        # Abrimos el puerto
-        ser = serial.Serial(PORT, BAUD_RATE, timeout=1)
-        print(f"Conectado exitosamente a {PORT}")
-        print("Enviando datos aleatorios. Presiona Ctrl+C para detener.\n")
-
-        while True:
-            # 1. Generar peso aleatorio (ej. entre 100.00 y 5000.00 kg)
-            peso = round(random.uniform(100.0, 5000.0), 2)
-            
-            # 2. Formatear el mensaje
-            # Es importante agregar \n (salto de línea) o \r\n para que 
-            # el lector sepa cuándo termina el dato.
-            mensaje = f"{peso}\n"
-            
-            # 3. Enviar bytes
-            ser.write(mensaje.encode('utf-8'))
-            
-            print(f"TX -> {mensaje.strip()}")
-            
-            # 4. Esperar un poco antes del siguiente envío
-            time.sleep(2)
-
-    except serial.SerialException as e:
-        print(f"\n[ERROR] No se pudo abrir el puerto {PORT}.")
-        print(f"Detalle: {e}")
-        print("Verifica que el puerto exista en com0com y no esté siendo usado por otro programa.")
+        while not args.duration or time.perf_counter() - started < args.duration:
+            time.sleep(min(5.0, args.duration) if args.duration else 5.0)
+            elapsed = time.perf_counter() - started
+            if not args.verbose:
+                print("  ".join(
+                    f"{s.name}: {s.sent / elapsed:7.1f} tramas/s ({s.lost} perdidas)" for s in scales
+                ))
     except KeyboardInterrupt:
-        print("\n\nSimulación detenida.")
+        print("\nSimulación detenida.")
     finally:
-        if 'ser' in locals() and ser.is_open:
-            ser.close()
-            print("Puerto cerrado.")
+        for scale in scales:
+            scale.stop_event.set()
+        for scale in scales:
+            scale.join(1)
+            scale.transport.close()
 
 if __name__ == "__main__":
-    simular_balanza()
\ No newline at end of file
+    main()
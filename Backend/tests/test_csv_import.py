@@ -0,0 +1,73 @@
+"""
+Importación de choferes desde CSV (services/csv_import.py): si la BDD rechaza
+el lote, el reintento fila por fila debe crear de nuevo las personas que el
+lote revertido había insertado.
+
+    python -m pytest tests
+"""
+import io
+
+import pytest
+from flask import Flask
+from sqlalchemy import event, func, select
+
+from app import models as m
+from app.db import db
+from app.services.csv_import import import_csv
+
+@pytest.fixture
+def app():
+    app = Flask("tests")
+    app.config.update(SQLALCHEMY_DATABASE_URI="sqlite://", SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(app)
+    with app.app_context():
+        @event.listens_for(db.engine, "connect")
+        def _connect(conn, record):
+            conn.create_function("getdate", 0, lambda: "2026-01-05 08:00:00")
+            conn.execute("PRAGMA foreign_keys = ON")
+        db.create_all()
+        db.session.add_all([
+            m.Direcciones(id=1, estado="Zulia", municipio="Mara", sector="Centro"),
+            m.Personas(id=1, id_direcciones=1, nombre="Ana", apellido="P", tipo_cedula="V", cedula="1"),
+            m.EmpresasTransporte(id=1, id_direcciones=1, nombre="Transporte"),
+        ])
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+def _fail_first_batch(engine, table):
+    """El primer INSERT de varias filas en `table` falla en la BDD (tabla inexistente)"""
+    state = {"failed": False}
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def _rewrite(conn, cursor, statement, parameters, context, executemany):
+        if executemany and not state["failed"] and statement.startswith(f'INSERT INTO "{table}"'):
+            state["failed"] = True
+            statement = statement.replace(f'"{table}"', f'"{table}_no_existe"', 1)
+        return statement, parameters
+
+    return state
+
+def test_choferes_reintento_despues_de_un_lote_fallido(app):
+    csv_text = (
+        "nombre,apellido,tipo_cedula,cedula,id_empresas_transportes,estado,municipio,sector\n"
+        "Ana,P,V,1,1,Zulia,Mara,Centro\n"
+        "Luis,Q,V,2,1,Zulia,Mara,Norte\n"
+        "Eva,R,E,3,1,Zulia,Mara,Sur\n"
+    )
+    with app.app_context():
+        state = _fail_first_batch(db.engine, "Choferes")
+        report = import_csv("choferes", io.StringIO(csv_text))
+
+        assert state["failed"]
+        assert report.to_dict()["errores"] == []
+        assert report.inserted == 3
+        choferes = db.session.execute(
+            select(m.Personas.cedula)
+            .join(m.Choferes, m.Choferes.id_personas == m.Personas.id)
+            .order_by(m.Personas.cedula)
+        ).scalars().all()
+        assert choferes == ["1", "2", "3"]
+        # Ninguna persona duplicada ni huérfana del lote revertido
+        assert db.session.execute(select(func.count()).select_from(m.Personas)).scalar() == 3
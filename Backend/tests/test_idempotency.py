@@ -0,0 +1,91 @@
+"""
+Idempotency-Key en POST /api/tickets_pesaje (services/idempotency.py): si un
+reintento simultáneo guarda la clave mientras la vista corre, el commit choca
+en el índice único y se repite la respuesta guardada en vez de un error.
+
+    python -m pytest tests
+"""
+import datetime
+import json
+
+import pytest
+from flask import Flask, g
+from flask_jwt_extended import JWTManager, create_access_token
+from sqlalchemy import create_engine, event, func, insert, select
+
+from app import models as m
+from app import routes
+from app.db import db
+from app.routes import api_bp
+
+NOW = datetime.datetime(2026, 1, 5, 8, 0, 0)
+
+def _functions(conn, record):
+    conn.create_function("getdate", 0, lambda: NOW.isoformat(" "))
+
+@pytest.fixture
+def app(tmp_path):
+    # Archivo (no :memory:) para que otra conexión escriba como un reintento simultáneo
+    app = Flask("tests")
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'romana.db'}",
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        JWT_SECRET_KEY="tests-" * 8,
+        IDEMPOTENCY_TTL_HOURS=24,
+    )
+    db.init_app(app)
+    JWTManager(app)
+    app.register_blueprint(api_bp, url_prefix="/api")
+    with app.app_context():
+        event.listen(db.engine, "connect", _functions)
+        db.engine.dispose()
+        db.create_all()
+        db.session.add_all([
+            m.Roles(id=1, nombre="Operador"),
+            m.Direcciones(id=1, estado="Zulia", municipio="Mara", sector="Centro"),
+            m.Personas(id=1, id_direcciones=1, nombre="Ana", apellido="P", tipo_cedula="V", cedula="1"),
+            m.Usuarios(id=1, id_personas=1, id_roles=1, usuario="romana", contraseña="x"),
+            m.EmpresasTransporte(id=1, id_direcciones=1, nombre="Transporte"),
+            m.Vehiculos(id=1, placa="ABC123", id_empresas_transportes=1),
+            m.Choferes(id=1, id_personas=1, id_empresas_transportes=1),
+            m.Asignaciones(id=1, id_vehiculos=1, id_chofer=1, fecha=NOW.date(), hora=NOW.time()),
+            m.Productos(id=1, nombre="Pollo vivo", codigo="P1"),
+            m.Ubicaciones(id=1, id_direcciones=1, nombre="Granja", tipo="Granja"),
+            m.Ubicaciones(id=2, id_direcciones=1, nombre="Matadero", tipo="Matadero"),
+        ])
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+def test_reintento_simultaneo_repite_la_respuesta_guardada(app, monkeypatch):
+    stored = {"id": 99, "nro_ticket": "TKT-000099"}
+    other = create_engine(app.config["SQLALCHEMY_DATABASE_URI"])
+    real_insert_ticket = routes.insert_ticket
+
+    def insert_after_concurrent_retry(session, values):
+        # El otro reintento confirma su respuesta después de que este request
+        # ya consultó la clave (_replay) y antes de su commit
+        clave, huella = g.idempotency
+        with other.begin() as conn:
+            conn.execute(insert(m.SolicitudesIdempotentes.__table__).values(
+                clave=clave, huella=huella, estado_http=201, respuesta=json.dumps(stored),
+                created_at=NOW, expires_at=datetime.datetime.now() + datetime.timedelta(hours=1),
+            ))
+        return real_insert_ticket(session, values)
+
+    monkeypatch.setattr(routes, "insert_ticket", insert_after_concurrent_retry)
+    with app.app_context():
+        token = create_access_token(identity="1")
+    response = app.test_client().post("/api/tickets_pesaje", json={
+        "id_producto": 1, "id_asignaciones": 1, "id_origen": 1, "id_destino": 2,
+        "tipo": "Entrada", "peso_bruto": 15000, "estado": "En proceso",
+    }, headers={"Authorization": f"Bearer {token}", "Idempotency-Key": "reintento-1"})
+    other.dispose()
+
+    assert response.status_code == 201
+    assert response.headers["Idempotent-Replayed"] == "true"
+    assert response.get_json() == stored
+    with app.app_context():
+        # El ticket de este request se revirtió junto con su respuesta
+        assert db.session.execute(select(func.count()).select_from(m.TicketPesaje)).scalar() == 0
@@ -0,0 +1,126 @@
+"""
+Reportes_diarios (services/rollup.py) debe coincidir con el detalle del
+reporte de granja después de editar por los endpoints genéricos.
+
+Corre contra SQLite en memoria (como los benchmarks):
+    python -m pytest tests
+"""
+import datetime
+
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+from sqlalchemy import event
+
+from app import models as m
+from app.db import db
+from app.routes import api_bp
+from app.services.rollup import install_rollup_tracking, refresh_rollup
+
+DIA = datetime.date(2026, 1, 5)
+LLEGADA = datetime.datetime(2026, 1, 5, 8, 0, 0)
+
+@pytest.fixture
+def app():
+    app = Flask("tests")
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI="sqlite://",
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        JWT_SECRET_KEY="tests-" * 8,
+    )
+    db.init_app(app)
+    JWTManager(app)
+    app.register_blueprint(api_bp, url_prefix="/api")
+    install_rollup_tracking()
+    with app.app_context():
+        # Funciones de SQL Server que usan los defaults y el reporte
+        @event.listens_for(db.engine, "connect")
+        def _functions(conn, record):
+            conn.create_function("getdate", 0, lambda: LLEGADA.isoformat(" "))
+            conn.create_function("CONCAT", -1, lambda *a: "".join(str(x) for x in a if x is not None))
+        _seed()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    token = create_access_token(identity="1")
+    client = app.test_client()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return client
+
+def _seed():
+    db.create_all()
+    db.session.add_all([
+        m.Roles(id=1, nombre="Operador"),
+        m.Direcciones(id=1, estado="Zulia", municipio="Mara", sector="Centro"),
+        m.Personas(id=1, id_direcciones=1, nombre="Ana", apellido="P", tipo_cedula="V", cedula="1"),
+        m.Usuarios(id=1, id_personas=1, id_roles=1, usuario="romana", contraseña="x"),
+        m.EmpresasTransporte(id=1, id_direcciones=1, nombre="Transporte"),
+        m.Vehiculos(id=1, placa="ABC123", id_empresas_transportes=1),
+        m.Choferes(id=1, id_personas=1, id_empresas_transportes=1),
+        m.Asignaciones(id=1, id_vehiculos=1, id_chofer=1, fecha=DIA, hora=LLEGADA.time()),
+        m.Productos(id=1, nombre="Pollo vivo", codigo="P1"),
+        m.Ubicaciones(id=1, id_direcciones=1, nombre="Granja", tipo="Granja"),
+        m.Ubicaciones(id=2, id_direcciones=1, nombre="Matadero", tipo="Matadero"),
+        m.Granjas(id=1, id_ubicaciones=1, id_persona_responsable=1),
+        m.Galpones(id=1, id_granja=1, nro_galpon=1, capacidad=1000),
+        m.Lotes(id=1, id_galpones=1, codigo_lote="L1", fecha_alojamiento=DIA),
+    ])
+    for i in (1, 2):
+        db.session.add_all([
+            m.TicketPesaje(id=i, id_producto=1, id_asignaciones=1, id_usuarios_primer_peso=1, id_origen=1, id_destino=2,
+                           nro_ticket=f"TKT-{i:06d}", tipo="Entrada", peso_bruto=15000,
+                           peso_tara=7000, peso_neto=8000, estado="Finalizado", fecha_primer_peso=LLEGADA),
+            m.ViajesTiempos(id=i, id_ticket=i, hora_llegada_romana=LLEGADA),
+            m.ViajesConteos(id=i, id_ticket=i, aves_guia=100, aves_recibidas=100, numero_de_jaulas=10),
+            m.ViajesOrigen(id=i, id_ticket=i, id_lote=1, numero_de_orden=str(i)),
+            m.Estadisticas(id=i, id_ticket=i, peso_promedio_aves=80.0),
+        ])
+    db.session.commit()
+    refresh_rollup(db.session, DIA, DIA + datetime.timedelta(days=1))
+    db.session.commit()
+
+def _reporte(client, dia):
+    response = client.get(f"/api/reporte_granja_dia?id_granja=1&fecha={dia.isoformat()}")
+    assert response.status_code == 200
+    return response.get_json()
+
+def _assert_resumen_igual_al_detalle(reporte):
+    tickets, resumen = reporte["tickets"], reporte["resumen"]
+    assert resumen["total_aves"] == sum(t["cantidad_aves"] or 0 for t in tickets)
+    assert resumen["total_peso_neto"] == sum(t["peso_neto"] for t in tickets)
+
+def test_editar_conteo_actualiza_el_resumen(client):
+    assert _reporte(client, DIA)["resumen"]["total_aves"] == 200
+
+    response = client.put("/api/viajes_conteos/1", json={"aves_recibidas": 250})
+    assert response.status_code == 200
+
+    reporte = _reporte(client, DIA)
+    assert reporte["resumen"]["total_aves"] == 350
+    _assert_resumen_igual_al_detalle(reporte)
+
+def test_cambiar_llegada_saca_el_ticket_del_dia_anterior(client, app):
+    # Por el ORM: SQLite no acepta fechas en texto como el PUT genérico
+    siguiente = DIA + datetime.timedelta(days=1)
+    with app.app_context():
+        tiempos = db.session.get(m.ViajesTiempos, 2)
+        tiempos.hora_llegada_romana = LLEGADA + datetime.timedelta(days=1)
+        db.session.commit()
+
+    anterior, nuevo = _reporte(client, DIA), _reporte(client, siguiente)
+    assert len(anterior["tickets"]) == 1 and len(nuevo["tickets"]) == 1
+    _assert_resumen_igual_al_detalle(anterior)
+    _assert_resumen_igual_al_detalle(nuevo)
+
+def test_editar_ticket_actualiza_el_resumen(client, app):
+    with app.app_context():
+        ticket = db.session.get(m.TicketPesaje, 1)
+        ticket.peso_neto = 9000
+        db.session.commit()
+
+    reporte = _reporte(client, DIA)
+    assert reporte["resumen"]["total_peso_neto"] == 17000
+    _assert_resumen_igual_al_detalle(reporte)
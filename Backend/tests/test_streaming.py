@@ -0,0 +1,114 @@
+"""
+GET /api/<resource>/all en streaming (services/streaming.py): ninguna consulta
+(selectinload, prefetch de referencias) puede correr mientras otro cursor de
+la misma conexión tiene filas pendientes, como exige SQL Server sin MARS.
+
+    python -m pytest tests
+"""
+import datetime
+import json
+import sqlite3
+
+import pytest
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+from sqlalchemy import event, insert
+
+from app import models as m
+from app.db import db
+from app.routes import api_bp
+from app.services.streaming import STREAM_BATCH_SIZE
+
+NOW = datetime.datetime(2026, 1, 5, 8, 0, 0)
+TICKETS = 2 * STREAM_BATCH_SIZE + 7
+
+class _BusyCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        self.connection.check_busy(self)
+        self.connection.open_cursors.add(self)
+        return super().execute(*args)
+
+    def executemany(self, *args):
+        self.connection.check_busy(self)
+        return super().executemany(*args)
+
+    def close(self):
+        self.connection.open_cursors.discard(self)
+        return super().close()
+
+class _BusyConnection(sqlite3.Connection):
+    """Como pyodbc sin MARS: falla si otro cursor sigue abierto con resultados"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.open_cursors = set()
+
+    def cursor(self, factory=_BusyCursor):
+        return super().cursor(factory)
+
+    def check_busy(self, cursor):
+        if self.open_cursors - {cursor}:
+            raise sqlite3.OperationalError("Connection is busy with results for another command")
+
+@pytest.fixture
+def app():
+    app = Flask("tests")
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI="sqlite://",
+        SQLALCHEMY_ENGINE_OPTIONS={"connect_args": {"factory": _BusyConnection}},
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        JWT_SECRET_KEY="tests-" * 8,
+    )
+    db.init_app(app)
+    JWTManager(app)
+    app.register_blueprint(api_bp, url_prefix="/api")
+    with app.app_context():
+        @event.listens_for(db.engine, "connect")
+        def _functions(conn, record):
+            conn.create_function("getdate", 0, lambda: NOW.isoformat(" "))
+        db.create_all()
+        db.session.add_all([
+            m.Roles(id=1, nombre="Operador"),
+            m.Direcciones(id=1, estado="Zulia", municipio="Mara", sector="Centro"),
+            m.Personas(id=1, id_direcciones=1, nombre="Ana", apellido="P", tipo_cedula="V", cedula="1"),
+            m.Usuarios(id=1, id_personas=1, id_roles=1, usuario="romana", contraseña="x"),
+            m.EmpresasTransporte(id=1, id_direcciones=1, nombre="Transporte"),
+            m.Vehiculos(id=1, placa="ABC123", id_empresas_transportes=1),
+            m.Choferes(id=1, id_personas=1, id_empresas_transportes=1),
+            m.Asignaciones(id=1, id_vehiculos=1, id_chofer=1, fecha=NOW.date(), hora=NOW.time()),
+            m.Productos(id=1, nombre="Pollo vivo", codigo="P1"),
+            m.Ubicaciones(id=1, id_direcciones=1, nombre="Granja", tipo="Granja"),
+            m.Ubicaciones(id=2, id_direcciones=1, nombre="Matadero", tipo="Matadero"),
+        ])
+        db.session.flush()
+        db.session.execute(insert(m.TicketPesaje.__table__), [
+            dict(id=i, id_producto=1, id_asignaciones=1, id_usuarios_primer_peso=1, id_origen=1, id_destino=2,
+                 nro_ticket=f"TKT-{i:06d}", tipo="Entrada", peso_bruto=15000, estado="En proceso",
+                 fecha_primer_peso=NOW)
+            for i in range(1, TICKETS + 1)
+        ])
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    with app.app_context():
+        token = create_access_token(identity="1")
+    client = app.test_client()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+    return client
+
+def test_stream_por_lotes_igual_a_jsonify(client):
+    # Árbol completo por defecto: cada lote hace sus selectinload y el prefetch
+    full = client.get("/api/tickets_pesaje/all")
+    assert full.status_code == 200
+    assert len(full.get_json()) == TICKETS
+
+    streamed = client.get("/api/tickets_pesaje/all?stream=1")
+    assert streamed.status_code == 200
+    assert streamed.get_data() == full.get_data()
+
+    ndjson = client.get("/api/tickets_pesaje/all", headers={"Accept": "application/x-ndjson"})
+    rows = [json.loads(line) for line in ndjson.get_data(as_text=True).splitlines()]
+    assert rows == full.get_json()